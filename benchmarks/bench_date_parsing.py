@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Measures the cost of parsing tracking dates inside the streak code.
+
+Compares a per-row strptime loop over 'YYYY-MM-DD' strings (what the streak
+loops used to do), streak_table on a column of date strings (one vectorized
+parse per call) and streak_table on the datetime64 column that the storage
+engines now load (no parsing at all).
+
+Usage:
+    python benchmarks/bench_date_parsing.py [--rows 200000]
+"""
+import argparse
+import datetime
+import os
+import sys
+import time
+from datetime import datetime as dt
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from habit_tracker import parse_dates, streak_table  # noqa: E402
+
+
+def make_history(rows, habits=12, seed=0):
+    """Builds a synthetic tracking frame of date strings, as read from a CSV file."""
+    rng = np.random.default_rng(seed)
+    days = np.sort(rng.integers(0, rows // 8, rows)) + np.datetime64('2015-01-01')
+    names = np.array([f'habit {i}' for i in range(habits)])
+    return pd.DataFrame({
+        'date': days.astype('datetime64[D]').astype(str),
+        'habit': names[rng.integers(0, habits, rows)],
+        'value': rng.integers(1, 120, rows)}), {name: 'daily' for name in names}
+
+
+def per_row_streaks(df_tracking, today):
+    """Walks every habit's dates back from today, parsing each row with strptime."""
+    streaks = {}
+    for habit, dates in df_tracking.groupby('habit')['date']:
+        tracked = set(dt.strptime(date, '%Y-%m-%d').date() for date in dates)
+        day, streak = today, 0
+        while day in tracked:
+            streak += 1
+            day -= datetime.timedelta(days=1)
+        streaks[habit] = streak
+    return streaks
+
+
+def best_of(func, repeat=5):
+    """Returns the fastest of several timed calls in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=200_000)
+    args = parser.parse_args()
+
+    df_strings, periods = make_history(args.rows)
+    df_native = parse_dates(df_strings.copy())
+    today = df_strings['date'].max()
+    today_date = dt.strptime(today, '%Y-%m-%d').date()
+
+    per_row = best_of(lambda: per_row_streaks(df_strings, today_date), repeat=3)
+    strings = best_of(lambda: streak_table(df_strings, periods, today))
+    native = best_of(lambda: streak_table(df_native, periods, today))
+    print(f'strptime per row : {per_row*1000:8.1f} ms ({per_row/args.rows*1e9:6.0f} ns/row)')
+    print(f'string column    : {strings*1000:8.1f} ms ({strings/args.rows*1e9:6.0f} ns/row)')
+    print(f'datetime64 column: {native*1000:8.1f} ms ({native/args.rows*1e9:6.0f} ns/row)')
+    print(f'parse cost removed from the streak table: {(strings - native)/args.rows*1e9:.0f} ns/row '
+          f'({strings/native:.1f}x), {per_row/native:.0f}x faster than the per-row loop')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+Measures how long the app takes to reach the menu and exit (option 14),
+with lazy imports versus importing pandas and google.generativeai up front
+the way the module used to.
+
+Usage:
+    python benchmarks/bench_import_time.py [--repeat 5]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+LAZY = "import runpy; runpy.run_path('habit_tracker.py', run_name='__main__')"
+EAGER = "import numpy, pandas, google.generativeai; " + LAZY
+
+
+def best_of(code, repeat):
+    """Returns the fastest wall time of running the menu and choosing Exit."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], input='14\n', cwd=ROOT,
+                       stdout=subprocess.DEVNULL, text=True, check=True)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    lazy = best_of(LAZY, args.repeat)
+    eager = best_of(EAGER, args.repeat)
+    print(f' lazy: menu + exit {lazy*1000:8.1f} ms')
+    print(f'eager: menu + exit {eager*1000:8.1f} ms')
+    print(f'lazy imports start {eager/lazy:.1f}x faster')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+Compares the peak memory of habit statistics computed from the whole tracking
+log with the chunked (streaming) statistics.
+
+Usage:
+    python benchmarks/bench_streaming_stats.py [--rows 1000000] [--chunksize 50000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from habit_tracker import CsvStorage, FrameCache, habit_stats, streaming_habit_stats  # noqa: E402
+
+
+def make_history(rows, habits=12, seed=0):
+    """Builds a synthetic tracking frame with several entries per day."""
+    rng = np.random.default_rng(seed)
+    days = np.sort(rng.integers(0, min(rows // 8, 36500), rows)) + np.datetime64('2015-01-01')   # at most 100 years
+    return pd.DataFrame({
+        'date': days.astype('datetime64[D]').astype(str),
+        'habit': np.array([f'habit {i}' for i in range(habits)])[rng.integers(0, habits, rows)],
+        'value': rng.integers(1, 120, rows)})
+
+
+def measure(func):
+    """Returns the result, the seconds taken and the peak traced memory in MB of a call."""
+    start = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - start
+    tracemalloc.start()   # traced separately, tracing slows the call down
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, seconds, peak / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--chunksize', type=int, default=50_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        storage = CsvStorage(data_dir, FrameCache())
+        storage.save_tracking('bench', make_history(args.rows))
+        storage.cache.invalidate()
+
+        def full():
+            storage.cache.invalidate()   # time a cold load, not a cache hit
+            return habit_stats(storage.load_tracking('bench'))
+
+        def streamed():
+            return streaming_habit_stats(storage.iter_tracking('bench', chunksize=args.chunksize, compact=True))
+
+        expected, full_seconds, full_peak = measure(full)
+        result, stream_seconds, stream_peak = measure(streamed)
+        assert np.allclose(result['mean'], expected['mean']) and np.allclose(result['std'], expected['std'])
+        print(f'whole log: {full_seconds*1000:8.1f} ms, peak {full_peak:7.1f} MB')
+        print(f'streamed : {stream_seconds*1000:8.1f} ms, peak {stream_peak:7.1f} MB '
+              f'({args.chunksize} rows per chunk)')
+
+
+if __name__ == '__main__':
+    main()
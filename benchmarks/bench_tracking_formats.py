@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+Compares loading a large tracking history from the CSV and the columnar (npz)
+storage engines.
+
+Usage:
+    python benchmarks/bench_tracking_formats.py [--rows 500000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from habit_tracker import CsvStorage, NpzStorage, FrameCache  # noqa: E402
+
+
+def make_history(rows, habits=12, seed=0):
+    """Builds a synthetic tracking frame with several entries per day."""
+    rng = np.random.default_rng(seed)
+    days = np.sort(rng.integers(0, rows // 8, rows)) + np.datetime64('2015-01-01')
+    return pd.DataFrame({
+        'date': days.astype('datetime64[D]').astype(str),
+        'habit': np.array([f'habit {i}' for i in range(habits)])[rng.integers(0, habits, rows)],
+        'value': rng.integers(1, 120, rows)})
+
+
+def best_of(func, repeat=5):
+    """Returns the fastest of several timed calls in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=500_000)
+    args = parser.parse_args()
+
+    df_tracking = make_history(args.rows)
+    with tempfile.TemporaryDirectory() as data_dir:
+        results = {}
+        for engine in (CsvStorage(data_dir, FrameCache()), NpzStorage(data_dir, FrameCache())):
+            engine.save_tracking('bench', df_tracking)
+            def load():
+                engine.cache.invalidate()   # time a cold load, not a cache hit
+                return engine.load_tracking('bench')
+            seconds = best_of(load)
+            memory = load().memory_usage(deep=True).sum()
+            path = engine.tracking_file('bench') if engine.name == 'npz' else os.path.join(data_dir, 'tracking_bench.csv')
+            results[engine.name] = seconds
+            print(f'{engine.name:>4}: load {seconds*1000:8.1f} ms, {memory/1e6:7.1f} MB in memory, {os.path.getsize(path)/1e6:6.1f} MB on disk')
+        print(f'npz loads {results["csv"]/results["npz"]:.1f}x faster than csv for {args.rows} rows')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+Reports the memory used by a loaded tracking log with the column types that
+pd.read_csv infers and with the declared tracking schema (datetime64 dates, a
+lowercase category for habits), together with the load time of each.
+
+Usage:
+    python benchmarks/bench_tracking_schema.py [--rows 1000000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from habit_tracker import COMPACT_DTYPES, read_tracking_csv  # noqa: E402
+
+
+def make_history(rows, habits=12, seed=0):
+    """Builds a synthetic tracking frame with several entries per day."""
+    rng = np.random.default_rng(seed)
+    days = np.sort(rng.integers(0, min(rows // 8, 36500), rows)) + np.datetime64('2015-01-01')   # at most 100 years
+    return pd.DataFrame({
+        'date': days.astype('datetime64[D]').astype(str),
+        'habit': np.array([f'Habit {i}' for i in range(habits)])[rng.integers(0, habits, rows)],
+        'value': rng.integers(1, 120, rows)})
+
+
+def best_of(func, repeat=3):
+    """Returns the result and the fastest of several timed calls in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return result, min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        path = os.path.join(data_dir, 'tracking_bench.csv')
+        make_history(args.rows).to_csv(path, index=False)
+        loads = [('inferred', lambda: pd.read_csv(path)),
+                 ('schema', lambda: read_tracking_csv(path)),
+                 ('compact', lambda: read_tracking_csv(path, COMPACT_DTYPES))]
+        print(f'{"":10}{"date":>10}{"habit":>10}{"value":>10}{"total":>10}{"load":>12}')
+        for name, load in loads:
+            df_tracking, seconds = best_of(load)
+            usage = df_tracking.memory_usage(deep=True, index=False) / 1e6
+            print(f'{name:10}' + ''.join(f'{usage[c]:8.1f}MB' for c in ('date', 'habit', 'value'))
+                  + f'{usage.sum():8.1f}MB{seconds*1000:9.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -5,17 +5,3416 @@ Created on Fri Jan 10 15:03:54 2025
 @author: Brandyn Ewanek
 """
 
+import contextlib
+import csv
+import argparse
 import datetime
 # from datetime import date
 from datetime import datetime as dt
+import functools
+import glob
+import gzip
+import importlib
+import io
+import itertools
 import json
-import pandas as pd
-import google.generativeai as genai
 import os
+import sqlite3
+import sys
+import threading
 # import warnings
 # warnings.simplefilter('ignore')
 
 
+### lazy imports ###################################################
+class _LazyModule:
+    """
+    Stands in for a heavy module and imports it on first attribute access,
+    so the menu (and options that never touch pandas or Gemini) start fast.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+np = _LazyModule('numpy')
+pd = _LazyModule('pandas')
+genai = _LazyModule('google.generativeai')
+
+
+### file layout ####################################################
+DATA_DIR = 'data'
+TRACKING_COLUMNS = ['date', 'habit', 'value']
+# column types of a loaded tracking frame; habit names are lowercased and the
+# value column keeps the integer or float type of the numbers it holds
+TRACKING_SCHEMA = {'date': 'datetime64[ns]', 'habit': 'category', 'value': 'number'}
+# column types of tracking chunks read for analysis (the date is always parsed)
+COMPACT_DTYPES = {'habit': 'category', 'value': 'float32'}
+
+
+USER_COLUMNS = ['username', 'DOB', 'city', 'current_habits', 'measured_in', 'period']
+# profile cells are text; empty cells stay empty strings instead of becoming NaN
+USER_SCHEMA = dict.fromkeys(USER_COLUMNS, str)
+
+
+def tracking_path(username, data_dir=None):
+    """Returns the path of a user's tracking CSV file."""
+    return os.path.join(data_dir or DATA_DIR, f'tracking_{username}.csv')
+
+
+def user_data_path(username, data_dir=None):
+    """Returns the path of a user's profile CSV file."""
+    return os.path.join(data_dir or DATA_DIR, f'user_data_{username}.csv')
+
+
+def parse_dates(df_tracking):
+    """
+    Converts the date column of a tracking frame to datetime64, parsing every
+    'YYYY-MM-DD' string once. Frames that are already parsed are left as they are.
+
+    Parameters:
+        df_tracking (pd.DataFrame): The tracking frame, changed in place.
+
+    Returns:
+        pd.DataFrame: The same frame.
+    """
+    if df_tracking['date'].dtype.kind != 'M':
+        df_tracking['date'] = pd.to_datetime(df_tracking['date'], format='%Y-%m-%d')
+    return df_tracking
+
+
+def read_tracking_csv(source, dtype=None):
+    """
+    Reads a tracking CSV file (or buffer) into TRACKING_SCHEMA.
+
+    Parameters:
+        source: The file path or buffer.
+        dtype (dict): Types of the habit and value columns, e.g. COMPACT_DTYPES.
+
+    Returns:
+        pd.DataFrame: The tracking frame.
+
+    Raises:
+        ValueError: If a row does not fit the schema (see load_tracking_csv).
+    """
+    # read_csv is several times slower parsing dates next to a category column, so they are parsed after
+    return typed_tracking(pd.read_csv(source, dtype=dict(dtype or {}, habit='category')))
+
+
+def typed_tracking(df_tracking, dtype=None):
+    """
+    Converts the columns of a tracking frame read from storage to TRACKING_SCHEMA in place.
+
+    Parameters:
+        df_tracking (pd.DataFrame): The date, habit and value columns as read.
+        dtype (dict): Types of the habit and value columns, e.g. COMPACT_DTYPES.
+
+    Returns:
+        pd.DataFrame: The same frame.
+
+    Raises:
+        ValueError: If a row does not fit the schema (see split_tracking_rows).
+    """
+    parse_dates(df_tracking)
+    df_tracking['habit'] = lowercase_habits(df_tracking['habit'])
+    if dtype and 'value' in dtype:
+        df_tracking['value'] = df_tracking['value'].astype(dtype['value'])
+    if len(df_tracking):
+        values = df_tracking['value'].to_numpy()
+        if (values.dtype.kind not in 'iuf' or not np.isfinite(values).all() or df_tracking['date'].isna().any()
+                or df_tracking['habit'].isna().any() or (df_tracking['habit'] == '').any()):
+            raise ValueError('tracking rows do not fit the schema')
+    return df_tracking
+
+
+def split_tracking_rows(df_tracking, first_row=1, dtype=None):
+    """
+    Splits tracking rows read as text (or loosely typed) into the rows that fit
+    TRACKING_SCHEMA, converted, and the rows that do not (see check_entries).
+
+    Parameters:
+        df_tracking (pd.DataFrame): The date, habit and value columns as read.
+        first_row (int): The row number of the first row, for error messages.
+        dtype (dict): Types of the habit and value columns, e.g. COMPACT_DTYPES.
+
+    Returns:
+        tuple: The typed frame of the valid rows, the rejected rows as they were
+            read (with their index), and an error message per rejected row.
+    """
+    dates, habits, values, valid, errors = check_entries(df_tracking, first_row)
+    df_valid = pd.DataFrame({'date': dates[valid], 'habit': lowercase_habits(habits[valid]), 'value': values[valid]})
+    df_valid = df_valid.reset_index(drop=True).astype(dtype or {})
+    return df_valid, df_tracking[~valid], errors
+
+
+def load_tracking_csv(source, ops=(), first=0, dtype=None):
+    """
+    Reads tracking rows into TRACKING_SCHEMA and replays journal entries on them.
+
+    The typed read is tried first. If a row does not fit the schema, the rows
+    are read again as text, the journal is replayed on them (so its row
+    positions still match) and the rows that break the schema are split off
+    and reported instead of being coerced.
+
+    Parameters:
+        source: The file path or buffer.
+        ops (list): Journal entries to replay.
+        first (int): The position of the first row in the tracking file.
+        dtype (dict): Types of the habit and value columns, e.g. COMPACT_DTYPES.
+
+    Returns:
+        tuple: The typed frame of the valid rows, a frame of the rejected rows
+            as text, and an error message per rejected row.
+    """
+    try:
+        df_tracking = read_tracking_csv(source, dtype)
+    except ValueError:
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        df_tracking = pd.read_csv(source, dtype=str, keep_default_na=False)
+    for op in ops:
+        op = shift_journal_op(op, first, len(df_tracking))
+        if op is not None:
+            apply_journal_op(df_tracking, op)
+    if df_tracking['habit'].dtype == 'category':
+        return df_tracking, df_tracking.iloc[:0], []
+    return split_tracking_rows(df_tracking, first + 1, dtype)
+
+
+def lowercase_habits(habits):
+    """
+    Returns a habit column as a category of stripped, lowercase names.
+
+    Only the categories are lowercased, not every row, and names that differ
+    only in case or surrounding spaces become one category.
+
+    Parameters:
+        habits (pd.Series): The habit column.
+
+    Returns:
+        pd.Series: The habit column as a category.
+    """
+    habits = habits.astype('category')
+    categories = habits.cat.categories
+    lowered = categories.astype(str).str.strip().str.lower()
+    if lowered.equals(categories):
+        return habits
+    remap, names = pd.factorize(lowered)
+    codes = habits.cat.codes.to_numpy()
+    codes = np.where(codes >= 0, remap[codes], -1)
+    return pd.Series(pd.Categorical.from_codes(codes, names), index=habits.index, name=habits.name)
+
+
+def add_habit_categories(habits, df_rows):
+    """
+    Converts the habits of new tracking rows (in place) to the categories of an
+    existing habit column, so the two concatenate without losing the category.
+
+    Parameters:
+        habits (pd.Series): The existing category habit column.
+        df_rows (pd.DataFrame): The new rows.
+
+    Returns:
+        pd.Series: The existing column, with the new habits added to its categories.
+    """
+    new_habits = lowercase_habits(df_rows['habit'])
+    missing = new_habits.cat.categories.difference(habits.cat.categories)
+    if len(missing):
+        habits = habits.cat.add_categories(missing)
+    df_rows['habit'] = pd.Categorical(new_habits, categories=habits.cat.categories)
+    return habits
+
+
+def as_tracking_schema(df_tracking):
+    """Returns a copy of a tracking frame with its columns converted to TRACKING_SCHEMA."""
+    df_tracking = parse_dates(df_tracking.copy())
+    df_tracking['habit'] = lowercase_habits(df_tracking['habit'])
+    if df_tracking['value'].dtype.kind not in 'iuf':
+        df_tracking['value'] = pd.to_numeric(df_tracking['value'])
+    return df_tracking
+
+
+def read_user_csv(source):
+    """Reads a profile CSV file (or buffer) into USER_SCHEMA."""
+    return pd.read_csv(source, dtype=USER_SCHEMA, keep_default_na=False)
+
+
+def report_errors(message, errors, limit=10):
+    """Prints a message followed by the first limit error messages."""
+    print(message)
+    for error in errors[:limit]:
+        print('  ' + error)
+    if len(errors) > limit:
+        print(f'  ... and {len(errors) - limit} more')
+
+
+def date_strings(dates):
+    """Returns the 'YYYY-MM-DD' strings of a column of dates (datetime64 or strings) as an array."""
+    return np.asarray(dates).astype('datetime64[D]').astype(str)
+
+
+def append_tracking_rows(path, rows):
+    """
+    Appends tracking rows to the end of a tracking CSV file without rewriting it.
+
+    The file is opened in append mode, the rows are written, and the data is
+    fsynced before returning, so the cost of a new entry does not depend on the
+    size of the history already on disk. The header is written if the file does
+    not exist yet, and a missing trailing newline is repaired first so the new
+    record never runs into the last one.
+
+    Parameters:
+        path (str): The tracking CSV file to append to.
+        rows (list): A list of (date, habit, value) tuples.
+    """
+    append_tracking_chunks(path, [rows])
+
+
+def append_tracking_chunks(path, chunks):
+    """
+    Appends several chunks of tracking rows to a tracking CSV file in one write.
+
+    The file is opened once and fsynced once after the last chunk, so a large
+    import costs a single append however many chunks it arrives in, and only
+    one chunk is held in memory at a time.
+
+    Parameters:
+        path (str): The tracking CSV file to append to.
+        chunks (iterable): Lists of (date, habit, value) tuples.
+
+    Returns:
+        int: The number of rows written.
+    """
+    needs_header = not os.path.exists(path) or os.path.getsize(path) == 0
+    needs_newline = False
+    if not needs_header:
+        with open(path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) not in (b'\n', b'\r')
+
+    count = 0
+    with open(path, 'a', newline='') as f:
+        if needs_newline:
+            f.write('\n')
+        writer = csv.writer(f, lineterminator='\n')
+        if needs_header:
+            writer.writerow(TRACKING_COLUMNS)
+        for rows in chunks:
+            writer.writerows(rows)
+            count += len(rows)
+        f.flush()
+        os.fsync(f.fileno())
+    return count
+
+
+def atomic_write_csv(df, path):
+    """
+    Writes a frame to a CSV file so that readers see either the old or the new file.
+
+    The frame is written to a temporary file in the same directory, fsynced and
+    then renamed over the target, which replaces it in one step.
+
+    Parameters:
+        df (pd.DataFrame): The frame to write.
+        path (str): The CSV file to replace.
+    """
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', newline='') as f:
+        df.to_csv(f, index=False, lineterminator='\n')
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def atomic_write_json(obj, path):
+    """
+    Writes an object as JSON so that readers see either the old or the new file.
+
+    Parameters:
+        obj: The JSON serializable object.
+        path (str): The JSON file to replace.
+    """
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(obj, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+# derived per-user states kept next to the tracking log, e.g. streaks_<user>.json
+DERIVED_STATES = ('streaks', 'runs', 'last_seen')
+
+# derived per-user arrays kept next to the tracking log, e.g. rollup_<user>.npz
+DERIVED_ARRAYS = ('rollup',)
+
+
+### parse cache ####################################################
+class FrameCache:
+    """
+    Keeps parsed data files in memory for the session and reuses them until the
+    file on disk changes.
+
+    A cached frame is valid while the modification time and size of the file,
+    and of any files it depends on (such as a journal), match the values
+    recorded when it was parsed. Writes made through the app go through the
+    cache, so a save or an append never causes a re-parse.
+
+    Attributes:
+        hits (int): Number of loads served from memory.
+        misses (int): Number of loads that had to parse the file.
+    """
+
+    def __init__(self):
+        self._entries = {} # path -> [signature, frame, pending rows, parsed object]
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def signature(path, depends=()):
+        """
+        Returns the (mtime, size) pairs used to detect changes to a file.
+
+        Parameters:
+            path (str): The file.
+            depends (tuple): Other files whose changes also count; missing ones are allowed.
+        """
+        st = os.stat(path)
+        signature = (st.st_mtime_ns, st.st_size)
+        for dependency in depends:
+            try:
+                st = os.stat(dependency)
+                signature += (st.st_mtime_ns, st.st_size)
+            except FileNotFoundError:
+                signature += (None, None)
+        return signature
+
+    def load(self, path, reader=None, depends=()):
+        """
+        Returns the parsed contents of a file, parsing it only if it changed.
+
+        Parameters:
+            path (str): The file to load.
+            reader (callable): Parses the file into a frame. Defaults to pd.read_csv.
+            depends (tuple): Other files the parsed frame is built from.
+
+        Returns:
+            pd.DataFrame: A copy of the cached frame that the caller may modify.
+        """
+        return self._entry(path, reader, depends)[1].copy()
+
+    def load_shared(self, path, reader=None, depends=()):
+        """
+        Returns the cached frame itself, without the copy that load makes.
+
+        Used for lookups that read a few cells of a large frame.
+
+        Parameters:
+            path (str): The file to load.
+            reader (callable): Parses the file into a frame. Defaults to pd.read_csv.
+            depends (tuple): Other files the parsed frame is built from.
+
+        Returns:
+            pd.DataFrame: The shared cached frame. Callers must not modify it.
+        """
+        return self._entry(path, reader, depends)[1]
+
+    def load_parsed(self, path, parse, reader=None):
+        """
+        Returns an object built from a cached frame, building it only once per
+        version of the file.
+
+        Parameters:
+            path (str): The CSV file to load.
+            parse (callable): Builds the object from the parsed frame.
+            reader (callable): Parses the file into a frame. Defaults to pd.read_csv.
+
+        Returns:
+            object: The shared parsed object. Callers must not modify it.
+        """
+        entry = self._entry(path, reader)
+        if entry[3] is None:
+            entry[3] = parse(entry[1])
+        return entry[3]
+
+    def _entry(self, path, reader=None, depends=()):
+        """Returns the up to date cache entry for path, parsing the file if needed."""
+        entry = self._entries.get(path)
+        if entry is not None and entry[0] == self.signature(path, depends) and self._fold_pending(entry):
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        signature = self.signature(path, depends)
+        entry = [signature, (reader or pd.read_csv)(path), [], None]
+        self._entries[path] = entry
+        return entry
+
+    @staticmethod
+    def _fold_pending(entry):
+        """
+        Adds the rows appended since the last load to the cached frame.
+
+        Returns:
+            bool: False if the rows do not fit the frame's column types; the
+                file must then be parsed again.
+        """
+        if entry[2]:
+            new_rows = pd.DataFrame(entry[2], columns=entry[1].columns)
+            if 'date' in new_rows and entry[1]['date'].dtype.kind == 'M':
+                try:
+                    parse_dates(new_rows)   # keep the native date column
+                except ValueError:
+                    return False
+            if 'habit' in new_rows and entry[1]['habit'].dtype == 'category':
+                entry[1]['habit'] = add_habit_categories(entry[1]['habit'], new_rows)   # keep the category column
+            entry[1] = pd.concat([entry[1], new_rows], ignore_index=True)
+            entry[2] = []
+        return True
+
+    def store(self, path, frame, depends=()):
+        """Records a frame that was just written to path."""
+        self._entries[path] = [self.signature(path, depends), frame.copy(), [], None]
+
+    def append(self, path, rows, signature_before, depends=()):
+        """
+        Records rows that were just appended to path.
+
+        Parameters:
+            path (str): The file the rows were appended to.
+            rows (list): The appended rows.
+            signature_before: The file signature taken before the append.
+            depends (tuple): Other files the cached frame is built from.
+        """
+        entry = self._entries.get(path)
+        if entry is None or entry[0] != signature_before or entry[1].empty:
+            self.invalidate(path) # cached copy was stale (or has no dtypes yet)
+            return
+        entry[2].extend(rows)
+        entry[0] = self.signature(path, depends)
+        entry[3] = None
+
+    def patch(self, path, rows, column, values, signature_before, depends=()):
+        """
+        Records values that were just changed in the data behind path.
+
+        Parameters:
+            path (str): The file the cached frame was parsed from.
+            rows (list): The positions of the changed rows.
+            column (str): The changed column.
+            values (list): The new values, one per row.
+            signature_before: The signature taken before the change.
+            depends (tuple): Other files the cached frame is built from.
+        """
+        entry = self._entries.get(path)
+        if entry is None or entry[0] != signature_before or not self._fold_pending(entry):
+            self.invalidate(path)
+            return
+        frame = entry[1]
+        if frame[column].dtype.kind in 'iu' and not all(float(v).is_integer() for v in values):
+            frame[column] = frame[column].astype(np.float64)
+        frame.iloc[rows, frame.columns.get_loc(column)] = values
+        entry[0] = self.signature(path, depends)
+        entry[3] = None
+
+    def update(self, path, change, signature_before, depends=()):
+        """
+        Applies a change that was just recorded in the data behind path to the cached frame.
+
+        Parameters:
+            path (str): The file the cached frame was parsed from.
+            change (callable): Changes the frame in place.
+            signature_before: The signature taken before the change.
+            depends (tuple): Other files the cached frame is built from.
+        """
+        entry = self._entries.get(path)
+        if entry is None or entry[0] != signature_before or not self._fold_pending(entry):
+            self.invalidate(path)
+            return
+        change(entry[1])
+        entry[0] = self.signature(path, depends)
+        entry[3] = None
+
+    def invalidate(self, path=None):
+        """Drops one cached file, or every cached file if no path is given."""
+        if path is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(path, None)
+
+    def stats(self):
+        """Returns the cache hit and miss counters."""
+        return {'hits': self.hits, 'misses': self.misses}
+
+    def reset_stats(self):
+        """Sets the hit and miss counters back to zero."""
+        self.hits = 0
+        self.misses = 0
+
+
+# one cache shared by every Habit and User object in the session
+frame_cache = FrameCache()
+
+
+### user profile ###################################################
+class UserProfile:
+    """
+    The parsed contents of a user's profile file.
+
+    Habit names are lowercased once when the profile is parsed, so lookups of
+    a habit's unit or periodicity are plain dictionary reads. A profile is
+    shared between Habit and User objects and only rebuilt after the profile
+    file is written, so it must be treated as read-only.
+
+    Attributes:
+        username (str): The username of the user.
+        DOB (str): The date of birth of the user.
+        city (str): The city of the user.
+        current_habits (list): The current habits, as stored in the profile.
+        current_set (set): The lowercased names of the current habits.
+        measured_in (dict): Lowercased habit name -> unit of measurement.
+        period (dict): Lowercased habit name -> periodicity ('daily' or 'weekly').
+    """
+
+    __slots__ = ('username', 'DOB', 'city', 'current_habits', 'current_set',
+                 'measured_in', 'period')
+
+    def __init__(self, username, DOB, city, current_habits, measured_in, period):
+        """
+        Initializes a new UserProfile object.
+
+        Parameters:
+            username (str): The username of the user.
+            DOB (str): The date of birth of the user.
+            city (str): The city of the user.
+            current_habits (list): The current habits.
+            measured_in (dict): Habit name -> unit of measurement.
+            period (dict): Habit name -> periodicity.
+        """
+        self.username = username
+        self.DOB = DOB
+        self.city = city
+        self.current_habits = list(current_habits)
+        self.current_set = {h.lower() for h in self.current_habits}
+        self.measured_in = {k.lower(): v for k, v in measured_in.items()}
+        self.period = {k.lower(): v.lower() for k, v in period.items()}
+
+    @classmethod
+    def from_frame(cls, df_user):
+        """
+        Builds a profile from the first row of a user data frame.
+
+        Parameters:
+            df_user (pd.DataFrame): The user data as loaded from the profile file.
+
+        Returns:
+            UserProfile: The parsed profile.
+        """
+        row = df_user.iloc[0]
+        habits_string = row['current_habits']
+        current_habits = habits_string.split(",") if isinstance(habits_string, str) and habits_string else []
+        return cls(row['username'], row['DOB'], row['city'], current_habits,
+                   cls._parse_json(row['measured_in']), cls._parse_json(row['period']))
+
+    @staticmethod
+    def _parse_json(cell):
+        """Parses a JSON dictionary cell, treating an empty cell as an empty dictionary."""
+        if not isinstance(cell, str) or not cell.strip():
+            return {}
+        return json.loads(cell)
+
+
+class ProfileEditor:
+    """
+    A set of pending changes to a user's profile.
+
+    Returned by User.edit_profile(). Any number of habit additions, removals and
+    meta changes are applied in memory and written together when the with block
+    ends.
+    """
+
+    def __init__(self, profile):
+        """
+        Initializes a new ProfileEditor from the current profile.
+
+        Parameters:
+            profile (UserProfile): The profile to start from. It is not modified.
+        """
+        self.username = profile.username
+        self.DOB = profile.DOB
+        self.city = profile.city
+        self.current_habits = list(profile.current_habits)
+        self.measured_in = dict(profile.measured_in)
+        self.period = dict(profile.period)
+        self.changed = False
+
+    def add_habit(self, habit_name, measured_in, period):
+        """
+        Adds a new habit to the list of current habits.
+
+        Parameters:
+            habit_name (str): The name of the habit.
+            measured_in (str): The unit of measurement for the habit.
+            period (str): The periodicity of the habit ('daily' or 'weekly').
+
+        Returns:
+            bool: True if the habit was added.
+        """
+        habit_name = habit_name.lower() # lower habit name for continuaity
+        if habit_name in (h.lower() for h in self.current_habits):
+            print('Habit already exists, Please choose another name.')
+            return False
+        if not self.set_meta(habit_name, period, meta='period'):
+            return False
+        self.set_meta(habit_name, measured_in, meta='measured_in')
+        self.current_habits.append(habit_name)
+        return True
+
+    def remove_habit(self, habit_name):
+        """
+        Removes a habit from the list of current habits.
+
+        Parameters:
+            habit_name (str): The name of the habit to remove.
+
+        Returns:
+            bool: True if the habit was removed.
+        """
+        habit_name = habit_name.lower() # lowercase habit name for continuity
+        remaining = [h for h in self.current_habits if h.lower() != habit_name]
+        if len(remaining) == len(self.current_habits):
+            print(f'There was no {habit_name} to remove.')
+            return False
+        self.current_habits = remaining
+        self.changed = True
+        return True
+
+    def rename_habit(self, habit_name, new_name):
+        """
+        Renames a current habit, keeping its place, unit and periodicity.
+
+        Parameters:
+            habit_name (str): The name of the habit to rename.
+            new_name (str): The new name of the habit.
+
+        Returns:
+            bool: True if the habit was renamed.
+        """
+        habit_name, new_name = habit_name.lower(), new_name.strip().lower()
+        current = [h.lower() for h in self.current_habits]
+        if habit_name not in current:
+            print(f'There was no {habit_name} to rename.')
+            return False
+        known = set(current) | {h.lower() for h in self.measured_in} | {h.lower() for h in self.period}
+        if not new_name or new_name in known:   # a former habit keeps its unit and periodicity
+            print('Habit already exists, Please choose another name.')
+            return False
+        self.current_habits[current.index(habit_name)] = new_name
+        for meta in (self.measured_in, self.period):
+            for key in [k for k in meta if k.lower() == habit_name]:
+                meta[new_name] = meta.pop(key)
+        self.changed = True
+        return True
+
+    def set_meta(self, habit, value, meta='measured_in'):
+        """
+        Sets the value of a habit's meta information (measured_in or period).
+
+        Parameters:
+            habit (str): The name of the habit.
+            value (str): The new value for the meta information.
+            meta (str): The type of meta information to set ('measured_in' or 'period').
+
+        Returns:
+            bool: True if the value was set.
+        """
+        habit = habit.lower()
+        if meta == 'measured_in':
+            self.measured_in[habit] = value
+        elif meta == 'period':
+            value = value.lower()    # periodicity ensure not captialized
+            if value not in ['daily', 'weekly']:   # ensure periodcity is correct format
+                print('Incorrect Habit Periodicity, Please change to daily or weekly')
+                return False
+            self.period[habit] = value
+        self.changed = True
+        return True
+
+    def to_frame(self):
+        """Returns the edited profile as a user data frame ready to be saved."""
+        return pd.DataFrame({
+            'username': self.username,
+            'DOB': self.DOB,
+            'city': self.city,
+            'current_habits': ",".join(self.current_habits),
+            'measured_in': json.dumps(self.measured_in),
+            'period': json.dumps(self.period)}, index=[0])
+
+
+### bulk ingest ####################################################
+INGEST_CHUNK_SIZE = 10000
+
+
+def iter_entry_frames(entries, chunksize=INGEST_CHUNK_SIZE):
+    """
+    Splits a source of tracking entries into frames of at most chunksize rows.
+
+    Parameters:
+        entries: A DataFrame with date, habit and value columns; an iterable of
+            (date, habit, value) tuples or of dictionaries with those keys; or
+            the path of a .csv, .jsonl or .json (one object per line) file,
+            which is read chunk by chunk.
+        chunksize (int): The largest number of rows per frame.
+
+    Yields:
+        pd.DataFrame: Frames with date, habit and value columns, not yet validated.
+    """
+    if isinstance(entries, pd.DataFrame):
+        frame = entries if set(TRACKING_COLUMNS) <= set(entries.columns) else entries.set_axis(TRACKING_COLUMNS[:entries.shape[1]], axis=1)
+        for start in range(0, len(frame), chunksize):
+            yield frame.iloc[start:start+chunksize]
+        return
+
+    if isinstance(entries, (str, os.PathLike)):
+        path = os.fspath(entries)
+        if path.endswith(('.jsonl', '.json')):
+            reader = pd.read_json(path, lines=True, chunksize=chunksize, dtype={'date': str, 'habit': str})
+        else:
+            reader = pd.read_csv(path, chunksize=chunksize, dtype={'date': str, 'habit': str})
+        with reader:
+            yield from reader
+        return
+
+    chunk = []
+    for entry in entries:
+        if isinstance(entry, dict):
+            entry = (entry.get('date'), entry.get('habit'), entry.get('value'))
+        chunk.append(tuple(entry))
+        if len(chunk) == chunksize:
+            yield pd.DataFrame(chunk, columns=TRACKING_COLUMNS)
+            chunk = []
+    if chunk:
+        yield pd.DataFrame(chunk, columns=TRACKING_COLUMNS)
+
+
+def check_entries(frame, first_row=1):
+    """
+    Parses the columns of a frame of tracking entries and finds the invalid rows.
+
+    Dates must be YYYY-MM-DD, habit names must not be empty and values must be
+    finite numbers. Habit names are stripped and lowercased.
+
+    Parameters:
+        frame (pd.DataFrame): Raw date, habit and value columns.
+        first_row (int): The source row number of the first row, for error messages.
+
+    Returns:
+        tuple: The parsed dates, habits and values, a mask of the valid rows and
+            an error message per invalid row.
+    """
+    dates = pd.to_datetime(frame['date'].astype(str).str.strip(), format='%Y-%m-%d', errors='coerce')
+    habits = frame['habit'].where(frame['habit'].notna(), '').astype(str).str.strip().str.lower()
+    values = pd.to_numeric(frame['value'], errors='coerce')
+
+    bad_date = dates.isna().to_numpy()
+    bad_habit = (habits == '').to_numpy()
+    bad_value = ~np.isfinite(values.to_numpy(dtype=np.float64, na_value=np.nan))
+    errors = []
+    for i in np.flatnonzero(bad_date | bad_habit | bad_value):
+        problems = [name for name, bad in (('date', bad_date[i]), ('habit', bad_habit[i]), ('value', bad_value[i])) if bad]
+        errors.append(f'row {first_row + i}: invalid {", ".join(problems)}')
+    return dates, habits, values, ~(bad_date | bad_habit | bad_value), errors
+
+
+def validate_entries(frame, first_row=1):
+    """
+    Checks and normalizes a frame of tracking entries (see check_entries).
+
+    Parameters:
+        frame (pd.DataFrame): Raw date, habit and value columns.
+        first_row (int): The source row number of the first row, for error messages.
+
+    Returns:
+        tuple: The list of valid (date, habit, value) rows and a list of error messages.
+    """
+    for column in TRACKING_COLUMNS:
+        if column not in frame.columns:
+            return [], [f'missing column {column}']
+
+    dates, habits, values, valid, errors = check_entries(frame, first_row)
+    rows = list(zip(dates[valid].dt.strftime('%Y-%m-%d'), habits[valid], values[valid].tolist()))
+    return rows, errors
+
+
+def validate_rows(rows, first_row=1):
+    """
+    Checks and normalizes a few (date, habit, value) rows without building a
+    frame, with the rules and error messages of validate_entries.
+
+    Parameters:
+        rows (list): (date, habit, value) tuples.
+        first_row (int): The source row number of the first row, for error messages.
+
+    Returns:
+        tuple: The list of valid (date, habit, value) rows and a list of error messages.
+    """
+    valid, errors = [], []
+    for i, (date, habit, value) in enumerate(rows):
+        problems = []
+        try:
+            date = dt.strptime(str(date).strip(), '%Y-%m-%d').strftime('%Y-%m-%d')
+        except ValueError:
+            problems.append('date')
+        habit = str(habit).strip().lower() if isinstance(habit, str) else ''
+        if not habit:
+            problems.append('habit')
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            number = float('nan')
+        if number != number or number in (float('inf'), float('-inf')):
+            problems.append('value')
+        if problems:
+            errors.append(f'row {first_row + i}: invalid {", ".join(problems)}')
+        else:
+            valid.append((date, habit, value if isinstance(value, (int, float)) else number))
+    return valid, errors
+
+
+class EntryIndex:
+    """
+    Finds tracked entries by date, habit and entry number without scanning the log.
+
+    Maps every (day number, lowercase habit) pair to the positions of its rows
+    in the tracking log, in the order they were tracked. Appended rows are added
+    at the end, so the index stays valid as long as existing rows keep their
+    positions.
+
+    Attributes:
+        rows (int): The number of tracking rows indexed.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self._positions = {}
+
+    @classmethod
+    def from_frame(cls, df_tracking):
+        """Builds the index of a tracking frame."""
+        index = cls()
+        keys = pd.DataFrame({'day': day_numbers(df_tracking['date']),
+                             'habit': df_tracking['habit'].astype(str)})
+        for (day, habit), positions in keys.groupby(['day', 'habit'], sort=False).indices.items():
+            index._positions[(int(day), habit)] = positions.tolist()
+        index.rows = len(df_tracking)
+        return index
+
+    def add(self, rows):
+        """Indexes (date, habit, value) rows appended to the end of the log."""
+        for date, habit, _ in rows:
+            self._positions.setdefault((day_number(date), str(habit).lower()), []).append(self.rows)
+            self.rows += 1
+
+    def find(self, date, habit, entry=1):
+        """
+        Returns the position of an entry.
+
+        Parameters:
+            date (str): The date of the entry (YYYY-MM-DD).
+            habit (str): The lowercase name of the habit.
+            entry (int): Which entry of that day, starting at 1.
+
+        Returns:
+            int: The row position, or None if there is no such entry (or the date is invalid).
+        """
+        try:
+            positions = self._positions.get((day_number(date), habit), [])
+        except ValueError:
+            return None
+        return positions[entry-1] if 1 <= entry <= len(positions) else None
+
+
+### storage engines ################################################
+class Storage:
+    """
+    Base class of the storage engines behind Habit and User.
+
+    An engine stores the tracking log and the profile of every user. Subclasses
+    implement the load/save/append methods; the query methods below work on the
+    loaded tracking frame and are replaced by engines that can answer them
+    without a full scan.
+
+    Methods:
+        users(): Returns the usernames stored by the engine.
+        user_exists(username): Returns True if the user has a profile.
+        create_user(username, df_user): Stores a new profile and an empty tracking log.
+        load_tracking(username): Returns the tracking log as a DataFrame.
+        save_tracking(username, df_tracking): Replaces the tracking log.
+        append_tracking(username, rows): Adds (date, habit, value) rows to the tracking log.
+        append_tracking_chunks(username, chunks): Adds several lists of rows in one commit.
+        iter_tracking(username, start, chunksize): Yields the tracking log in bounded chunks.
+        load_user(username): Returns the profile as a one row DataFrame.
+        save_user(username, df_user): Replaces the profile.
+        load_profile(username): Returns the parsed UserProfile.
+        habit_history(username, habit): Returns the dates and values tracked for a habit.
+        habits_on(username, date): Returns the habits tracked on a date.
+        correct_entry(username, date, habit, new_value, entry): Changes the value of one entry.
+        correct_entries(username, corrections): Changes the values of several entries in one commit.
+        load_state(username, name): Returns a derived state (e.g. streaks) saved for a user.
+        save_state(username, name, state): Saves or, with None, removes a derived state.
+        load_arrays(username, name): Returns derived NumPy arrays (e.g. the daily rollup) saved for a user.
+        save_arrays(username, name, arrays): Saves or, with None, removes derived arrays.
+        get_cached(username, name): Returns an in-memory object derived from a user's log.
+        set_cached(username, name, obj): Keeps or, with None, drops such an object.
+        cache_stats(): Returns cache hit and miss counters.
+        close(): Finishes pending background work and releases resources.
+    """
+
+    name = None
+
+    def __init__(self):
+        self._profiles = {}
+        self._states = {}
+        self._cached = {}
+        self._hits = 0
+        self._misses = 0
+
+    def load_profile(self, username):
+        """Returns the parsed profile of a user, parsing it once until the next save."""
+        profile = self._profiles.get(username)
+        if profile is None:
+            self._misses += 1
+            profile = UserProfile.from_frame(self.load_user(username))
+            self._profiles[username] = profile
+        else:
+            self._hits += 1
+        return profile
+
+    def cache_stats(self):
+        """Returns the hit and miss counters of the profile cache."""
+        return {'hits': self._hits, 'misses': self._misses}
+
+    def close(self):
+        """Finishes pending background work and releases resources."""
+
+    def create_user(self, username, df_user):
+        """
+        Stores the profile of a new user together with an empty tracking log.
+
+        Parameters:
+            username (str): The username of the user.
+            df_user (pd.DataFrame): The one row profile frame.
+        """
+        self.save_user(username, df_user)
+        self.save_tracking(username, pd.DataFrame(columns=TRACKING_COLUMNS))
+        for name in DERIVED_STATES:   # states of an earlier user with the same name
+            self.save_state(username, name, None)
+        for name in DERIVED_ARRAYS:
+            self.save_arrays(username, name, None)
+        for key in [key for key in self._cached if key[0] == username]:
+            del self._cached[key]
+
+    def load_state(self, username, name):
+        """
+        Returns a derived state saved for a user.
+
+        Derived states summarize the tracking log (e.g. the streak of every habit)
+        so they can be read without loading the whole history. They are
+        maintained by Habit and rebuilt from the log when missing.
+
+        Parameters:
+            username (str): The username of the user.
+            name (str): The state name, one of DERIVED_STATES.
+
+        Returns:
+            dict: The state, or None if it was never saved.
+        """
+        return self._states.get((username, name))
+
+    def save_state(self, username, name, state):
+        """Saves a derived state for a user, or removes it when state is None."""
+        if state is None:
+            self._states.pop((username, name), None)
+        else:
+            self._states[(username, name)] = state
+
+    def load_arrays(self, username, name):
+        """
+        Returns derived arrays saved for a user.
+
+        Like derived states, but for large numeric data such as the daily
+        rollup, stored in a binary form.
+
+        Parameters:
+            username (str): The username of the user.
+            name (str): The name, one of DERIVED_ARRAYS.
+
+        Returns:
+            dict: The arrays by name, or None if they were never saved.
+        """
+        return self._states.get((username, name))
+
+    def save_arrays(self, username, name, arrays):
+        """Saves a dictionary of derived arrays for a user, or removes them when arrays is None."""
+        self.save_state(username, name, arrays)
+
+    def get_cached(self, username, name):
+        """
+        Returns an in-memory object derived from a user's tracking log.
+
+        Unlike derived states these objects (e.g. prefix sums) are not persisted;
+        they live for the session and are kept up to date by Habit's writes.
+
+        Parameters:
+            username (str): The username of the user.
+            name (str): The object's name.
+
+        Returns:
+            object: The cached object, or None.
+        """
+        return self._cached.get((username, name))
+
+    def set_cached(self, username, name, obj):
+        """Keeps an in-memory object derived from a user's tracking log, or drops it when obj is None."""
+        if obj is None:
+            self._cached.pop((username, name), None)
+        else:
+            self._cached[(username, name)] = obj
+
+    def append_tracking_chunks(self, username, chunks):
+        """
+        Adds several lists of (date, habit, value) rows to the tracking log.
+
+        Engines override this to commit every chunk in a single write while
+        holding only one chunk in memory. This fallback collects the chunks and
+        appends them together.
+
+        Parameters:
+            username (str): The username of the user.
+            chunks (iterable): Lists of (date, habit, value) tuples.
+
+        Returns:
+            int: The number of rows added.
+        """
+        rows = [row for chunk in chunks for row in chunk]
+        if rows:
+            self.append_tracking(username, rows)
+        return len(rows)
+
+    def iter_tracking(self, username, start=0, chunksize=INGEST_CHUNK_SIZE, compact=False):
+        """
+        Yields the tracking log in frames of at most chunksize rows, in the order
+        the rows were added.
+
+        Engines override this to read one chunk at a time. This fallback loads
+        the log and slices it.
+
+        Parameters:
+            username (str): The username of the user.
+            start (int): The position of the first row to yield.
+            chunksize (int): The largest number of rows per frame.
+            compact (bool): Whether to return habits as a category and values as
+                float32 (COMPACT_DTYPES), for analysis.
+
+        Yields:
+            pd.DataFrame: Frames with date, habit and value columns.
+        """
+        df_tracking = self.load_tracking(username)
+        for first in range(start, len(df_tracking), chunksize):
+            chunk = df_tracking.iloc[first:first+chunksize]
+            yield chunk.astype(COMPACT_DTYPES) if compact else chunk
+
+    def tracking_since(self, username, start):
+        """
+        Returns the tracking rows from position start on, in the order they were added.
+
+        Engines override this to read only those rows. This fallback loads the
+        log and slices it.
+
+        Parameters:
+            username (str): The username of the user.
+            start (int): The position of the first row to return.
+
+        Returns:
+            pd.DataFrame: The rows. Callers must not modify it.
+        """
+        return self.load_tracking(username).iloc[start:]
+
+    def habit_history(self, username, habit):
+        """
+        Returns the history of a habit sorted by date.
+
+        Parameters:
+            username (str): The username of the user.
+            habit (str): The lowercase name of the habit.
+
+        Returns:
+            tuple: A list of dates and a list of the corresponding values.
+        """
+        df_tracking = self.load_tracking(username)
+        df_tracking = df_tracking.sort_values(by='date', kind='stable')   # entries of a day keep their order
+        df_tracking = df_tracking[df_tracking['habit'] == habit]
+        return date_strings(df_tracking['date']).tolist(), df_tracking['value'].tolist()
+
+    def habits_on(self, username, date):
+        """Returns the habits tracked on a date (YYYY-MM-DD), in the order they were tracked."""
+        df_tracking = self.load_tracking(username)
+        return df_tracking.loc[df_tracking['date'] == date, 'habit'].tolist()
+
+    def correct_entry(self, username, date, habit, new_value, entry=1):
+        """
+        Changes the value of one tracked entry.
+
+        Parameters:
+            username (str): The username of the user.
+            date (str): The date of the entry (YYYY-MM-DD).
+            habit (str): The lowercase name of the habit.
+            new_value (float): The new value.
+            entry (int): Which entry of that day to change, starting at 1.
+
+        Returns:
+            bool: True if the entry existed and was changed.
+        """
+        return self.correct_entries(username, [(date, habit, new_value, entry)])[0] is not None
+
+    def correct_entries(self, username, corrections):
+        """
+        Changes the values of several tracked entries in one commit.
+
+        Engines override this to update the entries in place. This fallback
+        finds them with an EntryIndex and saves the log once.
+
+        Parameters:
+            username (str): The username of the user.
+            corrections (list): (date, habit, new_value, entry) tuples with lowercase habits.
+
+        Returns:
+            list: For every correction, the (row, old value) of the changed entry, or
+                None if it was not found. The row is the entry's position in the log,
+                or an engine's own row id.
+        """
+        df_tracking = self.load_tracking(username)
+        index = EntryIndex.from_frame(df_tracking)
+        column = df_tracking.columns.get_loc('value')
+        results = []
+        for date, habit, new_value, entry in corrections:
+            row = index.find(date, habit, entry)
+            if row is None:
+                results.append(None)
+                continue
+            results.append((row, _plain_value(df_tracking.iat[row, column])))
+            apply_journal_op(df_tracking, {'op': 'set', 'row': row, 'column': 'value', 'value': new_value})
+        if any(result is not None for result in results):
+            self.save_tracking(username, df_tracking)
+        return results
+
+    def rename_habit(self, username, habit, new_name):
+        """
+        Renames a habit in every row tracked so far.
+
+        Engines override this to rename the habit once, in their habit name
+        dictionary or journal, instead of rewriting every row. This fallback
+        saves the renamed log.
+
+        Parameters:
+            username (str): The username of the user.
+            habit (str): The lowercase name of the habit.
+            new_name (str): The new lowercase name.
+        """
+        df_tracking = self.load_tracking(username)
+        apply_journal_op(df_tracking, {'op': 'rename', 'column': 'habit', 'from': habit, 'to': new_name,
+                                       'before': len(df_tracking)})
+        self.save_tracking(username, df_tracking)
+
+
+# journal entries that trigger a background compaction of a tracking file
+JOURNAL_COMPACT_AFTER = 64
+# tracking files larger than this (in bytes) are read in chunks by habit_history
+STREAM_TRACKING_BYTES = 64 * 2**20
+
+
+class CsvStorage(Storage):
+    """
+    The default engine: one tracking_<user>.csv and one user_data_<user>.csv per user.
+
+    Parsed files are kept in a FrameCache and profiles are saved atomically.
+
+    A tracking file is never rewritten in place. New entries are appended as
+    complete lines at the end. Corrections are appended as deltas to a journal,
+    tracking_<user>.csv.journal, and replayed on top of the CSV when it is
+    loaded. Full saves, and the background compaction that folds the journal
+    into the CSV, write a new snapshot to a temporary file and rename it over
+    the old one, so readers see either the old or the new file. A checkpoint
+    file, tracking_<user>.csv.ckpt, records which journal entries the current
+    snapshot already contains, so after a crash at any point the next load
+    replays exactly the missing deltas.
+    """
+
+    name = 'csv'
+
+    def __init__(self, data_dir=None, cache=None):
+        """
+        Initializes a new CsvStorage.
+
+        Parameters:
+            data_dir (str): The directory holding the CSV files. Defaults to DATA_DIR.
+            cache (FrameCache): The parse cache to use. Defaults to the shared frame_cache.
+        """
+        super().__init__()
+        self.data_dir = data_dir or DATA_DIR
+        self.cache = cache if cache is not None else frame_cache
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self._compactions = {} # tracking path -> compaction thread
+        self._indexes = {} # tracking path -> [signature, EntryIndex]
+
+    def users(self):
+        """Returns the usernames that have a profile file."""
+        prefix = 'user_data_'
+        files = glob.glob(os.path.join(self.data_dir, prefix + '*.csv'))
+        return sorted(os.path.basename(f)[len(prefix):-len('.csv')] for f in files)
+
+    def user_exists(self, username):
+        """Returns True if the user has a profile file."""
+        return os.path.exists(user_data_path(username, self.data_dir))
+
+    def create_user(self, username, df_user):
+        """Writes a new profile file and an empty tracking file."""
+        os.makedirs(self.data_dir, exist_ok=True)
+        super().create_user(username, df_user)
+
+    ### tracking file and journal
+    def _lock(self, path):
+        """Returns the lock serializing writes to one tracking file."""
+        with self._locks_guard:
+            return self._locks.setdefault(path, threading.RLock())
+
+    @staticmethod
+    def _depends(path):
+        """Returns the files a loaded tracking frame is built from besides the CSV."""
+        return (path + '.journal', path + '.ckpt')
+
+    @staticmethod
+    def _read_checkpoint(path):
+        """Returns the last checkpoint: the journal seq and the inode of the snapshot containing it."""
+        try:
+            with open(path + '.ckpt') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {'seq': 0, 'inode': None}
+
+    @staticmethod
+    def _read_journal(path):
+        """Returns the complete entries of the journal; torn or unreadable lines are skipped."""
+        ops = []
+        try:
+            with open(path + '.journal') as f:
+                for line in f:
+                    if not line.endswith('\n'):
+                        continue
+                    try:
+                        ops.append(json.loads(line))
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            pass
+        return ops
+
+    def _pending_ops(self, path):
+        """Returns the journal entries that the current snapshot does not contain yet."""
+        checkpoint = self._read_checkpoint(path)
+        applied = checkpoint['seq'] if checkpoint['inode'] == os.stat(path).st_ino else 0
+        return [op for op in self._read_journal(path) if op['seq'] > applied]
+
+    def _last_seq(self, path):
+        """Returns the sequence number of the newest journal entry or checkpoint."""
+        ops = self._read_journal(path)
+        return max([self._read_checkpoint(path)['seq']] + [op['seq'] for op in ops])
+
+    def _entry_index(self, path):
+        """
+        Returns the EntryIndex of a tracking file. Call with the file's lock held.
+
+        Like the parse cache, the index is rebuilt only when the file or its
+        journal changed outside of this engine.
+        """
+        signature = FrameCache.signature(path, self._depends(path))
+        cached = self._indexes.get(path)
+        if cached is None or cached[0] != signature:
+            df_tracking = self.cache.load_shared(path, self._read_tracking, self._depends(path))
+            cached = self._indexes[path] = [signature, EntryIndex.from_frame(df_tracking)]
+        return cached[1]
+
+    def _carry_index(self, path, signature_before, rows=()):
+        """Keeps the EntryIndex current across a write that leaves the existing rows where they are."""
+        cached = self._indexes.get(path)
+        if cached is not None and cached[0] == signature_before:
+            cached[1].add(rows)
+            cached[0] = FrameCache.signature(path, self._depends(path))
+
+    def _read_tracking(self, path):
+        """
+        Reads the snapshot and replays the journal entries it does not contain yet
+        (recovery). Rows that do not fit the tracking schema are rejected.
+        """
+        df_tracking, rejected, errors = load_tracking_csv(path, self._pending_ops(path))
+        if errors:
+            self._reject_rows(path, df_tracking, rejected, errors)
+        return df_tracking
+
+    def _reject_rows(self, path, df_tracking, rejected, errors):
+        """
+        Moves tracking rows that do not fit the schema to <file>.rejected and
+        installs a snapshot of the valid rows, so the journal and the EntryIndex
+        keep matching the file's row positions. Call with the file's lock held.
+        """
+        report_errors(f'Rejected {len(errors)} rows of {path} that do not fit the tracking schema '
+                      f'(moved to {path}.rejected):', errors)
+        header = not os.path.exists(path + '.rejected')
+        with open(path + '.rejected', 'a', newline='') as f:
+            rejected.to_csv(f, header=header, index=False, lineterminator='\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self._install_snapshot(path, self._write_snapshot(path, df_tracking), self._last_seq(path))
+
+    def _write_journal(self, path, op):
+        """
+        Appends one entry to the journal and fsyncs it. Call with the file's lock held.
+
+        A torn last line left by an interrupted write is cut off first, so the
+        new entry starts on a line of its own.
+        """
+        op = dict(op, seq=self._last_seq(path) + 1)
+        with contextlib.suppress(FileNotFoundError), open(path + '.journal', 'r+b') as f:
+            journal = f.read()
+            if journal and not journal.endswith(b'\n'):
+                f.truncate(journal.rfind(b'\n') + 1)
+        with open(path + '.journal', 'a') as f:
+            f.write(json.dumps(op) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        return op
+
+    def _write_snapshot(self, path, df_tracking):
+        """Writes a frame to the temporary snapshot file and returns its path."""
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', newline='') as f:
+            df_tracking.to_csv(f, index=False, lineterminator='\n')
+            f.flush()
+            os.fsync(f.fileno())
+        return tmp_path
+
+    def _install_snapshot(self, path, tmp_path, seq):
+        """
+        Replaces the tracking file with a written snapshot that contains every
+        journal entry up to seq. Call with the file's lock held.
+        """
+        checkpoint = {'seq': seq, 'inode': os.stat(tmp_path).st_ino}
+        with open(path + '.ckpt.tmp', 'w') as f:
+            json.dump(checkpoint, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.ckpt.tmp', path + '.ckpt')
+        os.replace(tmp_path, path)
+        self._trim_journal(path, seq)
+
+    def _trim_journal(self, path, seq):
+        """Drops the journal entries up to seq, which the snapshot now contains."""
+        remaining = [op for op in self._read_journal(path) if op['seq'] > seq]
+        if not remaining:
+            if os.path.exists(path + '.journal'):
+                os.remove(path + '.journal')
+            return
+        with open(path + '.journal.tmp', 'w') as f:
+            f.writelines(json.dumps(op) + '\n' for op in remaining)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.journal.tmp', path + '.journal')
+
+    def compact(self, username, wait=False):
+        """
+        Folds the journal into a new snapshot of the tracking file.
+
+        The work runs in a background thread so the caller does not wait for the
+        rewrite. Entries appended while it runs are carried over to the new file.
+
+        Parameters:
+            username (str): The username of the user.
+            wait (bool): Whether to wait until the compaction has finished.
+        """
+        path = tracking_path(username, self.data_dir)
+        with self._lock(path):
+            thread = self._compactions.get(path)
+            if thread is None or not thread.is_alive():
+                thread = threading.Thread(target=self._compact, args=(path,), daemon=True)
+                self._compactions[path] = thread
+                thread.start()
+        if wait:
+            thread.join()
+
+    def _compact(self, path):
+        """Runs one compaction of a tracking file (see compact)."""
+        with self._lock(path):
+            if not os.path.exists(path):
+                return
+            ops = self._pending_ops(path)
+            if not ops:
+                return
+            seq = ops[-1]['seq']
+            inode = os.stat(path).st_ino
+            size = os.path.getsize(path)
+
+        # the slow part runs without the lock, on the part of the file that existed
+        with open(path, 'rb') as f:
+            try:
+                df_tracking = read_tracking_csv(io.BytesIO(f.read(size)))
+            except ValueError:
+                return   # the next load rejects the rows that break the schema
+        for op in ops:
+            apply_journal_op(df_tracking, op)
+        tmp_path = self._write_snapshot(path, df_tracking)
+
+        with self._lock(path):
+            st = os.stat(path)
+            if st.st_ino != inode or st.st_size < size: # replaced by a full save meanwhile
+                os.remove(tmp_path)
+                return
+            if st.st_size > size: # carry over lines appended during the compaction
+                with open(path, 'rb') as src, open(tmp_path, 'ab') as dst:
+                    src.seek(size)
+                    dst.write(src.read())
+                    dst.flush()
+                    os.fsync(dst.fileno())
+            signature_before = FrameCache.signature(path, self._depends(path))
+            self._install_snapshot(path, tmp_path, seq)
+            self.cache.invalidate(path)
+            self._carry_index(path, signature_before) # rows keep their positions
+
+    def close(self):
+        """Waits for running compactions to finish."""
+        for thread in list(self._compactions.values()):
+            thread.join()
+
+    def load_tracking(self, username):
+        """Loads tracking data from the CSV file and its journal."""
+        path = tracking_path(username, self.data_dir)
+        with self._lock(path):
+            return self.cache.load(path, self._read_tracking, self._depends(path))
+
+    def save_tracking(self, username, df_tracking):
+        """Saves tracking data as a new snapshot that replaces the CSV file atomically."""
+        path = tracking_path(username, self.data_dir)
+        df_tracking = as_tracking_schema(df_tracking)
+        with self._lock(path):
+            tmp_path = self._write_snapshot(path, df_tracking)
+            self._install_snapshot(path, tmp_path, self._last_seq(path) if os.path.exists(path) else 0)
+            self.cache.store(path, df_tracking, self._depends(path))
+
+    def append_tracking(self, username, rows):
+        """Appends rows to the end of the tracking CSV file."""
+        path = tracking_path(username, self.data_dir)
+        with self._lock(path):
+            signature_before = FrameCache.signature(path, self._depends(path)) if os.path.exists(path) else None
+            append_tracking_rows(path, rows)
+            self.cache.append(path, rows, signature_before, self._depends(path))
+            self._carry_index(path, signature_before, rows)
+
+    def append_tracking_chunks(self, username, chunks):
+        """Appends every chunk to the tracking CSV file with one open and one fsync."""
+        path = tracking_path(username, self.data_dir)
+        with self._lock(path):
+            count = append_tracking_chunks(path, chunks)
+            self.cache.invalidate(path) # the imported rows are not kept in memory
+        return count
+
+    def iter_tracking(self, username, start=0, chunksize=INGEST_CHUNK_SIZE, compact=False):
+        """
+        Parses the tracking file chunksize lines at a time and replays the
+        journal on each chunk. Rows appended after the first chunk was read are
+        left for the next call. Compact chunks are parsed straight into their
+        column types.
+        """
+        path = tracking_path(username, self.data_dir)
+        with self._lock(path):
+            f = open(path, 'rb')
+            size = os.fstat(f.fileno()).st_size   # appends only add complete lines after this
+            ops = self._pending_ops(path)
+        with f:
+            header = f.readline()
+            remaining = size - len(header)
+            row = 0
+            while remaining > 0:
+                data = b''.join(itertools.islice(f, min(chunksize, start - row) if row < start else chunksize))[:remaining]
+                if not data:
+                    break
+                remaining -= len(data)
+                if row < start:   # skipped lines are counted, not parsed
+                    row += data.count(b'\n')
+                    continue
+                chunk, rejected, errors = load_tracking_csv(io.BytesIO(header + data), ops, row,
+                                                            COMPACT_DTYPES if compact else None)
+                if errors:   # left in the file for the next full load to move aside
+                    report_errors(f'Skipped {len(errors)} rows of {path} that do not fit the tracking schema:', errors)
+                row += len(chunk) + len(rejected)
+                yield chunk
+
+    def tracking_since(self, username, start):
+        """Slices the cached frame without the copy that load_tracking makes."""
+        path = tracking_path(username, self.data_dir)
+        with self._lock(path):
+            return self.cache.load_shared(path, self._read_tracking, self._depends(path)).iloc[start:]
+
+    def habit_history(self, username, habit):
+        """
+        Returns the history of a habit sorted by date.
+
+        Files larger than STREAM_TRACKING_BYTES are read in compact chunks and
+        only the habit's entries are kept, so memory is bounded by the chunk size
+        and the length of that habit's history.
+        """
+        if os.path.getsize(tracking_path(username, self.data_dir)) <= STREAM_TRACKING_BYTES:
+            return super().habit_history(username, habit)
+        days, values = [np.zeros(0, dtype=np.int64)], [np.zeros(0)]
+        for chunk in self.iter_tracking(username, compact=True):
+            habits = chunk['habit'].cat
+            keep = np.asarray(habits.categories == habit)[habits.codes] & (habits.codes >= 0)
+            days.append(day_numbers(chunk['date'])[keep])
+            values.append(widen_float32(chunk['value'].to_numpy()[keep]))
+        days, values = np.concatenate(days), np.concatenate(values)
+        order = np.argsort(days, kind='stable')
+        return date_strings(days[order].astype('datetime64[D]')).tolist(), values[order].tolist()
+
+    def correct_entries(self, username, corrections):
+        """
+        Finds the entries in the EntryIndex and records all the changes as one
+        journal delta instead of rewriting the CSV file.
+        """
+        path = tracking_path(username, self.data_dir)
+        with self._lock(path):
+            index = self._entry_index(path)
+            values = self.cache.load_shared(path, self._read_tracking, self._depends(path))['value']
+            changes = {}
+            results = []
+            for date, habit, new_value, entry in corrections:
+                row = index.find(date, habit, entry)
+                if row is None:
+                    results.append(None)
+                    continue
+                results.append((row, changes.get(row, _plain_value(values.iat[row]))))
+                changes[row] = _plain_value(new_value)
+            if not changes:
+                return results
+            signature_before = FrameCache.signature(path, self._depends(path))
+            op = self._write_journal(path, {'op': 'set', 'rows': list(changes), 'column': 'value',
+                                            'values': list(changes.values())})
+            self.cache.patch(path, op['rows'], 'value', op['values'], signature_before, self._depends(path))
+            self._carry_index(path, signature_before)
+            if op['seq'] - self._read_checkpoint(path)['seq'] >= JOURNAL_COMPACT_AFTER:
+                self.compact(username)
+        return results
+
+    def rename_habit(self, username, habit, new_name):
+        """
+        Records the rename as one journal entry instead of rewriting the CSV
+        file. The entry covers the rows tracked so far; the habit categories of
+        the cached frame are renamed, and compaction writes the new name to disk.
+        """
+        path = tracking_path(username, self.data_dir)
+        with self._lock(path):
+            rows = len(self.cache.load_shared(path, self._read_tracking, self._depends(path)))
+            signature_before = FrameCache.signature(path, self._depends(path))
+            op = self._write_journal(path, {'op': 'rename', 'column': 'habit', 'from': habit, 'to': new_name,
+                                            'before': rows})
+            self.cache.update(path, lambda df_tracking: apply_journal_op(df_tracking, op),
+                              signature_before, self._depends(path))
+            self._indexes.pop(path, None)   # entries are indexed by habit name
+            if op['seq'] - self._read_checkpoint(path)['seq'] >= JOURNAL_COMPACT_AFTER:
+                self.compact(username)
+
+    def load_user(self, username):
+        """Loads user data from a CSV file."""
+        return self.cache.load(user_data_path(username, self.data_dir), read_user_csv)
+
+    def save_user(self, username, df_user):
+        """Saves user data to a CSV file, replacing the old file atomically."""
+        path = user_data_path(username, self.data_dir)
+        atomic_write_csv(df_user, path)
+        self.cache.store(path, df_user)
+
+    def load_profile(self, username):
+        """Returns the parsed profile, rebuilt only when the profile file changes."""
+        return self.cache.load_parsed(user_data_path(username, self.data_dir), UserProfile.from_frame, read_user_csv)
+
+    def cache_stats(self):
+        """Returns the hit and miss counters of the parse cache."""
+        return self.cache.stats()
+
+    def load_state(self, username, name):
+        """Loads a derived state from <name>_<user>.json."""
+        try:
+            with open(os.path.join(self.data_dir, f'{name}_{username}.json')) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save_state(self, username, name, state):
+        """Replaces <name>_<user>.json atomically, or deletes it when state is None."""
+        path = os.path.join(self.data_dir, f'{name}_{username}.json')
+        if state is None:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+        else:
+            atomic_write_json(state, path)
+
+    def load_arrays(self, username, name):
+        """Loads derived arrays from <name>_<user>.npz."""
+        try:
+            with np.load(os.path.join(self.data_dir, f'{name}_{username}.npz')) as archive:
+                return {key: archive[key] for key in archive.files}
+        except FileNotFoundError:
+            return None
+
+    def save_arrays(self, username, name, arrays):
+        """Replaces <name>_<user>.npz atomically, or deletes it when arrays is None."""
+        path = os.path.join(self.data_dir, f'{name}_{username}.npz')
+        if arrays is None:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+            return
+        with open(path + '.tmp', 'wb') as f:
+            np.savez(f, **arrays)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+
+
+def shift_journal_op(op, first, count):
+    """
+    Restricts a journal entry to the rows of a chunk of the tracking file.
+
+    Parameters:
+        op (dict): The journal entry.
+        first (int): The position of the chunk's first row in the file.
+        count (int): The number of rows in the chunk.
+
+    Returns:
+        dict: The entry with row positions relative to the chunk, or None if it
+            does not touch the chunk.
+    """
+    if op['op'] == 'rename':
+        return dict(op, before=min(op['before'] - first, count)) if op['before'] > first else None
+    rows, values = (op['rows'], op['values']) if 'rows' in op else ([op['row']], [op['value']])
+    hits = [(row - first, value) for row, value in zip(rows, values) if first <= row < first + count]
+    if not hits:
+        return None
+    return dict(op, rows=[row for row, _ in hits], values=[value for _, value in hits])
+
+
+def apply_journal_op(df_tracking, op):
+    """
+    Applies one journal entry to a tracking frame in place.
+
+    Parameters:
+        df_tracking (pd.DataFrame): The tracking frame.
+        op (dict): The journal entry. 'set' entries change one cell ('row' and 'value')
+            or one cell in each of several rows ('rows' and 'values'). 'rename' entries
+            rename a habit ('from' and 'to') in the rows before position 'before'.
+    """
+    if op['op'] == 'rename':
+        column = op['column']
+        habits = df_tracking[column]
+        if habits.dtype == 'category':
+            match = (habits == op['from']).to_numpy()
+        else:   # rows read as text
+            match = (habits.astype(str).str.strip().str.lower() == op['from']).to_numpy()
+        match[op['before']:] = False   # rows tracked after the rename keep their name
+        if not match.any():
+            return
+        if habits.dtype == 'category' and op['to'] not in habits.cat.categories:
+            df_tracking[column] = habits.cat.add_categories([op['to']])
+        df_tracking.iloc[np.flatnonzero(match), df_tracking.columns.get_loc(column)] = op['to']
+        if (habits.dtype == 'category' and op['from'] in habits.cat.categories
+                and not (df_tracking[column] == op['from']).any()):
+            df_tracking[column] = df_tracking[column].cat.remove_categories([op['from']])
+    elif op['op'] == 'set':
+        column = op['column']
+        rows, values = (op['rows'], op['values']) if 'rows' in op else ([op['row']], [op['value']])
+        if df_tracking[column].dtype.kind in 'iu' and not all(float(v).is_integer() for v in values):
+            df_tracking[column] = df_tracking[column].astype(np.float64)
+        df_tracking.iloc[rows, df_tracking.columns.get_loc(column)] = values
+
+
+class SqliteStorage(Storage):
+    """
+    Stores every user in one SQLite database.
+
+    Tracking rows are indexed on (username, habit, date) and (username, date), so
+    habit histories, the habits of a day and single entry corrections are index
+    lookups instead of full scans. Habit names compare case-insensitively.
+    Rows that do not fit the tracking schema are moved to rejected_tracking
+    when they are loaded.
+    """
+
+    name = 'sqlite'
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS users (
+            username TEXT PRIMARY KEY,
+            DOB TEXT,
+            city TEXT,
+            current_habits TEXT,
+            measured_in TEXT,
+            period TEXT);
+        CREATE TABLE IF NOT EXISTS tracking (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL,
+            date TEXT NOT NULL,
+            habit TEXT NOT NULL COLLATE NOCASE,
+            value NUMERIC);
+        CREATE INDEX IF NOT EXISTS tracking_user_habit_date ON tracking (username, habit, date);
+        CREATE INDEX IF NOT EXISTS tracking_user_date ON tracking (username, date);
+        CREATE TABLE IF NOT EXISTS rejected_tracking (
+            id INTEGER PRIMARY KEY,
+            username TEXT NOT NULL,
+            date TEXT,
+            habit TEXT,
+            value);
+        CREATE TABLE IF NOT EXISTS state (
+            username TEXT NOT NULL,
+            name TEXT NOT NULL,
+            data TEXT NOT NULL,
+            PRIMARY KEY (username, name));
+        CREATE TABLE IF NOT EXISTS arrays (
+            username TEXT NOT NULL,
+            name TEXT NOT NULL,
+            data BLOB NOT NULL,
+            PRIMARY KEY (username, name));
+    """
+
+    def __init__(self, path=None):
+        """
+        Initializes a new SqliteStorage.
+
+        Parameters:
+            path (str): The database file. Defaults to DATA_DIR/habits.db.
+        """
+        super().__init__()
+        self.path = path or os.path.join(DATA_DIR, 'habits.db')
+        self._conn = None
+
+    @property
+    def conn(self):
+        """The database connection, opened and initialized on first use."""
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._conn = sqlite3.connect(self.path)
+            self._conn.executescript(self.SCHEMA)
+        return self._conn
+
+    def close(self):
+        """Closes the database connection."""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def users(self):
+        """Returns the usernames stored in the database."""
+        return [r[0] for r in self.conn.execute('SELECT username FROM users ORDER BY username')]
+
+    def user_exists(self, username):
+        """Returns True if the user has a profile."""
+        return self.conn.execute('SELECT 1 FROM users WHERE username = ?', (username,)).fetchone() is not None
+
+    def load_tracking(self, username):
+        """Loads a user's tracking rows in the order they were added."""
+        return self.tracking_since(username, 0)
+
+    def _reject_rows(self, username, df_tracking, start):
+        """
+        Moves the rows of a frame read with their ids that do not fit the tracking
+        schema to rejected_tracking, reports them and returns the valid rows.
+        """
+        df_valid, rejected, errors = split_tracking_rows(df_tracking, start + 1)
+        report_errors(f'Rejected {len(errors)} tracking rows of {username} that do not fit the tracking schema '
+                      f'(moved to the rejected_tracking table):', errors)
+        ids = [(int(i),) for i in rejected.index]
+        with self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO rejected_tracking SELECT id, username, date, habit, value '
+                                  'FROM tracking WHERE id = ?', ids)
+            self.conn.executemany('DELETE FROM tracking WHERE id = ?', ids)
+        return df_valid
+
+    def save_tracking(self, username, df_tracking):
+        """Replaces a user's tracking rows in one transaction."""
+        rows = zip(date_strings(df_tracking['date']).tolist(), df_tracking['habit'], df_tracking['value'])
+        with self.conn:
+            self.conn.execute('DELETE FROM tracking WHERE username = ?', (username,))
+            self.conn.executemany('INSERT INTO tracking (username, date, habit, value) VALUES (?, ?, ?, ?)',
+                                  ((username, d, h, _plain_value(v)) for d, h, v in rows))
+
+    def append_tracking(self, username, rows):
+        """Inserts new tracking rows in one transaction."""
+        self.append_tracking_chunks(username, [rows])
+
+    def append_tracking_chunks(self, username, chunks):
+        """Inserts every chunk of rows in a single transaction."""
+        count = 0
+        with self.conn:
+            for rows in chunks:
+                self.conn.executemany('INSERT INTO tracking (username, date, habit, value) VALUES (?, ?, ?, ?)',
+                                      ((username, d, h, _plain_value(v)) for d, h, v in rows))
+                count += len(rows)
+        return count
+
+    def iter_tracking(self, username, start=0, chunksize=INGEST_CHUNK_SIZE, compact=False):
+        """
+        Fetches the user's rows chunksize at a time from one query in insertion
+        order. Rows that do not fit the tracking schema are reported and skipped.
+        """
+        query = 'SELECT date, habit, value FROM tracking WHERE username = ? ORDER BY id LIMIT -1 OFFSET ?'
+        dtype = COMPACT_DTYPES if compact else None
+        row = start
+        for chunk in pd.read_sql_query(query, self.conn, params=(username, start), chunksize=chunksize):
+            try:
+                typed = typed_tracking(chunk, dtype)
+            except ValueError:
+                typed, _, errors = split_tracking_rows(chunk, row + 1, dtype)
+                report_errors(f'Skipped {len(errors)} tracking rows of {username} that do not fit the tracking schema:',
+                              errors)
+            row += len(chunk)
+            yield typed
+
+    def tracking_since(self, username, start):
+        """
+        Fetches only the user's rows after the first start ones, in insertion
+        order. Rows that do not fit the tracking schema are rejected.
+        """
+        df_tracking = pd.read_sql_query('SELECT id, date, habit, value FROM tracking WHERE username = ? '
+                                        'ORDER BY id LIMIT -1 OFFSET ?', self.conn, params=(username, start),
+                                        index_col='id')
+        try:
+            return typed_tracking(df_tracking).reset_index(drop=True)
+        except ValueError:
+            return self._reject_rows(username, df_tracking, start)
+
+    def load_user(self, username):
+        """Loads a user's profile as a one row DataFrame."""
+        df_user = pd.read_sql_query(f'SELECT {", ".join(USER_COLUMNS)} FROM users WHERE username = ?',
+                                    self.conn, params=(username,))
+        return df_user.fillna('').astype(USER_SCHEMA)
+
+    def save_user(self, username, df_user):
+        """Replaces a user's profile."""
+        row = df_user.iloc[0]
+        values = [username] + [None if pd.isna(row[c]) else str(row[c]) for c in USER_COLUMNS[1:]]
+        with self.conn:
+            self.conn.execute(f'INSERT OR REPLACE INTO users ({", ".join(USER_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?)', values)
+        self._profiles.pop(username, None)
+
+    def load_state(self, username, name):
+        """Loads a derived state from the state table."""
+        row = self.conn.execute('SELECT data FROM state WHERE username = ? AND name = ?', (username, name)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def save_state(self, username, name, state):
+        """Replaces a derived state in the state table, or deletes it when state is None."""
+        with self.conn:
+            if state is None:
+                self.conn.execute('DELETE FROM state WHERE username = ? AND name = ?', (username, name))
+            else:
+                self.conn.execute('INSERT OR REPLACE INTO state (username, name, data) VALUES (?, ?, ?)',
+                                  (username, name, json.dumps(state)))
+
+    def load_arrays(self, username, name):
+        """Loads derived arrays stored as an npz blob in the arrays table."""
+        row = self.conn.execute('SELECT data FROM arrays WHERE username = ? AND name = ?', (username, name)).fetchone()
+        if row is None:
+            return None
+        with np.load(io.BytesIO(row[0])) as archive:
+            return {key: archive[key] for key in archive.files}
+
+    def save_arrays(self, username, name, arrays):
+        """Replaces derived arrays in the arrays table, or deletes them when arrays is None."""
+        with self.conn:
+            if arrays is None:
+                self.conn.execute('DELETE FROM arrays WHERE username = ? AND name = ?', (username, name))
+                return
+            buffer = io.BytesIO()
+            np.savez(buffer, **arrays)
+            self.conn.execute('INSERT OR REPLACE INTO arrays (username, name, data) VALUES (?, ?, ?)',
+                              (username, name, buffer.getvalue()))
+
+    def habit_history(self, username, habit):
+        """
+        Returns the dates and values of a habit using the (username, habit, date) index.
+
+        If a row does not fit the tracking schema, the user's rows are loaded
+        once so the bad ones are moved to rejected_tracking (see tracking_since),
+        and the history is read again.
+        """
+        query = 'SELECT date, value FROM tracking WHERE username = ? AND habit = ? ORDER BY date, id'
+        rows = self.conn.execute(query, (username, habit)).fetchall()
+        dates, values = [r[0] for r in rows], [r[1] for r in rows]
+        try:
+            fits = (not np.isnat(np.array(dates, dtype='datetime64[D]')).any()
+                    and np.isfinite(np.array(values, dtype=float)).all())
+        except (TypeError, ValueError):
+            fits = False
+        if not fits:
+            self.tracking_since(username, 0)
+            rows = self.conn.execute(query, (username, habit)).fetchall()
+            dates, values = [r[0] for r in rows], [r[1] for r in rows]
+        return dates, values
+
+    def habits_on(self, username, date):
+        """Returns the habits tracked on a date using the (username, date) index."""
+        rows = self.conn.execute('SELECT habit FROM tracking WHERE username = ? AND date = ? ORDER BY id',
+                                 (username, date))
+        return [r[0] for r in rows]
+
+    def correct_entries(self, username, corrections):
+        """
+        Updates the indexed rows in one transaction instead of rewriting the user's history.
+
+        Each entry is reported by its row id; its position would take counting
+        every row of the user before it.
+        """
+        results = []
+        with self.conn:
+            for date, habit, new_value, entry in corrections:
+                row = None
+                if entry >= 1:
+                    row = self.conn.execute('SELECT id, value FROM tracking WHERE username = ? AND habit = ? AND date = ? '
+                                            'ORDER BY id LIMIT 1 OFFSET ?', (username, habit, date, entry-1)).fetchone()
+                if row is None:
+                    results.append(None)
+                    continue
+                self.conn.execute('UPDATE tracking SET value = ? WHERE id = ?', (_plain_value(new_value), row[0]))
+                results.append(row)
+        return results
+
+    def rename_habit(self, username, habit, new_name):
+        """Renames the habit's rows with one UPDATE on the (username, habit, date) index."""
+        with self.conn:
+            self.conn.execute('UPDATE tracking SET habit = ? WHERE username = ? AND habit = ?',
+                              (new_name, username, habit))
+
+
+class NpzStorage(CsvStorage):
+    """
+    Stores each tracking log as a columnar NumPy archive, tracking_<user>.npz.
+
+    The archive holds three columns, int32 day numbers (days since 1970-01-01),
+    uint16 habit codes and float32 values, plus the habit name dictionary the
+    codes point into. Loading it is a few array reads with no text parsing, and
+    dates come back as a datetime64 column and habits as a pandas Categorical. Values are widened to
+    float64 on load (see widen_float32) so averages and totals print the same as
+    with the CSV files.
+    Profiles stay in the CSV files of CsvStorage.
+
+    The archive is rewritten on every change, so this engine suits large,
+    read-mostly histories.
+    """
+
+    name = 'npz'
+
+    def tracking_file(self, username):
+        """Returns the path of a user's tracking archive."""
+        return os.path.join(self.data_dir, f'tracking_{username}.npz')
+
+    def load_tracking(self, username):
+        """Loads tracking data from the columnar archive."""
+        return self.cache.load(self.tracking_file(username), read_tracking_npz)
+
+    def tracking_since(self, username, start):
+        """Slices the cached frame without the copy that load_tracking makes."""
+        return self.cache.load_shared(self.tracking_file(username), read_tracking_npz).iloc[start:]
+
+    def save_tracking(self, username, df_tracking):
+        """Saves tracking data to the columnar archive, replacing the old file atomically."""
+        path = self.tracking_file(username)
+        write_tracking_npz(df_tracking, path)
+        self.cache.invalidate(path) # next load reads back the compact column types
+
+    def append_tracking(self, username, rows):
+        """Adds rows by writing a new archive with the rows at the end."""
+        new_rows = parse_dates(pd.DataFrame(rows, columns=TRACKING_COLUMNS))
+        df_tracking = self.load_tracking(username)
+        if not df_tracking.empty:
+            new_rows = pd.concat([df_tracking.astype({'habit': object}), new_rows], ignore_index=True)
+        self.save_tracking(username, new_rows)
+
+    # the archive is rewritten as a whole, so collect the chunks and write once
+    append_tracking_chunks = Storage.append_tracking_chunks
+    correct_entries = Storage.correct_entries
+    iter_tracking = Storage.iter_tracking
+    habit_history = Storage.habit_history
+    rename_habit = Storage.rename_habit
+
+
+def read_tracking_npz(path):
+    """
+    Reads a columnar tracking archive into a tracking frame.
+
+    Parameters:
+        path (str): The .npz archive.
+
+    Returns:
+        pd.DataFrame: The datetime64 date column, the habit column as a Categorical and the value column.
+    """
+    with np.load(path) as archive:
+        return tracking_frame(archive['day'], archive['habit'], archive['value'], archive['habits'])
+
+
+def tracking_frame(days, codes, values, habits, widen=True):
+    """
+    Builds a tracking frame from binary columns.
+
+    Parameters:
+        days (np.ndarray): Day numbers (days since 1970-01-01).
+        codes (np.ndarray): Habit codes pointing into habits.
+        values (np.ndarray): Tracked values.
+        habits (sequence): The habit name dictionary.
+        widen (bool): Whether to widen float32 values to float64 (see widen_float32).
+
+    Returns:
+        pd.DataFrame: The datetime64 date column, the habit column as a Categorical and the value column.
+    """
+    return pd.DataFrame({
+        'date': np.asarray(days, dtype=np.int64).astype('datetime64[D]').astype('datetime64[ns]'),
+        'habit': lowercase_habits(pd.Series(pd.Categorical.from_codes(np.asarray(codes, dtype=np.int32),
+                                                                      categories=np.asarray(habits, dtype=object)))),
+        'value': widen_float32(values) if widen else np.asarray(values)})
+
+
+def widen_float32(values):
+    """
+    Converts float32 values to float64 without float32 rounding noise.
+
+    Each value is rounded to the 7 significant digits float32 can hold, so a
+    stored 16.4 comes back as 16.4 and not 16.399999618530273.
+
+    Parameters:
+        values (np.ndarray): The float32 values.
+
+    Returns:
+        np.ndarray: The float64 values.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    magnitude = np.abs(values)
+    nonzero = (magnitude > 0) & np.isfinite(magnitude)
+    scale = np.ones_like(values)
+    scale[nonzero] = 10.0 ** (6 - np.floor(np.log10(magnitude[nonzero])))
+    widened = values.copy()
+    widened[nonzero] = np.round(values[nonzero] * scale[nonzero]) / scale[nonzero]
+    return widened
+
+
+def write_tracking_npz(df_tracking, path):
+    """
+    Writes a tracking frame as a columnar archive so that readers see either the
+    old or the new file.
+
+    Parameters:
+        df_tracking (pd.DataFrame): The tracking data.
+        path (str): The .npz archive to replace.
+    """
+    days = day_numbers(df_tracking['date'])
+    codes, habits = pd.factorize(df_tracking['habit'].astype(object), sort=True)
+    if len(habits) > np.iinfo(np.uint16).max:
+        raise ValueError('Too many different habits for the columnar format.')
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(f,
+                 day=days.astype(np.int32),
+                 habit=codes.astype(np.uint16),
+                 value=df_tracking['value'].to_numpy(dtype=np.float32),
+                 habits=np.asarray(habits, dtype=str))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+@functools.lru_cache(maxsize=None)
+def record_dtype():
+    """Returns one fixed-width record of the memory-mapped tracking store (10 bytes)."""
+    return np.dtype([('day', '<i4'), ('habit', '<u2'), ('value', '<f4')])
+
+
+def tail_index_dtype():
+    """Returns one entry of the index of the out-of-order records of a record file (12 bytes)."""
+    return np.dtype([('day', '<i4'), ('pos', '<i8')])
+
+
+def day_number(date):
+    """Returns the number of days between 1970-01-01 and a YYYY-MM-DD date."""
+    return int(np.datetime64(date, 'D').astype(np.int64))
+
+
+def day_numbers(dates):
+    """Returns the day numbers (days since 1970-01-01) of a column of dates."""
+    return np.asarray(dates).astype('datetime64[D]').astype(np.int64)
+
+
+def week_numbers(days):
+    """Returns the Monday based week numbers of day numbers (1970-01-01 was a Thursday)."""
+    return (np.asarray(days) + 3) // 7
+
+
+class RecordStorage(CsvStorage):
+    """
+    Stores each tracking log as fixed-width binary records in tracking_<user>.rec.
+
+    Every record is a day number (int32), a habit code (uint16) and a value
+    (float32). The file is opened with numpy.memmap, so opening a user costs the
+    same whatever the size of the history, and queries only read the pages they
+    touch. New entries are appended to the end of the file in place.
+
+    A small sidecar file, tracking_<user>.rec.json, holds the habit name
+    dictionary and how many leading records are known to be in date order.
+    Date lookups binary search that sorted prefix, and the records after it
+    (entries tracked out of order) through a date-sorted index kept in
+    tracking_<user>.rec.idx.
+    Profiles stay in the CSV files of CsvStorage.
+    """
+
+    name = 'records'
+
+    def tracking_file(self, username):
+        """Returns the path of a user's record file."""
+        return os.path.join(self.data_dir, f'tracking_{username}.rec')
+
+    def _load_meta(self, username):
+        """Returns the sidecar metadata (habit dictionary and sorted prefix length)."""
+        try:
+            with open(self.tracking_file(username) + '.json') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'habits': [], 'sorted_until': 0}
+
+    def _save_meta(self, username, meta):
+        """Replaces the sidecar metadata atomically."""
+        atomic_write_json(meta, self.tracking_file(username) + '.json')
+
+    def open_records(self, username, mode='r'):
+        """
+        Maps a user's record file into memory.
+
+        A partially written last record, left by a crash during an append, is
+        cut off before the file is mapped.
+
+        Parameters:
+            username (str): The username of the user.
+            mode (str): 'r' to read, 'r+' to change records in place.
+
+        Returns:
+            np.ndarray: The records, backed by the file (empty if there are none).
+        """
+        path = self.tracking_file(username)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if size % record_dtype().itemsize:
+            with open(path, 'r+b') as f:
+                f.truncate(size - size % record_dtype().itemsize)
+            size -= size % record_dtype().itemsize
+        if size == 0:
+            return np.zeros(0, dtype=record_dtype())
+        return np.memmap(path, dtype=record_dtype(), mode=mode)
+
+    def _encode(self, username, rows, meta):
+        """Converts (date, habit, value) rows to records, adding new habits to the dictionary."""
+        habits = meta['habits']
+        codes = {h: i for i, h in enumerate(habits)}
+        records = np.zeros(len(rows), dtype=record_dtype())
+        for i, (date, habit, value) in enumerate(rows):
+            if habit not in codes:
+                if len(habits) > np.iinfo(np.uint16).max:
+                    raise ValueError('Too many different habits for the record format.')
+                codes[habit] = len(habits)
+                habits.append(habit)
+            records[i] = (day_number(date), codes[habit], value)
+        return records
+
+    def load_tracking(self, username):
+        """Loads the whole tracking log as a frame."""
+        return self.cache.load(self.tracking_file(username), lambda path: self._read_frame(username))
+
+    def _read_frame(self, username):
+        """Builds a tracking frame from the record file."""
+        records = self.open_records(username)
+        return tracking_frame(records['day'], records['habit'], records['value'], self._load_meta(username)['habits'])
+
+    def tracking_since(self, username, start):
+        """Converts only the records from start on; the pages before them are not read."""
+        records = self.open_records(username)[start:]
+        return tracking_frame(records['day'], records['habit'], records['value'], self._load_meta(username)['habits'])
+
+    def iter_tracking(self, username, start=0, chunksize=INGEST_CHUNK_SIZE, compact=False):
+        """Converts the memory-mapped records to frames chunksize records at a time; compact chunks keep the float32 values."""
+        records = self.open_records(username)
+        habits = self._load_meta(username)['habits']
+        for first in range(start, len(records), chunksize):
+            chunk = records[first:first+chunksize]
+            yield tracking_frame(chunk['day'], chunk['habit'], chunk['value'], habits, widen=not compact)
+
+    def save_tracking(self, username, df_tracking):
+        """
+        Replaces the record file, writing a temporary file and renaming it over the old one.
+
+        Records are written in date order (entries of the same day keep their
+        order), so the whole file can be binary searched.
+        """
+        meta = {'habits': [], 'sorted_until': 0}
+        rows = zip(date_strings(df_tracking['date']).tolist(), df_tracking['habit'].astype(str), df_tracking['value'])
+        records = self._encode(username, list(rows), meta)
+        records = records[np.argsort(records['day'], kind='stable')]
+        meta['sorted_until'] = len(records)
+
+        path = self.tracking_file(username)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(records.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        self._save_meta(username, meta)
+        os.replace(path + '.tmp', path)
+        self.cache.invalidate(path)
+
+    def append_tracking(self, username, rows):
+        """Appends records to the end of the record file without touching the existing ones."""
+        self.append_tracking_chunks(username, [rows])
+
+    def append_tracking_chunks(self, username, chunks):
+        """Appends every chunk of rows to the record file with one open and one fsync."""
+        meta = self._load_meta(username)
+        path = self.tracking_file(username)
+        self.open_records(username) # drops a torn record left by an earlier crash
+        count = 0
+        with open(path, 'ab') as f:
+            for rows in chunks:
+                known_habits = len(meta['habits'])
+                records = self._encode(username, rows, meta)
+                if len(meta['habits']) != known_habits: # dictionary must know the codes before the records do
+                    self._save_meta(username, meta)
+                f.write(records.tobytes())
+                count += len(records)
+            f.flush()
+            os.fsync(f.fileno())
+        self.cache.invalidate(path)
+        return count
+
+    def _day_range(self, username, records, start, end):
+        """
+        Returns the positions of the records dated between start and end (inclusive).
+
+        The sorted prefix is binary searched, so only the pages around the
+        boundaries are read. New records past the sorted prefix move it forward
+        while they are in order; once one is out of order, the records after the
+        prefix are looked up in the tail index (see _tail_index) instead.
+        Positions are returned in file order.
+        """
+        meta = self._load_meta(username)
+        sorted_until = min(meta['sorted_until'], len(records))
+        days = records['day']
+        if sorted_until < len(records) and meta.get('indexed_until', 0) <= sorted_until:
+            tail = np.asarray(days[sorted_until:]) # nothing out of order yet: extend the sorted prefix
+            last_sorted = days[sorted_until-1] if sorted_until else tail[0]
+            breaks = np.flatnonzero(np.diff(np.concatenate(([last_sorted], tail))) < 0)
+            in_order = int(breaks[0]) if len(breaks) else len(tail)
+            if in_order:
+                sorted_until += in_order
+                meta['sorted_until'] = sorted_until
+                self._save_meta(username, meta)
+        meta['sorted_until'] = sorted_until
+
+        lo = 0 if start is None else int(np.searchsorted(days[:sorted_until], start, side='left'))
+        hi = sorted_until if end is None else int(np.searchsorted(days[:sorted_until], end, side='right'))
+        positions = np.arange(lo, hi)
+        if sorted_until < len(records):
+            index = self._tail_index(username, records, meta)
+            lo = 0 if start is None else int(np.searchsorted(index['day'], start, side='left'))
+            hi = len(index) if end is None else int(np.searchsorted(index['day'], end, side='right'))
+            positions = np.concatenate((positions, np.sort(index['pos'][lo:hi])))
+        return positions
+
+    def _tail_index(self, username, records, meta):
+        """
+        Returns the day and position of every record past the sorted prefix, in date order.
+
+        The index is kept in tracking_<user>.rec.idx and covers the records up
+        to meta['indexed_until']. Records appended since are merged into it and
+        the file is replaced, so after a backfill queries binary search the
+        tail instead of scanning it. An index that does not match the metadata
+        (a crash between the two writes) is rebuilt.
+        """
+        sorted_until = meta['sorted_until']
+        indexed_until = meta.get('indexed_until', 0)
+        path = self.tracking_file(username) + '.idx'
+        index = np.zeros(0, dtype=tail_index_dtype())
+        if sorted_until < indexed_until <= len(records) and os.path.exists(path):
+            index = np.memmap(path, dtype=tail_index_dtype(), mode='r')
+        if len(index) != indexed_until - sorted_until:
+            index = np.zeros(0, dtype=tail_index_dtype())
+            indexed_until = sorted_until
+        if indexed_until < len(records):
+            new = np.zeros(len(records) - indexed_until, dtype=tail_index_dtype())
+            new['day'] = records['day'][indexed_until:]
+            new['pos'] = np.arange(indexed_until, len(records))
+            index = np.concatenate((index, new))
+            index = index[np.argsort(index['day'], kind='stable')]
+            with open(path + '.tmp', 'wb') as f:
+                f.write(index.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(path + '.tmp', path)
+            meta['indexed_until'] = len(records)
+            self._save_meta(username, meta)
+        return index
+
+    def _habit_codes(self, username, habit):
+        """Returns the codes whose habit name matches habit, ignoring case."""
+        return [i for i, h in enumerate(self._load_meta(username)['habits']) if h.lower() == habit]
+
+    def tracking_between(self, username, start=None, end=None):
+        """
+        Returns the entries dated between start and end (YYYY-MM-DD, inclusive) as a frame.
+
+        Only the records in the range are read from the file.
+        """
+        records = self.open_records(username)
+        start = None if start is None else day_number(start)
+        end = None if end is None else day_number(end)
+        selected = records[self._day_range(username, records, start, end)]
+        return tracking_frame(selected['day'], selected['habit'], selected['value'], self._load_meta(username)['habits'])
+
+    def habit_history(self, username, habit, start=None, end=None):
+        """Returns the dates and values of a habit, reading only the records in the date range."""
+        records = self.open_records(username)
+        start = None if start is None else day_number(start)
+        end = None if end is None else day_number(end)
+        selected = records[self._day_range(username, records, start, end)]
+        selected = selected[np.isin(selected['habit'], self._habit_codes(username, habit))]
+        selected = selected[np.argsort(selected['day'], kind='stable')]
+        dates = selected['day'].astype('datetime64[D]').astype(str).tolist()
+        return dates, widen_float32(selected['value']).tolist()
+
+    def habits_on(self, username, date):
+        """Returns the habits tracked on a date, found by binary search."""
+        records = self.open_records(username)
+        day = day_number(date)
+        selected = records[self._day_range(username, records, day, day)]
+        habits = self._load_meta(username)['habits']
+        return [habits[c] for c in selected['habit']]
+
+    def correct_entries(self, username, corrections):
+        """Overwrites the values of the records in place and flushes them once; the rest of the file is not rewritten."""
+        records = self.open_records(username, mode='r+')
+        results = []
+        for date, habit, new_value, entry in corrections:
+            try:
+                day = day_number(date)
+            except ValueError:
+                results.append(None)
+                continue
+            positions = self._day_range(username, records, day, day)
+            positions = positions[np.isin(records['habit'][positions], self._habit_codes(username, habit))]
+            if not 1 <= entry <= len(positions):
+                results.append(None)
+                continue
+            row = int(positions[entry-1])
+            results.append((row, widen_float32(records['value'][row:row+1])[0].item()))
+            records['value'][row] = new_value
+        if any(result is not None for result in results):
+            records.flush()
+            self.cache.invalidate(self.tracking_file(username))
+        return results
+
+    def rename_habit(self, username, habit, new_name):
+        """
+        Renames the habit in the habit name dictionary. The records keep their
+        habit codes, so nothing in the record file is rewritten.
+        """
+        meta = self._load_meta(username)
+        meta['habits'] = [new_name if h.lower() == habit else h for h in meta['habits']]
+        self._save_meta(username, meta)
+        path = self.tracking_file(username)
+        if os.path.exists(path):
+            op = {'op': 'rename', 'column': 'habit', 'from': habit, 'to': new_name}
+            self.cache.update(path, lambda df_tracking: apply_journal_op(df_tracking, dict(op, before=len(df_tracking))),
+                              FrameCache.signature(path))
+
+
+def _plain_value(value):
+    """Converts a tracked value to a plain Python number that sqlite3 and json can store."""
+    return value.item() if hasattr(value, 'item') else value
+
+
+STORAGE_ENGINES = {'csv': CsvStorage, 'sqlite': SqliteStorage, 'npz': NpzStorage, 'records': RecordStorage}
+_default_storage = None
+
+
+def make_storage(name, location=None):
+    """
+    Creates a storage engine by name.
+
+    Parameters:
+        name (str): The engine name, one of STORAGE_ENGINES.
+        location (str): The engine's data directory or file. Defaults to the engine's default.
+
+    Returns:
+        Storage: The new engine.
+    """
+    if name not in STORAGE_ENGINES:
+        raise ValueError(f"Unknown storage engine '{name}'. Choose from {', '.join(STORAGE_ENGINES)}.")
+    return STORAGE_ENGINES[name](location)
+
+
+def get_storage():
+    """Returns the default storage engine, chosen by the HABIT_STORAGE environment variable (csv by default)."""
+    global _default_storage
+    if _default_storage is None:
+        _default_storage = make_storage(os.environ.get('HABIT_STORAGE', 'csv'))
+    return _default_storage
+
+
+def set_storage(storage):
+    """Sets the storage engine used by Habit and User objects created without one."""
+    global _default_storage
+    _default_storage = storage
+
+
+def migrate_storage(source, target, usernames=None):
+    """
+    Copies users from one storage engine to another.
+
+    Parameters:
+        source (Storage): The engine to read from.
+        target (Storage): The engine to write to. Existing users are replaced.
+        usernames (list): The users to copy. Defaults to every user in source.
+
+    Returns:
+        int: The number of users copied.
+    """
+    usernames = usernames or source.users()
+    for username in usernames:
+        target.create_user(username, source.load_user(username))
+        target.save_tracking(username, source.load_tracking(username))
+    return len(usernames)
+
+
+### export #########################################################
+EXPORT_FORMATS = ('csv', 'jsonl', 'parquet')
+EXPORT_COMPRESSIONS = ('gzip', 'zstd')
+EXPORT_COLUMNS = ['username'] + TRACKING_COLUMNS
+
+
+def open_export_file(path, compression=None):
+    """
+    Opens a CSV or JSONL export for writing text, compressing it on the fly.
+
+    Parameters:
+        path (str): The file to write, or '-' for standard output.
+        compression (str): None, 'gzip' or 'zstd' (needs the zstandard package).
+
+    Returns:
+        A text file object to use in a with statement.
+    """
+    target = sys.stdout.buffer if path == '-' else path
+    if compression is None:
+        return contextlib.nullcontext(sys.stdout) if path == '-' else open(path, 'w', newline='', encoding='utf-8')
+    if compression == 'gzip':
+        return gzip.open(target, 'wt', newline='', encoding='utf-8')
+    if compression == 'zstd':
+        try:
+            zstandard = importlib.import_module('zstandard')
+        except ImportError:
+            raise ValueError('zstd compression needs the zstandard package.') from None
+        return zstandard.open(target, 'wt', newline='', encoding='utf-8', closefd=path != '-')
+    raise ValueError(f"Unknown compression '{compression}'. Choose from {', '.join(EXPORT_COMPRESSIONS)}.")
+
+
+def export_frame(username, chunk):
+    """Returns a chunk of a user's tracking log as export rows, with the user and YYYY-MM-DD dates."""
+    return pd.DataFrame({'username': username,
+                         'date': date_strings(chunk['date']),
+                         'habit': chunk['habit'].astype(str).to_numpy(),
+                         'value': chunk['value'].to_numpy()}, columns=EXPORT_COLUMNS)
+
+
+def export_tracking(storage, path, usernames=None, fmt='csv', compression=None, since=None,
+                    chunksize=INGEST_CHUNK_SIZE):
+    """
+    Streams the tracking logs of users to one CSV, JSONL or Parquet file.
+
+    Rows are read and written chunksize at a time, so memory stays bounded
+    whatever the size of the histories. Every row gets a username column.
+
+    The returned cursor holds the number of rows exported for each user. Passed
+    back as since, only the rows added after that export are written, which
+    suits nightly incremental jobs. Corrections to rows that were already
+    exported are not sent again.
+
+    Parameters:
+        storage (Storage): The engine to read from.
+        path (str): The file to write, or '-' for standard output (CSV and JSONL only).
+        usernames (list): The users to export. Defaults to every user.
+        fmt (str): 'csv', 'jsonl' or 'parquet' (needs the pyarrow package).
+        compression (str): None, 'gzip' or 'zstd'. Parquet compresses its column
+            chunks, the other formats the whole file.
+        since (dict): The cursor of an earlier export.
+        chunksize (int): The number of rows read and written at a time.
+
+    Returns:
+        dict: The cursor to pass as since to the next export.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}'. Choose from {', '.join(EXPORT_FORMATS)}.")
+    cursor = dict(since or {})
+    usernames = usernames or storage.users()
+
+    def chunks():
+        for username in usernames:
+            cursor.setdefault(username, 0)
+            for chunk in storage.iter_tracking(username, cursor[username], chunksize):
+                cursor[username] += len(chunk)
+                yield export_frame(username, chunk)
+
+    if fmt == 'parquet':
+        write_parquet_export(chunks(), path, compression)
+        return cursor
+
+    with open_export_file(path, compression) as f:
+        if fmt == 'csv':
+            f.write(','.join(EXPORT_COLUMNS) + '\n')
+        for frame in chunks():
+            if fmt == 'csv':
+                frame.to_csv(f, header=False, index=False, lineterminator='\n')
+            else:
+                frame.to_json(f, orient='records', lines=True)
+    return cursor
+
+
+def write_parquet_export(frames, path, compression=None):
+    """
+    Writes export frames to a Parquet file, one row group per frame.
+
+    Parameters:
+        frames (iterable): Frames with the EXPORT_COLUMNS.
+        path (str): The file to write.
+        compression (str): The column compression, None (snappy), 'gzip' or 'zstd'.
+    """
+    if path == '-':
+        raise ValueError('Parquet exports need an output file.')
+    try:
+        pa = importlib.import_module('pyarrow')
+        pq = importlib.import_module('pyarrow.parquet')
+    except ImportError:
+        raise ValueError('Parquet export needs the pyarrow package.') from None
+    # a fixed schema, so every row group matches whatever dtypes a chunk has
+    schema = pa.schema([('username', pa.string()), ('date', pa.date32()), ('habit', pa.string()), ('value', pa.float64())])
+    with pq.ParquetWriter(path, schema, compression=compression or 'snappy') as writer:
+        for frame in frames:
+            frame = frame.assign(date=pd.to_datetime(frame['date'], format='%Y-%m-%d').dt.date,
+                                 value=pd.to_numeric(frame['value'], errors='coerce').astype(np.float64))
+            writer.write_table(pa.Table.from_pandas(frame, schema=schema, preserve_index=False))
+
+
+### streaks ########################################################
+def bucket_entries(df_tracking, periods):
+    """
+    Converts tracking entries to habit codes and day (or week) numbers once.
+
+    Parameters:
+        df_tracking (pd.DataFrame): The tracking data, with lowercase habits (TRACKING_SCHEMA).
+        periods (dict): The periodicity ('daily' or 'weekly') of each lowercase habit.
+
+    Returns:
+        tuple: The habit names (tracked habits first, then the untracked ones in
+            periods), a weekly flag per name, and the code, bucket (day number,
+            or week number for weekly habits) and day number of every entry,
+            sorted by code, bucket and day.
+    """
+    codes, names = pd.factorize(df_tracking['habit'].astype(str).to_numpy())
+    names = list(names)
+    names += [habit for habit in periods if habit not in set(names)]   # untracked habits have no streak
+    weekly = np.array([periods.get(habit) == 'weekly' for habit in names], dtype=bool)
+    days = day_numbers(df_tracking['date'])
+    buckets = np.where(weekly[codes], week_numbers(days), days)
+    order = np.lexsort((days, buckets, codes))
+    return names, weekly, codes[order], buckets[order], days[order]
+
+
+def streak_table(df_tracking, periods, today):
+    """
+    Computes the current streak of every habit in one vectorized pass.
+
+    Dates are converted to day numbers once. Daily habits count consecutive
+    days and weekly habits consecutive Monday based weeks, ending at today's
+    day or week; several entries on one day (or in one week) count once and
+    entries after today are ignored.
+
+    Parameters:
+        df_tracking (pd.DataFrame): The tracking data.
+        periods (dict): The periodicity ('daily' or 'weekly') of each lowercase habit.
+        today (str): The date streaks are measured up to (YYYY-MM-DD).
+
+    Returns:
+        pd.DataFrame: One row per habit with the habit, periodicity, streak and
+            streak_start columns. streak_start is the first date of the streak,
+            or '' for habits without a current streak.
+    """
+    names, weekly, codes, buckets, days = bucket_entries(df_tracking, periods)
+
+    # drop the entries after today
+    today_day = day_number(today)
+    current = np.where(weekly, week_numbers(today_day), today_day)
+    keep = buckets <= current[codes]
+    codes, buckets, days = codes[keep], buckets[keep], days[keep]
+
+    # one row per habit and day (or week), holding its first day
+    first = np.ones(len(codes), dtype=bool)
+    first[1:] = (codes[1:] != codes[:-1]) | (buckets[1:] != buckets[:-1])
+    codes, buckets, days = codes[first], buckets[first], days[first]
+
+    # runs of consecutive buckets; the last run of a habit is live if it reaches today
+    positions = np.arange(len(codes))
+    run_start = np.ones(len(codes), dtype=bool)
+    run_start[1:] = (codes[1:] != codes[:-1]) | (buckets[1:] != buckets[:-1] + 1)
+    run_start = np.maximum.accumulate(np.where(run_start, positions, 0))
+    last = np.ones(len(codes), dtype=bool)
+    last[:-1] = codes[1:] != codes[:-1]
+    live = positions[last & (buckets == current[codes])]
+
+    streaks = np.zeros(len(names), dtype=np.int64)
+    streaks[codes[live]] = live - run_start[live] + 1
+    starts = np.full(len(names), '', dtype=object)
+    starts[codes[live]] = days[run_start[live]].astype('datetime64[D]').astype(str)
+    return pd.DataFrame({'habit': names,
+                         'periodicity': [periods.get(habit) for habit in names],
+                         'streak': streaks,
+                         'streak_start': starts})
+
+
+def streak_runs(df_tracking, periods):
+    """
+    Finds every streak of every habit in one vectorized pass.
+
+    Entries are run-length encoded on their day numbers (week numbers for
+    weekly habits); each run of consecutive days or weeks is one streak.
+
+    Parameters:
+        df_tracking (pd.DataFrame): The tracking data.
+        periods (dict): The periodicity ('daily' or 'weekly') of each lowercase habit.
+
+    Returns:
+        pd.DataFrame: One row per streak with the habit, periodicity, length and
+            the start and end dates (first and last entry) of the streak, sorted by
+            habit code and start.
+    """
+    names, weekly, codes, buckets, days = bucket_entries(df_tracking, periods)
+    columns = ['habit', 'periodicity', 'length', 'start', 'end']
+    if not len(codes):
+        return pd.DataFrame(columns=columns)
+
+    # first and last entry of every habit and day (or week)
+    group_first = np.flatnonzero(np.r_[True, (codes[1:] != codes[:-1]) | (buckets[1:] != buckets[:-1])])
+    group_last = np.r_[group_first[1:] - 1, len(codes) - 1]
+    first_days, last_days = days[group_first], days[group_last]
+    codes, buckets = codes[group_first], buckets[group_first]
+
+    # runs of consecutive days (or weeks)
+    run_first = np.flatnonzero(np.r_[True, (codes[1:] != codes[:-1]) | (buckets[1:] != buckets[:-1] + 1)])
+    run_last = np.r_[run_first[1:] - 1, len(codes) - 1]
+    names = np.asarray(names, dtype=object)
+    return pd.DataFrame({'habit': names[codes[run_first]],
+                         'periodicity': np.where(weekly[codes[run_first]], 'weekly', 'daily'),
+                         'length': run_last - run_first + 1,
+                         'start': first_days[run_first].astype('datetime64[D]').astype(str),
+                         'end': last_days[run_last].astype('datetime64[D]').astype(str)},
+                        columns=columns)
+
+
+def streak_history(runs, top_k=3):
+    """
+    Summarizes the streaks found by streak_runs() per habit.
+
+    Parameters:
+        runs (pd.DataFrame): The streaks from streak_runs().
+        top_k (int): The number of longest streaks to list per habit.
+
+    Returns:
+        pd.DataFrame: Indexed by habit, with the periodicity, the number of
+            streaks, the longest streak ever (best, best_start, best_end), the
+            top_k longest streaks as (length, start, end) tuples, longest first,
+            and the distribution of streak lengths as a {length: count} dict.
+    """
+    columns = ['periodicity', 'streaks', 'best', 'best_start', 'best_end', 'top', 'distribution']
+    if runs.empty:
+        return pd.DataFrame(columns=columns).rename_axis('habit')
+    ranked = runs.sort_values(['habit', 'length', 'start'], ascending=[True, False, True], kind='stable')
+    by_habit = ranked.groupby('habit', sort=True)
+    summary = by_habit.agg(periodicity=('periodicity', 'first'), streaks=('length', 'size'),
+                           best=('length', 'first'), best_start=('start', 'first'), best_end=('end', 'first'))
+    top = ranked.groupby('habit', sort=True).head(top_k)
+    summary['top'] = pd.Series({habit: list(zip(group['length'].tolist(), group['start'], group['end']))
+                                for habit, group in top.groupby('habit', sort=True)})
+    counts = runs.groupby(['habit', 'length']).size()
+    summary['distribution'] = pd.Series({habit: counts.loc[habit].to_dict()
+                                         for habit in summary.index})
+    return summary[columns]
+
+
+def habit_streak_state(days, weekly):
+    """
+    Summarizes the streaks of one habit for the persisted streak state.
+
+    Parameters:
+        days (np.ndarray): The day numbers the habit was tracked on, in any order.
+        weekly (bool): Whether the habit is counted in Monday based weeks instead of days.
+
+    Returns:
+        dict: The periodicity, the last tracked day or week number ('last'), the
+            length and first day of the run ending there ('run', 'start') and the
+            length and first day of the longest run ('best', 'best_start'), or
+            None if the habit was never tracked.
+    """
+    days = np.unique(np.asarray(days, dtype=np.int64))
+    if not len(days):
+        return None
+    buckets = week_numbers(days) if weekly else days
+    first = np.ones(len(buckets), dtype=bool)   # first day of every day or week
+    first[1:] = buckets[1:] != buckets[:-1]
+    days, buckets = days[first], buckets[first]
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1] + 1])
+    lengths = np.diff(np.r_[starts, len(buckets)])
+    best = int(np.argmax(lengths))   # the earliest of equally long runs
+    return {'period': 'weekly' if weekly else 'daily',
+            'last': int(buckets[-1]),
+            'run': int(lengths[-1]),
+            'start': int(days[starts[-1]]),
+            'best': int(lengths[best]),
+            'best_start': int(days[starts[best]])}
+
+
+def advance_streak_state(state, day, weekly):
+    """
+    Updates the streak state of one habit for a new entry in O(1).
+
+    Parameters:
+        state (dict): The habit's state from habit_streak_state(), or None.
+        day (int): The day number of the new entry.
+        weekly (bool): Whether the habit is counted in weeks.
+
+    Returns:
+        dict: The updated state, or None if the entry lies before the current
+            run (a backfill) and the habit has to be recomputed from its history.
+    """
+    bucket = int(week_numbers(day)) if weekly else day
+    if state is None:
+        return {'period': 'weekly' if weekly else 'daily', 'last': bucket, 'run': 1,
+                'start': day, 'best': 1, 'best_start': day}
+    if bucket < state['last'] or (bucket == state['last'] and day < state['start']):
+        return None
+    if bucket == state['last'] + 1:   # the run goes on
+        state['run'] += 1
+    elif bucket > state['last']:      # a gap starts a new run
+        state['run'] = 1
+        state['start'] = day
+    state['last'] = bucket
+    if state['run'] > state['best']:
+        state['best'] = state['run']
+        state['best_start'] = state['start']
+    return state
+
+
+class RunIndex:
+    """
+    The runs of consecutive days (or Monday based weeks) on which one habit was tracked.
+
+    Runs are kept as two sorted arrays with the first and last day (or week)
+    number of every run, so the run covering a date is found by binary search.
+    Queries take a single date or an array of dates (and periods) and answer
+    them all in one vectorized search.
+
+    Attributes:
+        weekly (bool): Whether runs are counted in weeks.
+        starts (np.ndarray): The first day or week number of every run.
+        ends (np.ndarray): The last day or week number of every run.
+    """
+
+    __slots__ = ('weekly', 'starts', 'ends')
+
+    def __init__(self, weekly=False, starts=(), ends=()):
+        self.weekly = weekly
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.ends = np.asarray(ends, dtype=np.int64)
+
+    @classmethod
+    def from_days(cls, days, weekly=False):
+        """Builds the index from the day numbers a habit was tracked on, in any order."""
+        buckets = np.asarray(days, dtype=np.int64)
+        buckets = np.unique(week_numbers(buckets) if weekly else buckets)
+        breaks = np.flatnonzero(np.diff(buckets) != 1)
+        return cls(weekly, np.r_[buckets[:1], buckets[breaks + 1]], np.r_[buckets[breaks], buckets[-1:]])
+
+    @classmethod
+    def from_state(cls, state):
+        """Builds the index from its persisted form."""
+        return cls(state['period'] == 'weekly', state['starts'], state['ends'])
+
+    def to_state(self):
+        """Returns the persisted (JSON) form of the index."""
+        return {'period': 'weekly' if self.weekly else 'daily',
+                'starts': self.starts.tolist(), 'ends': self.ends.tolist()}
+
+    def buckets(self, dates):
+        """Returns the day (or week) numbers of one or more YYYY-MM-DD dates."""
+        days = day_numbers(dates)
+        return week_numbers(days) if self.weekly else days
+
+    def first_day(self, buckets):
+        """Returns the day numbers of the first day of day (or week) numbers."""
+        buckets = np.asarray(buckets)
+        return buckets * 7 - 3 if self.weekly else buckets
+
+    def add(self, date):
+        """Adds a tracked date, extending, joining or inserting a run."""
+        bucket = int(self.buckets(date))
+        i = int(np.searchsorted(self.starts, bucket, side='right')) - 1  # the last run starting at or before bucket
+        if i >= 0 and self.ends[i] >= bucket:
+            return
+        joins_left = i >= 0 and self.ends[i] == bucket - 1
+        joins_right = i + 1 < len(self.starts) and self.starts[i + 1] == bucket + 1
+        if joins_left and joins_right:   # the date fills the gap between two runs
+            self.ends[i] = self.ends[i + 1]
+            self.starts = np.delete(self.starts, i + 1)
+            self.ends = np.delete(self.ends, i + 1)
+        elif joins_left:
+            self.ends[i] = bucket
+        elif joins_right:
+            self.starts[i + 1] = bucket
+        else:
+            self.starts = np.insert(self.starts, i + 1, bucket)
+            self.ends = np.insert(self.ends, i + 1, bucket)
+
+    def _covering(self, buckets):
+        """Returns the position of the run covering each bucket and whether one does."""
+        i = np.searchsorted(self.starts, buckets, side='right') - 1
+        if not len(self.starts):
+            return i, np.zeros(np.shape(buckets), dtype=bool)
+        return i, (i >= 0) & (self.ends[np.maximum(i, 0)] >= buckets)
+
+    def streak_length(self, dates):
+        """Returns the length of the unbroken streak ending on each date, 0 if it was not tracked."""
+        buckets = self.buckets(dates)
+        i, covered = self._covering(buckets)
+        if not len(self.starts):
+            return np.zeros(np.shape(buckets), dtype=np.int64)
+        return np.where(covered, buckets - self.starts[np.maximum(i, 0)] + 1, 0)
+
+    def has_streak(self, dates, periods):
+        """Returns whether an unbroken streak of at least periods days (or weeks) ended on each date."""
+        return self.streak_length(dates) >= np.asarray(periods)
+
+    def broken_on(self, dates):
+        """Returns the first day without an entry (a Monday for weekly habits) at or after each date."""
+        buckets = self.buckets(dates)
+        i, covered = self._covering(buckets)
+        if len(self.starts):
+            buckets = np.where(covered, self.ends[np.maximum(i, 0)] + 1, buckets)
+        return self.first_day(buckets)
+
+
+class PrefixSums:
+    """
+    Cumulative totals and entry counts of one habit over consecutive day numbers.
+
+    sums[i] and counts[i] hold the total value and the number of entries on the
+    days before first_day + i, so the total of any window of days is the
+    difference of two elements. The arrays keep spare capacity so appending
+    a later day does not copy them.
+
+    Attributes:
+        first_day (int): The day number of the first tracked day.
+        size (int): The number of valid prefix elements (tracked days spanned + 1).
+    """
+
+    __slots__ = ('first_day', 'size', '_sums', '_counts')
+
+    def __init__(self, first_day=0, sums=(0.0,), counts=(0,)):
+        self.first_day = first_day
+        self.size = len(sums)
+        self._sums = np.asarray(sums, dtype=np.float64)
+        self._counts = np.asarray(counts, dtype=np.int64)
+
+    @classmethod
+    def from_entries(cls, days, values):
+        """Builds the prefix arrays from the day numbers and values of a habit's entries."""
+        days = np.asarray(days, dtype=np.int64)
+        if not len(days):
+            return cls()
+        first_day = int(days.min())
+        offsets = days - first_day
+        totals = np.bincount(offsets, weights=np.asarray(values, dtype=np.float64))
+        counts = np.bincount(offsets)
+        return cls(first_day, np.r_[0.0, np.cumsum(totals)], np.r_[0, np.cumsum(counts)])
+
+    @property
+    def sums(self):
+        return self._sums[:self.size]
+
+    @property
+    def counts(self):
+        return self._counts[:self.size]
+
+    def _reserve(self, size):
+        """Grows the arrays to hold at least size elements, doubling the capacity."""
+        if size > len(self._sums):
+            capacity = max(size, 2 * len(self._sums))
+            self._sums = np.resize(self._sums, capacity)
+            self._counts = np.resize(self._counts, capacity)
+
+    def add(self, day, value):
+        """
+        Adds one entry.
+
+        A day after the last tracked day extends the arrays in amortized O(1);
+        an earlier day adds the value to every later prefix.
+
+        Parameters:
+            day (int): The day number of the entry.
+            value (float): The tracked value.
+        """
+        if self.size == 1:   # no entries yet
+            self.first_day = day
+        if day < self.first_day:   # prepend empty days
+            pad = self.first_day - day
+            self._sums = np.r_[np.zeros(pad), self.sums]
+            self._counts = np.r_[np.zeros(pad, dtype=np.int64), self.counts]
+            self.size += pad
+            self.first_day = day
+        offset = day - self.first_day
+        if offset + 2 > self.size:   # carry the last totals forward over the new days
+            self._reserve(offset + 2)
+            self._sums[self.size:offset + 2] = self._sums[self.size - 1]
+            self._counts[self.size:offset + 2] = self._counts[self.size - 1]
+            self.size = offset + 2
+        self._sums[offset + 1:self.size] += value
+        self._counts[offset + 1:self.size] += 1
+
+    def window(self, start_day, end_day):
+        """
+        Returns the total and the number of entries from start_day to end_day (inclusive).
+
+        Both bounds may be arrays, which answers many windows at once.
+        """
+        lo = np.clip(np.asarray(start_day) - self.first_day, 0, self.size - 1)
+        hi = np.clip(np.asarray(end_day) - self.first_day + 1, 0, self.size - 1)
+        hi = np.maximum(hi, lo)
+        return self._sums[hi] - self._sums[lo], self._counts[hi] - self._counts[lo]
+
+
+class HabitSeries:
+    """
+    The entries of one habit as date-sorted arrays of day numbers and values.
+
+    Entries of the same day keep the order they were tracked in. Date ranges
+    are found by binary search, so a query costs O(log n) plus the entries it
+    returns. Like PrefixSums the arrays keep spare capacity, so appending a
+    later entry does not copy them.
+
+    Attributes:
+        size (int): The number of entries.
+    """
+
+    __slots__ = ('size', '_days', '_values')
+
+    def __init__(self, days=(), values=()):
+        days = np.asarray(days, dtype=np.int64)
+        order = np.argsort(days, kind='stable')
+        self.size = len(days)
+        self._days = days[order]
+        self._values = np.asarray(values)[order] if len(days) else np.zeros(0, dtype=np.int64)
+
+    @property
+    def days(self):
+        return self._days[:self.size]
+
+    @property
+    def values(self):
+        return self._values[:self.size]
+
+    def add(self, day, value):
+        """Inserts one entry after the entries of the same or earlier days (amortized O(1) at the end)."""
+        if self._values.dtype.kind in 'iu' and not float(value).is_integer():
+            self._values = self._values.astype(np.float64)
+        if self.size == len(self._days):   # double the capacity
+            capacity = max(16, 2 * self.size)
+            self._days = np.resize(self._days, capacity)
+            self._values = np.resize(self._values, capacity)
+        position = int(np.searchsorted(self.days, day, side='right'))
+        self._days[position + 1:self.size + 1] = self._days[position:self.size]
+        self._values[position + 1:self.size + 1] = self._values[position:self.size]
+        self._days[position] = day
+        self._values[position] = value
+        self.size += 1
+
+    def between(self, start_day=None, end_day=None, limit=None):
+        """
+        Returns the day numbers and values of the entries from start_day to end_day (inclusive).
+
+        Parameters:
+            start_day (int): The first day. Defaults to the first entry.
+            end_day (int): The last day. Defaults to the last entry.
+            limit (int): The most entries to return, the earliest first.
+
+        Returns:
+            tuple: Views of the days and values arrays.
+        """
+        lo = 0 if start_day is None else int(np.searchsorted(self.days, start_day, side='left'))
+        hi = self.size if end_day is None else int(np.searchsorted(self.days, end_day, side='right'))
+        if limit is not None:
+            hi = min(hi, lo + max(limit, 0))
+        hi = max(hi, lo)
+        return self._days[lo:hi], self._values[lo:hi]
+
+
+### daily rollup ###################################################
+def tracking_row_key(df_tracking, position):
+    """Returns the (date, habit, value) of one tracking row in a comparable form."""
+    date, habit, value = df_tracking.iloc[position][TRACKING_COLUMNS]
+    return (str(np.datetime64(date, 'D')), str(habit), float(value))
+
+
+def log_rewritten(df_tracking, start, watermark, last_row):
+    """
+    Checks whether a tracking log still holds the rows something was derived from.
+
+    Values are compared to float32 precision, the precision of the records engine.
+
+    Parameters:
+        df_tracking (pd.DataFrame): The tracking log, or its rows from position start on.
+        start (int): The position of the first row of df_tracking, at most watermark - 1.
+        watermark (int): The number of tracking rows derived from.
+        last_row (tuple): The (date, habit, value) of the last of them, or only its
+            (date, habit) for data that does not depend on values.
+
+    Returns:
+        bool: True if the log is shorter than the watermark or its row at the watermark changed.
+    """
+    if watermark > start + len(df_tracking):
+        return True
+    if not watermark:
+        return False
+    date, habit, value = tracking_row_key(df_tracking, watermark - 1 - start)
+    if (date, habit) != tuple(last_row[:2]):
+        return True
+    return len(last_row) > 2 and abs(value - last_row[2]) > 1e-6 * max(abs(value), abs(last_row[2]))
+
+
+class Rollup:
+    """
+    A materialized daily rollup of a tracking log: dense date x habit matrices
+    of the value sums and entry counts.
+
+    Several entries per habit and day collapse into one cell, so reports read
+    one row per day instead of every raw entry. The rollup remembers how many
+    tracking rows it has folded in (the watermark) and the last of them, so a
+    refresh folds only the rows added since and rebuilds when the log was
+    rewritten.
+
+    Attributes:
+        first_day (int): The day number of the first row.
+        habits (list): The lowercase habit of every column.
+        sums (np.ndarray): The value sums, one row per day from first_day.
+        counts (np.ndarray): The entry counts, one row per day from first_day.
+        watermark (int): The number of tracking rows folded in.
+        last_row (tuple): The (date, habit, value) of the last folded row.
+        integer (bool): Whether every folded value was an integer.
+    """
+
+    def __init__(self):
+        self.first_day = 0
+        self.habits = []
+        self.sums = np.zeros((0, 0))
+        self.counts = np.zeros((0, 0), dtype=np.int32)
+        self.watermark = 0
+        self.last_row = None
+        self.integer = True
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Rebuilds a rollup from the arrays of to_arrays()."""
+        rollup = cls()
+        rollup.first_day = int(arrays['first_day'])
+        rollup.habits = arrays['habits'].tolist()
+        rollup.sums = arrays['sums']
+        rollup.counts = arrays['counts']
+        rollup.watermark = int(arrays['watermark'])
+        if rollup.watermark:
+            rollup.last_row = (str(arrays['last_date']), str(arrays['last_habit']), float(arrays['last_value']))
+        rollup.integer = bool(arrays['integer'])
+        return rollup
+
+    def to_arrays(self):
+        """Returns the rollup as a dictionary of arrays for Storage.save_arrays()."""
+        last_date, last_habit, last_value = self.last_row or ('', '', 0.0)
+        return {'first_day': np.int64(self.first_day), 'habits': np.asarray(self.habits, dtype=str),
+                'sums': self.sums, 'counts': self.counts, 'watermark': np.int64(self.watermark),
+                'last_date': np.str_(last_date), 'last_habit': np.str_(last_habit),
+                'last_value': np.float64(last_value), 'integer': np.bool_(self.integer)}
+
+    def stale(self, df_tracking, start=0):
+        """
+        Returns True if the log was rewritten since the last refresh: it is
+        shorter than the watermark or its last folded row changed.
+
+        Parameters:
+            df_tracking (pd.DataFrame): The tracking log, or its rows from position start on.
+            start (int): The position of the first row of df_tracking, at most watermark - 1.
+        """
+        return log_rewritten(df_tracking, start, self.watermark, self.last_row)
+
+    def refresh(self, df_tracking, start=0):
+        """
+        Folds the tracking rows added since the last refresh into the rollup.
+
+        Parameters:
+            df_tracking (pd.DataFrame): The whole tracking log, or its rows from
+                position start on (see stale).
+            start (int): The position of the first row of df_tracking.
+
+        Returns:
+            bool: True if the rollup changed.
+        """
+        if self.stale(df_tracking, start):
+            if start:
+                raise ValueError('The tracking log was rewritten, the rollup needs every row.')
+            self.__init__()   # the log was rewritten, start over
+        rows = start + len(df_tracking)
+        if self.watermark == rows:
+            return False
+        self.fold(df_tracking.iloc[self.watermark - start:])
+        self.watermark = rows
+        self.last_row = tracking_row_key(df_tracking, self.watermark - 1 - start)
+        return True
+
+    def fold(self, df_rows):
+        """Adds tracking rows to the sums and counts, growing the matrices as needed."""
+        days = day_numbers(df_rows['date'])
+        keys = df_rows['habit'].astype(str).to_numpy()
+        values = pd.to_numeric(df_rows['value'], errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+        self.integer = self.integer and df_rows['value'].dtype.kind in 'iu'
+
+        # new habits become new columns, days outside the range new rows
+        self.habits += [habit for habit in pd.unique(keys) if habit not in set(self.habits)]
+        first_day = int(days.min()) if not len(self.sums) else min(self.first_day, int(days.min()))
+        last_day = int(days.max()) if not len(self.sums) else max(self.first_day + len(self.sums) - 1, int(days.max()))
+        before = self.first_day - first_day if len(self.sums) else 0
+        after = last_day - first_day + 1 - before - len(self.sums)
+        padding = ((before, after), (0, len(self.habits) - self.sums.shape[1]))
+        self.sums = np.pad(self.sums, padding)
+        self.counts = np.pad(self.counts, padding)
+        self.first_day = first_day
+
+        cells = (days - first_day, pd.Index(self.habits).get_indexer(keys))
+        np.add.at(self.sums, cells, values)
+        np.add.at(self.counts, cells, 1)
+
+    def correct(self, date, habit, entry, old_value, new_value):
+        """
+        Applies a corrected value to the rollup without reading the tracking log.
+
+        The rollup holds a prefix of the log, so the entries of a date and habit
+        it has folded in are the first ones of its cell, as many as the cell
+        counts. Later entries are not folded in yet; they bring the new value
+        with them when they are.
+
+        Parameters:
+            date (str): The corrected date (YYYY-MM-DD).
+            habit (str): The corrected lowercase habit.
+            entry (int): The entry number of the corrected row on that date (1 for the first).
+            old_value (float): The value before the correction.
+            new_value (float): The value after the correction.
+        """
+        row = day_number(date) - self.first_day
+        if habit not in self.habits or not 0 <= row < len(self.counts):
+            return
+        cell = (row, self.habits.index(habit))
+        if entry > self.counts[cell]:
+            return
+        old_value = 0.0 if pd.isna(old_value) else float(old_value)
+        self.sums[cell] += float(new_value) - old_value
+        self.integer = self.integer and float(new_value).is_integer()
+        date = str(np.datetime64(date, 'D'))
+        if entry == self.counts[cell] and self.last_row[:2] == (date, habit):   # the last folded row
+            self.last_row = (date, habit, float(new_value))
+
+    def habits_on(self, date):
+        """Returns the habits tracked on a date (YYYY-MM-DD), in column order."""
+        row = day_number(date) - self.first_day
+        if not 0 <= row < len(self.counts):
+            return []
+        return [self.habits[j] for j in np.flatnonzero(self.counts[row])]
+
+    def tracked_days(self):
+        """Returns the day numbers each habit was tracked on."""
+        return {habit: self.first_day + np.flatnonzero(self.counts[:, j])
+                for j, habit in enumerate(self.habits)}
+
+    def tracked_frame(self):
+        """Returns one (date, habit) row per habit and tracked day, sorted by date."""
+        rows, columns = np.nonzero(self.counts)
+        return pd.DataFrame({'date': (self.first_day + rows).astype('datetime64[D]').astype(str),
+                             'habit': np.asarray(self.habits, dtype=object)[columns]})
+
+    def totals(self, habits=None):
+        """
+        Returns the count, sum and mean of every tracked habit.
+
+        Parameters:
+            habits (set): Only include these lowercase habits. Defaults to every habit.
+
+        Returns:
+            pd.DataFrame: Indexed by habit (sorted), with count, sum and mean columns.
+        """
+        counts = self.counts.sum(axis=0)
+        sums = self.sums.sum(axis=0)
+        frame = pd.DataFrame({'count': counts,
+                              'sum': np.round(sums).astype(np.int64) if self.integer else sums,
+                              'mean': sums / np.maximum(counts, 1)},
+                             index=pd.Index(self.habits, name='habit'))
+        frame = frame[frame['count'] > 0]
+        if habits is not None:
+            frame = frame[frame.index.isin(habits)]
+        return frame.sort_index()
+
+
+### statistics #####################################################
+# columns of habit_stats(), in the order they are computed
+STAT_COLUMNS = ['count', 'mean', 'sum', 'min', 'max', 'std', 'p25', 'median', 'p75']
+
+
+def habit_stats(df_tracking, habits=None):
+    """
+    Computes the summary statistics of every habit with one groupby().agg() call.
+
+    Parameters:
+        df_tracking (pd.DataFrame): The tracking data, with lowercase habits (TRACKING_SCHEMA).
+        habits (set): Only include these lowercase habits. Defaults to every habit.
+
+    Returns:
+        pd.DataFrame: Indexed by lowercase habit, with the columns of STAT_COLUMNS
+            computed over the tracked values.
+    """
+    keys = df_tracking['habit'].astype(str)
+    values = pd.to_numeric(df_tracking['value'], errors='coerce')
+    if habits is not None:
+        keep = keys.isin(habits).to_numpy()
+        keys, values = keys[keep], values[keep]
+    return values.groupby(keys.rename('habit')).agg(
+        count='count', mean='mean', sum='sum', min='min', max='max', std='std',
+        p25=lambda v: v.quantile(0.25), median='median', p75=lambda v: v.quantile(0.75))[STAT_COLUMNS]
+
+
+class StreamingStats:
+    """
+    Summary statistics of every habit, merged chunk by chunk.
+
+    Each chunk is reduced to partial aggregates per habit (count, sum, min,
+    max, mean and M2, the sum of squared deviations from the mean). They are
+    merged into the running totals with the pairwise form of Welford's
+    algorithm, so memory depends on the number of habits and the chunk size,
+    never on the length of the history. Percentiles need every value and are
+    not computed.
+    """
+
+    COLUMNS = ['count', 'mean', 'sum', 'min', 'max', 'std']
+
+    def __init__(self, habits=None):
+        """
+        Initializes empty statistics.
+
+        Parameters:
+            habits (set): Only include these lowercase habits. Defaults to every habit.
+        """
+        self.habits = habits
+        self.integer = True   # whether every value so far was a whole number, so sums print as integers
+        self._partials = pd.DataFrame(columns=['count', 'sum', 'mean', 'm2', 'min', 'max'], dtype=np.float64)
+
+    def add(self, chunk):
+        """Merges the entries of one tracking chunk into the statistics."""
+        keys = chunk['habit'].astype(str)
+        values = chunk['value']
+        values = widen_float32(values) if values.dtype == np.float32 else pd.to_numeric(values, errors='coerce')
+        values = pd.Series(np.asarray(values, dtype=np.float64), index=chunk.index)
+        if self.habits is not None:
+            keep = keys.isin(self.habits).to_numpy()
+            keys, values = keys[keep], values[keep]
+        self.integer = self.integer and bool(np.all(values.dropna() % 1 == 0))
+        part = values.groupby(keys.rename('habit')).agg(['count', 'sum', 'mean', 'var', 'min', 'max'])
+        part['m2'] = (part.pop('var') * (part['count'] - 1)).fillna(0)
+        self._partials = self.merge(self._partials, part)
+
+    @staticmethod
+    def merge(a, b):
+        """Combines two frames of partial aggregates indexed by habit."""
+        a, b = a.align(b, join='outer')
+        na, nb = a['count'].fillna(0), b['count'].fillna(0)
+        n = na + nb
+        mean_a, mean_b = a['mean'].fillna(0), b['mean'].fillna(0)
+        delta = mean_b - mean_a
+        share = nb / n.where(n > 0, 1)
+        return pd.DataFrame({
+            'count': n,
+            'sum': a['sum'].fillna(0) + b['sum'].fillna(0),
+            'mean': mean_a + delta * share,
+            'm2': a['m2'].fillna(0) + b['m2'].fillna(0) + delta ** 2 * na * share,
+            'min': np.fmin(a['min'], b['min']),
+            'max': np.fmax(a['max'], b['max'])})
+
+    def result(self):
+        """
+        Returns the statistics merged so far.
+
+        Returns:
+            pd.DataFrame: Indexed by lowercase habit (sorted), with the columns of
+                StreamingStats.COLUMNS.
+        """
+        partials = self._partials.sort_index()
+        count = partials['count']
+        frame = pd.DataFrame({
+            'count': count.astype(np.int64),
+            'mean': partials['mean'].where(count > 0),
+            'sum': partials['sum'].round().astype(np.int64) if self.integer else partials['sum'],
+            'min': partials['min'],
+            'max': partials['max'],
+            'std': np.sqrt(partials['m2'] / (count - 1)).where(count > 1)})
+        frame.index.name = 'habit'
+        return frame[self.COLUMNS]
+
+
+def streaming_habit_stats(chunks, habits=None):
+    """
+    Computes summary statistics from tracking chunks, holding one chunk at a time.
+
+    Parameters:
+        chunks (iterable): Tracking frames, e.g. from Storage.iter_tracking(compact=True).
+        habits (set): Only include these lowercase habits. Defaults to every habit.
+
+    Returns:
+        pd.DataFrame: Indexed by lowercase habit, with the columns of StreamingStats.COLUMNS.
+    """
+    stats = StreamingStats(habits)
+    for chunk in chunks:
+        stats.add(chunk)
+    return stats.result()
+
+
 def display_menu():
     """Displays the main menu of the habit tracking app."""
 
@@ -34,7 +3433,8 @@ def display_menu():
     print("11. Analyze if Habit is Broken")
     print('12. Today Report') 
     print("13. Suggest a Habit") 
-    print("14. Exit")
+    print("14. Analyze Streak History")
+    print("15. Exit")
     print("-----------------------")
 
 
@@ -42,10 +3442,10 @@ def display_menu():
     while True:
         try:
             choice = int(input("Enter your choice: "))
-            if 1 <= choice <= 14:
+            if 1 <= choice <= 15:
                 return choice
             else:
-                print("Invalid choice. Please enter a number between 1 and 13.")
+                print("Invalid choice. Please enter a number between 1 and 15.")
         except ValueError:
             print("Invalid input. Please enter a number.")
 
@@ -67,101 +3467,228 @@ class Habit:
         save_tracking_data(df_tracking): Saves tracking data to a CSV file.
         load_user_data(): Loads user data from a CSV file.
         save_user_data(df_user): Saves user data to a CSV file.
+        append_tracking_data(rows): Appends new entries to the tracking log without rewriting it.
+        load_profile(): Returns the parsed user profile.
+        cache_stats(): Returns the hit and miss counters of the shared data cache.
         get_tracked_completed_today(): Returns a list of habits completed today.
         get_unit_of_measurement(): Returns a dictionary of units of measurement for each habit.
         get_current_habits(): Returns a list of current habits.
-        get_habit_history(habit): Returns the history of a habit as a list of dates and a list of values.
+        get_habit_history(habit, start, end, limit): Returns the history of a habit as a list of dates and a list of values.
+        iter_habit_history(habit, start, end): Yields the (date, value) entries of a habit.
         get_periodicity(habit): Returns the periodicity of a habit ('daily' or 'weekly').
         track_habit(habit_name, tracked_value): Tracks a habit for the current date.
         correct_tracked_habit(date, habit, new_value, entry=1): Corrects a previously tracked habit.
+        rename_habit(habit_name, new_name): Renames a current habit in the profile and the tracked history.
         track_historical_habit(habit_name, tracked_value, date): Tracks a habit for a past date.
+        track_many(entries): Tracks many (date, habit, value) entries in a single write.
         today_report(): Prints a report of habits completed and not completed today.
+        streak_state(): Returns the persisted streak state of every habit.
+        streaks(): Returns the current streak of every habit as a DataFrame.
         calculate_streak(habit, inside=False): Calculates the current streak for a habit.
         longest_streak(): Prints the longest current streak for any habit.
-        is_broken(habit, period): Checks if a habit with a given streak is broken.
-        analyze_all_habits(task, current=False): Analyzes all habits (or only current habits) for a given task ('average', 'total', or 'count').
+        run_indexes(): Returns the persisted run-length index of every habit.
+        run_index(habit): Returns the RunIndex of one habit.
+        had_streak(habit, period, date=None): Checks for an unbroken streak ending on a date (bulk for lists).
+        streak_broken_on(habit, date=None): Returns when the streak covering a date broke.
+        is_broken(habit, period, date=None): Checks if a habit with a given streak is broken.
+        last_seen(): Returns the last tracked date of every habit.
+        habits_tracked_on(date): Returns the habits tracked on a date from the date index.
+        rollup(): Returns the materialized date x habit rollup, refreshed incrementally.
+        prefix_sums(): Returns the cached per-habit prefix sums over day numbers.
+        window_stats(habit, days=7, end=None): Returns the total and average over the last days days.
+        rolling_series(habit, window=7, start=None, end=None): Returns a rolling window total per day.
+        streak_history(top_k=3): Returns the longest, top-k and distribution of all streaks per habit.
+        report_streak_history(top_k=3): Prints the all-time streak analysis.
+        habit_stats(current=False): Returns count, mean, sum, min, max, std and percentiles of every habit.
+        analyze_all_habits(task, current=False, stats=None): Analyzes all habits (or only current habits) for a given task ('average', 'total', or 'count').
+        analyze_habits_report(current=False): Prints the average, total and count of every habit from one pass.
     """
     
     
     
-    def __init__(self, username, today='2025-01-14'): # today is static for testingdatetime.date.today().strftime("%Y-%m-%d")
+    def __init__(self, username, today='2025-01-14', storage=None): # today is static for testingdatetime.date.today().strftime("%Y-%m-%d")
         """
         Initializes a new Habit object.
     
         Parameters:
             username (str): The username of the person tracking the habit.
             today (str): The current date in YYYY-MM-DD format. Defaults to '2025-01-14' for testing.
+            storage (Storage): The storage engine holding the user's data. Defaults to get_storage().
         """
         self.__username = username
         self.__today = today
+        self.__storage = storage or get_storage()
 
         
 
     ### data management #############################################
     def load_tracking_data(self):
-      """Loads tracking data from a CSV file."""
-      return pd.read_csv(f'data\/tracking_{self.__username}.csv')
+      """Loads the tracking data from the storage engine."""
+      return self.__storage.load_tracking(self.__username)
 
     def save_tracking_data(self, df_tracking):
-      """Saves tracking data to a CSV file."""
-      df_tracking.to_csv(f'data\/tracking_{self.__username}.csv', index=False)
+      """Saves the tracking data to the storage engine."""
+      self.__storage.save_tracking(self.__username, df_tracking)
+      self._drop_derived_states()
+
+    def append_tracking_data(self, rows):
+      """
+      Appends new entries to the tracking log without rewriting the history.
+
+      The persisted streak state and run index are advanced for every new
+      entry; entries older than a habit's current run recompute only that
+      habit's streak state.
+
+      Rows are validated before anything is written (see validate_rows);
+      invalid rows are reported and not tracked.
+
+      Parameters:
+          rows (list): A list of (date, habit, value) tuples.
+
+      Returns:
+          int: The number of entries tracked.
+      """
+      rows, errors = validate_rows(rows)
+      for error in errors:
+          print(f"Error: Entry not tracked ({error}). Dates must be YYYY-MM-DD and values numbers.")
+      if not rows:
+          return 0
+      self.__storage.append_tracking(self.__username, rows)
+      # the cached series and sums first: a streak recompute builds missing ones from the
+      # stored history, which already holds the rows, and they must not be added twice
+      self._advance_series(rows)
+      self._advance_prefix_sums(rows)
+      self._advance_streaks(rows)
+      self._advance_runs(rows)
+      self._advance_seen(rows)
+      return len(rows)
+
+    def _drop_derived_states(self, appended=False):
+      """
+      Drops the streak state, run index, last tracked dates, prefix sums, habit
+      series, date index and daily rollup; they are rebuilt from the log on the next read.
+
+      Parameters:
+          appended (bool): Whether rows were only appended, in which case the rollup
+              catches up from its watermark and is kept.
+      """
+      for name in DERIVED_STATES:
+          self.__storage.save_state(self.__username, name, None)
+      if not appended:
+          for name in DERIVED_ARRAYS:
+              self.__storage.save_arrays(self.__username, name, None)
+      self.__storage.set_cached(self.__username, 'prefix_sums', None)
+      self.__storage.set_cached(self.__username, 'habit_series', None)
+      self.__storage.set_cached(self.__username, 'habits_by_date', None)
 
     def load_user_data(self):
-      """Loads user data from a CSV file."""
-      return pd.read_csv(f'data\/user_data_{self.__username}.csv') 
+      """Loads the user data from the storage engine."""
+      return self.__storage.load_user(self.__username)
 
     def save_user_data(self, df_user):
-      """Saves user data to a CSV file."""
-      df_user.to_csv(f'data\/user_data_{self.__username}.csv', index=False)
+      """Saves the user data to the storage engine."""
+      self.__storage.save_user(self.__username, df_user)
+
+    def load_profile(self):
+      """Returns the parsed user profile, shared with User objects of the same user."""
+      return self.__storage.load_profile(self.__username)
+
+    def cache_stats(self):
+      """Returns the hit and miss counters of the storage engine's cache."""
+      return self.__storage.cache_stats()
 
     ### Getters ######################################################
     # get habits completed today
     def get_tracked_completed_today(self):
         """Returns a list of habits completed today."""
-        df_tracking = self.load_tracking_data()
-        habits = df_tracking.loc[df_tracking['date'] == self.__today, 'habit'].tolist()
-        return habits
+        return self.__storage.habits_on(self.__username, self.__today)
 
 
     # get habit unit of measurment
     def get_unit_of_measurement(self):
         """Returns a dictionary of units of measurement for each habit."""
-        df_user = self.load_user_data()
-        # get dictionary unit of measurement
-        habits_data = df_user.loc[0, 'measured_in']
-        habits_dict = json.loads(habits_data)
-        # return unit of measurement
-        return habits_dict
+        return dict(self.load_profile().measured_in)
 
 
     def get_current_habits(self):
         """Returns a list of current habits."""
-        df_user = self.load_user_data()
-        habits_string = df_user.loc[0, 'current_habits']
-        habits_list = habits_string.split(",")
-        return habits_list
+        return list(self.load_profile().current_habits)
 
-    def get_habit_history(self, habit):
+    def get_habit_history(self, habit, start=None, end=None, limit=None):
         """
         Returns the history of a habit as a list of dates and a list of values.
 
+        Only the requested slice is converted to lists; it is found by binary
+        search in the habit's date-sorted series (see habit_series).
+
         Parameters:
             habit (str): The name of the habit.
+            start (str): The first date to include (YYYY-MM-DD). Defaults to the first entry.
+            end (str): The last date to include (YYYY-MM-DD). Defaults to the last entry.
+            limit (int): The most entries to return, the earliest first. Defaults to all.
 
         Returns:
             tuple: A tuple containing two lists: the dates and the corresponding values.
         """
-        
+        days, values = self.habit_series(habit).between(
+            None if start is None else day_number(start), None if end is None else day_number(end), limit)
+        return days.astype('datetime64[D]').astype(str).tolist(), values.tolist()
+
+    def iter_habit_history(self, habit, start=None, end=None, chunksize=1000):
+        """
+        Yields the entries of a habit one at a time, for long histories.
+
+        Dates are formatted chunksize entries at a time, so no list of the whole
+        range is built.
+
+        Parameters:
+            habit (str): The name of the habit.
+            start (str): The first date to include (YYYY-MM-DD). Defaults to the first entry.
+            end (str): The last date to include (YYYY-MM-DD). Defaults to the last entry.
+            chunksize (int): The number of entries formatted at a time.
+
+        Yields:
+            tuple: The date (YYYY-MM-DD) and value of every entry, in date order.
+        """
+        days, values = self.habit_series(habit).between(
+            None if start is None else day_number(start), None if end is None else day_number(end))
+        days, values = days.copy(), values.copy()   # later appends must not shift the entries under us
+        for i in range(0, len(days), chunksize):
+            dates = days[i:i + chunksize].astype('datetime64[D]').astype(str).tolist()
+            yield from zip(dates, values[i:i + chunksize].tolist())
+
+    def habit_series(self, habit):
+        """
+        Returns the date-sorted HabitSeries of a habit.
+
+        Series are built from the storage engine's history of that habit the
+        first time it is queried in a session, kept next to the cached tracking
+        data and extended on every append.
+
+        Parameters:
+            habit (str): The name of the habit.
+
+        Returns:
+            HabitSeries: The habit's entries.
+        """
         habit = habit.lower() #ensure habit_name continuity
-        
-        df_tracking = self.load_tracking_data()
-        df_tracking = df_tracking.sort_values(by='date')
-        
-        df_tracking['habit'] = df_tracking['habit'].str.lower()
-        df_tracking = df_tracking[df_tracking['habit'] == habit]
-        habit_history_date = df_tracking['date'].tolist()
-        habit_history_value = df_tracking['value'].tolist()
-        return habit_history_date, habit_history_value
+        series = self.__storage.get_cached(self.__username, 'habit_series')
+        if series is None:
+            series = {}
+            self.__storage.set_cached(self.__username, 'habit_series', series)
+        if habit not in series:
+            dates, values = self.__storage.habit_history(self.__username, habit)
+            series[habit] = HabitSeries(day_numbers(dates), values)
+        return series[habit]
+
+    def _advance_series(self, rows):
+        """Adds newly appended rows to the habit series that were built."""
+        series = self.__storage.get_cached(self.__username, 'habit_series')
+        if series is None:
+            return
+        for date, habit, value in rows:
+            if habit.lower() in series:
+                series[habit.lower()].add(day_number(date), value)
 
     def get_periodicity(self, habit):
         """
@@ -173,14 +3700,7 @@ class Habit:
         Returns:
             str: The periodicity of the habit.
         """
-        df_user = self.load_user_data()
-        habit = habit.lower()
-        
-        # get dictionary unit of measurement
-        habits_data = df_user.loc[0, 'period']
-        habits_dict = json.loads(habits_data)
-        habits_dict = {k.lower(): v for k, v in habits_dict.items()}
-        return habits_dict[habit]
+        return self.load_profile().period[habit.lower()]
 
 
     ### interactions ################################################
@@ -193,43 +3713,137 @@ class Habit:
             habit_name (str): The name of the habit.
             tracked_value (float): The value to track for the habit.
         """
-        df_tracking = self.load_tracking_data()
-        
-        habit_name = habit_name.lower() # lowercase habit name for continuity 
+        habit_name = habit_name.lower() # lowercase habit name for continuity 
+
+        # append the new entry to the end of the tracking log
+        self.append_tracking_data([(self.__today, habit_name, tracked_value)])
+
+    # correct previously tracked habit
+    def correct_tracked_habit(self, date, habit, new_value, entry=1):
+        """
+        Corrects a previously tracked habit.
+
+        Parameters:
+            date (str): The date of the entry to correct (YYYY-MM-DD).
+            habit (str): The name of the habit to correct.
+            new_value (float): The new value for the habit.
+            entry (int): The entry number to correct (1 for the first entry, 2 for the second, etc.). Defaults to 1.
+        """ 
+        if self.correct_many([(date, habit, new_value, entry)]):
+            print('Habit Corrected!!')
+
+    # correct many entries at once (data cleanup)
+    def correct_many(self, corrections):
+        """
+        Corrects several previously tracked entries in a single write.
+
+        Entries are looked up by (date, habit, entry) through the storage engine,
+        and only the changed values are written. Entries that do not exist are
+        reported and skipped.
+
+        Parameters:
+            corrections (iterable): (date, habit, new_value) or (date, habit, new_value, entry) tuples.
+
+        Returns:
+            int: The number of entries corrected.
+        """
+        corrections = [(c[0], c[1].lower(), c[2], c[3] if len(c) > 3 else 1) for c in corrections]
+        results = self.__storage.correct_entries(self.__username, corrections) if corrections else []
+        changed = []
+        for (date, habit, new_value, entry), result in zip(corrections, results):
+            if result is None:
+                print(f"Error: Entry no. {entry} for habit '{habit}' on date '{date}' not found and not corrected.")
+            else:
+                changed.append((date, habit, entry, result[1], new_value))
+        if changed:
+            self._apply_corrections(changed)
+        return len(changed)
+
+    def _apply_corrections(self, changed):
+        """
+        Brings the value based derived data up to date after corrections.
+
+        Parameters:
+            changed (list): (date, habit, entry, old_value, new_value) tuples.
+        """
+        for name in ('prefix_sums', 'habit_series'):
+            cached = self.__storage.get_cached(self.__username, name)
+            if cached is not None:   # rebuilt from the habit's history when next needed
+                for _, habit, _, _, _ in changed:
+                    cached.pop(habit, None)
+        arrays = self.__storage.load_arrays(self.__username, 'rollup')
+        if arrays is not None:   # only the corrected cells change
+            rollup = Rollup.from_arrays(arrays)
+            for change in changed:
+                rollup.correct(*change)
+            self.__storage.save_arrays(self.__username, 'rollup', rollup.to_arrays())
 
-        # Create a new DataFrame for the new entry
-        new_entry = pd.DataFrame({'date': [self.__today], 'habit': [habit_name], 'value': [tracked_value]})
+    # rename a habit without rewriting its history
+    def rename_habit(self, habit_name, new_name):
+        """
+        Renames a current habit in the profile and in every entry tracked so far.
 
-        # Append the new entry to the existing DataFrame
-        df_tracking = pd.concat([df_tracking, new_entry], ignore_index=True)
+        The storage engine renames the habit once (a journal entry or a habit
+        dictionary entry) instead of rewriting the history, and the streak
+        and analysis data are renamed with it (see _rename_derived). The
+        profile is saved once the history is renamed.
 
-        self.save_tracking_data(df_tracking)
+        Parameters:
+            habit_name (str): The name of the habit to rename.
+            new_name (str): The new name of the habit.
 
-    # correct previously tracked habit
-    def correct_tracked_habit(self, date, habit, new_value, entry=1):
+        Returns:
+            bool: True if the habit was renamed.
         """
-        Corrects a previously tracked habit.
+        habit_name, new_name = habit_name.lower(), new_name.strip().lower()
+        editor = ProfileEditor(self.load_profile())
+        if not editor.rename_habit(habit_name, new_name):
+            return False
+        if self.__storage.habit_history(self.__username, new_name)[0]:   # the histories would be merged
+            print(f'{new_name} already has tracked entries, Please choose another name.')
+            return False
+        self._rename_derived(habit_name, new_name,
+                             lambda: self.__storage.rename_habit(self.__username, habit_name, new_name))
+        self.save_user_data(editor.to_frame())
+        return True
 
-        Parameters:
-            date (str): The date of the entry to correct (YYYY-MM-DD).
-            habit (str): The name of the habit to correct.
-            new_value (float): The new value for the habit.
-            entry (int): The entry number to correct (1 for the first entry, 2 for the second, etc.). Defaults to 1.
-        """ 
-        df_tracking = self.load_tracking_data()
-        # Calculate the actual index of the entry to be corrected
+    def _rename_derived(self, habit, new_name, rename_log):
+        """
+        Renames a habit in the derived data around the rename of the tracking log.
 
-        try:
-            entry_index = df_tracking[(df_tracking['date'] == date) & (df_tracking['habit'].str.lower() == habit)].index[entry-1]
-            print('ENTRY INDEX', entry_index)
-            df_tracking.loc[entry_index, 'value'] = new_value
-        except IndexError:
-            print(f"Error: Entry no. {entry} for habit '{habit}' on date '{date}' not found and not corrected.")
-            return
+        The persisted states and rollup are removed while rename_log runs, so an
+        interrupted rename leaves nothing behind under the old name, and are
+        saved under the new name afterwards instead of being rebuilt from the log.
 
+        Parameters:
+            habit (str): The lowercase name of the habit.
+            new_name (str): The new lowercase name.
+            rename_log (function): Renames the habit in the tracking log.
+        """
+        def renamed(row):
+            return row if not row or row[1] != habit else (row[0], new_name) + tuple(row[2:])
 
-        self.save_tracking_data(df_tracking)
-        print('Habit Corrected!!')
+        states = {name: self.__storage.load_state(self.__username, name) for name in DERIVED_STATES}
+        arrays = self.__storage.load_arrays(self.__username, 'rollup')
+        cached = {name: self.__storage.get_cached(self.__username, name) for name in ('prefix_sums', 'habit_series')}
+        self._drop_derived_states()
+        rename_log()
+        for name, state in states.items():
+            if state is not None and 'watermark' in state:
+                if habit in state['habits']:
+                    state['habits'][new_name] = state['habits'].pop(habit)
+                state['last_row'] = renamed(state['last_row'])
+                self.__storage.save_state(self.__username, name, state)
+        if arrays is not None:
+            rollup = Rollup.from_arrays(arrays)
+            rollup.habits = [new_name if h == habit else h for h in rollup.habits]
+            rollup.last_row = renamed(rollup.last_row)
+            self.__storage.save_arrays(self.__username, 'rollup', rollup.to_arrays())
+        for name, by_habit in cached.items():
+            if by_habit is not None:
+                if habit in by_habit:
+                    by_habit[new_name] = by_habit.pop(habit)
+                self.__storage.set_cached(self.__username, name, by_habit)
 
     # track habit that happened in the past
     def track_historical_habit(self, habit_name, tracked_value, date):
@@ -241,18 +3855,48 @@ class Habit:
             tracked_value (float): The value to track for the habit.
             date (str): The date to track the habit for (YYYY-MM-DD).
         """
-        df_tracking = self.load_tracking_data()
-        
         # lowercase habit name for continuity 
         habit_name = habit_name.lower()
 
-        # Create a new DataFrame for the new entry
-        new_entry = pd.DataFrame({'date': [date], 'habit': [habit_name], 'value': [tracked_value]})
+        # append the new entry to the end of the tracking log
+        self.append_tracking_data([(date, habit_name, tracked_value)])
+
+    # track many habits at once (imports)
+    def track_many(self, entries, chunksize=INGEST_CHUNK_SIZE):
+        """
+        Tracks many entries in a single write.
+
+        Every row is validated (YYYY-MM-DD date, non empty habit, numeric value)
+        and habit names are lowercased. Invalid rows are reported and skipped.
+        File sources are read chunk by chunk, so large imports run in bounded
+        memory.
+
+        Parameters:
+            entries: A DataFrame with date, habit and value columns, an iterable of
+                (date, habit, value) tuples or dictionaries, or the path of a .csv
+                or .jsonl file.
+            chunksize (int): The number of rows read and validated at a time.
+
+        Returns:
+            int: The number of entries tracked.
+        """
+        errors = []
 
-        # Append the new entry to the existing DataFrame
-        df_tracking = pd.concat([df_tracking, new_entry], ignore_index=True)
+        def valid_chunks():
+            first_row = 1
+            for frame in iter_entry_frames(entries, chunksize):
+                rows, chunk_errors = validate_entries(frame.reset_index(drop=True), first_row)
+                errors.extend(chunk_errors)
+                first_row += len(frame)
+                if rows:
+                    yield rows
 
-        self.save_tracking_data(df_tracking)
+        count = self.__storage.append_tracking_chunks(self.__username, valid_chunks())
+        if count:
+            self._drop_derived_states(appended=True)
+        if errors:
+            report_errors(f'Skipped {len(errors)} invalid entries:', errors)
+        return count
 
 
     ### analysis ####################################################
@@ -260,13 +3904,12 @@ class Habit:
     def today_report(self):
         """Prints a report of habits completed and not completed today."""
         
-        df_tracking = self.load_tracking_data()# load user data
-        current_habits = self.get_current_habits() # get list of current habits
-        current_habits = [h.lower() for h in current_habits] # ensure habits are all lowercase
+        profile = self.load_profile()
+        current_habits = [h.lower() for h in profile.current_habits] # ensure habits are all lowercase
         daily_habits = []
         weekly_habits = []
         for habit in current_habits:   # sort weekly and daily habits into two lists
-            if self.get_periodicity(habit) == 'daily':
+            if profile.period[habit] == 'daily':
                 daily_habits.append(habit)
             else:
                 weekly_habits.append(habit)
@@ -274,9 +3917,12 @@ class Habit:
         print('daily_habits', ', '.join(daily_habits)) # show current habits
         print('weekly_habits', ', '.join(weekly_habits))
               
-        # get habits completed today
-        today_tracked_habits = df_tracking[df_tracking['date'] == self.__today]['habit'].unique().tolist()
-        today_tracked_habits = [h.lower() for h in today_tracked_habits]
+        # get habits completed today from the last tracked date of every habit
+        last_seen = self.last_seen()
+        if any(date > self.__today for date in last_seen.values()):   # tracked ahead of today
+            today_tracked_habits = self.habits_tracked_on(self.__today)
+        else:
+            today_tracked_habits = [habit for habit, date in last_seen.items() if date == self.__today]
         
         # daily habits get habits not completed today
         habits_to_track = [habit for habit in daily_habits if habit not in today_tracked_habits]
@@ -289,18 +3935,20 @@ class Habit:
           print(f'Habits that have not been compelete today {self.__today}: ',', '.join(habits_to_track))
 
         today = dt.strptime(self.__today, "%Y-%m-%d") #covert string to datetime object
-        start_of_week = today - datetime.timedelta(days=today.weekday()) # get monday of week
+        start_of_week = (today - datetime.timedelta(days=today.weekday())).strftime("%Y-%m-%d") # get monday of week
         weekly_tracked_habits = []
         weekly_to_track = []
-        if not weekly_habits:
-          for habit in weekly_habits: # checks if habit has been tracked since this last Monday
-              df_tmp = df_tracking[df_tracking['habit']==habit]
-              df_tmp = df_tmp.sort_values('date', ascending=False)
-              last_track_date = dt.strptime(df_tmp.iloc[0,0], "%Y-%m-%d")
-              if start_of_week <= last_track_date:
-                  weekly_tracked_habits.append(habit)
-              else:
-                  weekly_to_track.append(habit)
+        for habit in weekly_habits: # checks if habit has been tracked since this last Monday
+            last_track_date = last_seen.get(habit, '')
+            if last_track_date > self.__today:   # look at this week's days instead
+                this_week = (today - datetime.timedelta(days=i) for i in range(today.weekday() + 1))
+                tracked = any(habit in self.habits_tracked_on(day.strftime("%Y-%m-%d")) for day in this_week)
+            else:
+                tracked = start_of_week <= last_track_date
+            if tracked:
+                weekly_tracked_habits.append(habit)
+            else:
+                weekly_to_track.append(habit)
         
         if not weekly_to_track: # display message based of if weekly habits still to track
           print('Congratulations!! You\'ve finished all of your weekly habits' )
@@ -314,9 +3962,401 @@ class Habit:
 
 
 
+    # last tracked dates and tracked habits per date
+    def last_seen(self):
+        """
+        Returns the last date every habit was tracked on.
+
+        The map is persisted as a small derived state and updated on every
+        append, so reading it does not depend on the length of the history.
+        Rows it does not cover yet are folded in first (see _current_state).
+
+        Returns:
+            dict: The last tracked date (YYYY-MM-DD) of every lowercase habit.
+        """
+        state, changed = self._current_state('last_seen', self._build_seen, self._fold_seen)
+        if changed:
+            self.__storage.save_state(self.__username, 'last_seen', state)
+        return state['habits']
+
+    def _build_seen(self, rollup):
+        """Returns the last tracked date of every habit tracked in a rollup."""
+        return {habit: str(np.datetime64(int(days.max()), 'D'))
+                for habit, days in rollup.tracked_days().items() if len(days)}
+
+    def _fold_seen(self, habits, rows):
+        """Moves the last tracked dates of habits forward for (date, habit, value) rows."""
+        for date, habit, value in rows:
+            habit = habit.lower()
+            if date > habits.get(habit, ''):
+                habits[habit] = date
+
+    def habits_tracked_on(self, date):
+        """
+        Returns the habits tracked on a date from the date index.
+
+        The index maps every tracked date to its habits. It is built from the
+        daily rollup once per session and extended on every append.
+
+        Parameters:
+            date (str): The date (YYYY-MM-DD).
+
+        Returns:
+            list: The lowercase habits tracked on that date.
+        """
+        index = self.__storage.get_cached(self.__username, 'habits_by_date')
+        if index is None:
+            frame = self.rollup().tracked_frame()
+            index = {day: list(habits) for day, habits in frame.groupby('date', sort=False)['habit']}
+            self.__storage.set_cached(self.__username, 'habits_by_date', index)
+        return list(index.get(date, []))
+
+    def _advance_seen(self, rows):
+        """Adds newly appended rows to the last tracked dates and the date index, if they exist."""
+        self._advance_state('last_seen', self._fold_seen, rows)
+        index = self.__storage.get_cached(self.__username, 'habits_by_date')
+        if index is not None:
+            for date, habit, value in rows:
+                habit = habit.lower()
+                if habit not in index.setdefault(date, []):
+                    index[date].append(habit)
+
+    # persisted derived states
+    def _current_state(self, name, build, fold):
+        """
+        Loads a persisted derived state and brings it up to date with the tracking log.
+
+        Like the daily rollup, a state records how many tracking rows it covers
+        (watermark) and the date and habit of the last of them (last_row; states
+        do not depend on values, so corrections leave it valid). Rows past the
+        watermark, left when a session stopped between an append and saving the
+        state, are folded in; the state of a rewritten log is built again.
+
+        Parameters:
+            name (str): The state name, one of DERIVED_STATES.
+            build (function): Returns the state's habits built from a Rollup.
+            fold (function): Adds (date, habit, value) rows to the state's habits.
+
+        Returns:
+            tuple: The state and whether it changed and has to be saved.
+        """
+        state = self.__storage.load_state(self.__username, name)
+        if state is not None and 'watermark' in state:
+            start = max(state['watermark'] - 1, 0)   # the last covered row is read again
+            df_rows = self.__storage.tracking_since(self.__username, start)
+            if not log_rewritten(df_rows, start, state['watermark'], state['last_row']):
+                df_new = df_rows.iloc[state['watermark'] - start:]
+                if not len(df_new):
+                    return state, False
+                fold(state['habits'], list(zip(date_strings(df_new['date']).tolist(),
+                                               df_new['habit'].astype(str).tolist(), df_new['value'].tolist())))
+                state['watermark'] = start + len(df_rows)
+                state['last_row'] = tracking_row_key(df_rows, len(df_rows) - 1)[:2]
+                return state, True
+        rollup = self.rollup()
+        last_row = rollup.last_row[:2] if rollup.last_row else None
+        return {'habits': build(rollup), 'watermark': rollup.watermark, 'last_row': last_row}, True
+
+    def _advance_state(self, name, fold, rows):
+        """Folds newly appended rows into a persisted derived state and moves its watermark, if the state exists."""
+        state = self.__storage.load_state(self.__username, name)
+        if state is None or 'watermark' not in state:   # nothing to keep up to date, built on the next read
+            return
+        fold(state['habits'], rows)
+        date, habit, value = rows[-1]
+        state['watermark'] += len(rows)
+        state['last_row'] = (date, habit.lower())
+        self.__storage.save_state(self.__username, name, state)
+
+    # persisted streak state
+    def streak_state(self):
+        """
+        Returns the persisted streak state of every habit.
+
+        The state is built from the daily rollup when it is missing, caught up
+        with rows it does not cover yet (see _current_state), and habits whose
+        periodicity changed are recomputed from their own history.
+
+        Returns:
+            dict: The state of habit_streak_state() for every tracked habit.
+        """
+        state, changed = self._current_state('streaks', self._build_streaks, self._fold_streaks)
+        periods = self.load_profile().period
+        habits = state['habits']
+        for habit, current in list(habits.items()):
+            weekly = periods.get(habit) == 'weekly'
+            if current['period'] != ('weekly' if weekly else 'daily'):
+                self._recompute_streak(habits, habit, weekly)
+                changed = True
+        if changed:
+            self.__storage.save_state(self.__username, 'streaks', state)
+        return habits
+
+    def _build_streaks(self, rollup):
+        """Returns the streak state of every habit tracked in a rollup."""
+        periods = self.load_profile().period
+        return {habit: habit_streak_state(days, periods.get(habit) == 'weekly')
+                for habit, days in rollup.tracked_days().items()}
+
+    def _advance_streaks(self, rows):
+        """Advances the persisted streak state for newly appended rows, if it exists."""
+        self._advance_state('streaks', self._fold_streaks, rows)
+
+    def _fold_streaks(self, habits, rows):
+        """Advances the streak states of habits by (date, habit, value) rows."""
+        periods = self.load_profile().period
+        for date, habit, value in rows:
+            habit = habit.lower()
+            weekly = periods.get(habit) == 'weekly'
+            current = habits.get(habit)
+            if current is None or current['period'] == ('weekly' if weekly else 'daily'):
+                current = advance_streak_state(current, day_number(date), weekly)
+            else:   # the periodicity changed since the state was built
+                current = None
+            if current is None:
+                self._recompute_streak(habits, habit, weekly)
+            else:
+                habits[habit] = current
+
+    def _recompute_streak(self, habits, habit, weekly):
+        """Rebuilds the streak state of one habit from its own history only."""
+        dates, values = self.get_habit_history(habit)
+        current = habit_streak_state(day_numbers(dates), weekly)
+        if current is None:
+            habits.pop(habit, None)
+        else:
+            habits[habit] = current
+
+    # current streak of every habit
+    def streaks(self):
+        """
+        Returns the current streak of every habit.
+
+        Streaks are read from the persisted streak state, so the cost does not
+        depend on the length of the history. Only a habit with entries after
+        today is counted from its own history.
+
+        Returns:
+            pd.DataFrame: The habit (index), periodicity, streak and streak_start columns of streak_table().
+        """
+        habits = self.streak_state()
+        periods = self.load_profile().period
+        today = day_number(self.__today)
+        rows = []
+        for habit in list(habits) + [h for h in periods if h not in habits]:
+            current = habits.get(habit)
+            bucket = int(week_numbers(today)) if periods.get(habit) == 'weekly' else today
+            if current is None or current['last'] < bucket:
+                streak, start = 0, ''
+            elif current['last'] == bucket:
+                streak, start = current['run'], str(np.datetime64(current['start'], 'D'))
+            else:   # tracked ahead of today
+                dates, values = self.get_habit_history(habit)
+                history = pd.DataFrame({'date': dates, 'habit': habit})
+                row = streak_table(history, {habit: periods.get(habit)}, self.__today).iloc[0]
+                streak, start = int(row['streak']), row['streak_start']
+            rows.append((habit, periods.get(habit), streak, start))
+        return pd.DataFrame(rows, columns=['habit', 'periodicity', 'streak', 'streak_start']).set_index('habit')
+
+    # run-length index
+    def run_indexes(self):
+        """
+        Returns the persisted run index of every tracked habit.
+
+        The index is built from the daily rollup when it is missing, caught up
+        with rows it does not cover yet (see _current_state), and habits whose
+        periodicity changed are rebuilt from their own history.
+
+        Returns:
+            dict: A RunIndex for every tracked habit.
+        """
+        state, changed = self._current_state('runs', self._build_runs, self._fold_runs)
+        periods = self.load_profile().period
+        indexes = {habit: RunIndex.from_state(runs) for habit, runs in state['habits'].items()}
+        for habit, index in list(indexes.items()):
+            weekly = periods.get(habit) == 'weekly'
+            if index.weekly != weekly:
+                dates, values = self.get_habit_history(habit)
+                indexes[habit] = RunIndex.from_days(day_numbers(dates), weekly)
+                state['habits'][habit] = indexes[habit].to_state()
+                changed = True
+        if changed:
+            self.__storage.save_state(self.__username, 'runs', state)
+        return indexes
+
+    def _build_runs(self, rollup):
+        """Returns the run index state of every habit tracked in a rollup."""
+        periods = self.load_profile().period
+        return {habit: RunIndex.from_days(days, periods.get(habit) == 'weekly').to_state()
+                for habit, days in rollup.tracked_days().items()}
+
+    def _advance_runs(self, rows):
+        """Adds newly appended rows to the persisted run index, if it exists."""
+        self._advance_state('runs', self._fold_runs, rows)
+
+    def _fold_runs(self, habits, rows):
+        """Adds (date, habit, value) rows to the run index states of habits."""
+        periods = self.load_profile().period
+        for date, habit, value in rows:
+            habit = habit.lower()
+            weekly = periods.get(habit) == 'weekly'
+            index = RunIndex.from_state(habits[habit]) if habit in habits else RunIndex(weekly)
+            if index.weekly == weekly:   # otherwise rebuilt from the history on the next read
+                index.add(date)
+                habits[habit] = index.to_state()
+
+    def run_index(self, habit):
+        """Returns the RunIndex of a habit, empty if it was never tracked."""
+        habit = habit.lower()
+        index = self.run_indexes().get(habit)
+        return index if index is not None else RunIndex(self.load_profile().period.get(habit) == 'weekly')
+
+    def had_streak(self, habit, period, date=None):
+        """
+        Checks whether a habit had an unbroken streak of period days (or weeks) ending on a date.
+
+        Dates and periods may be lists; they are broadcast against each other and
+        answered with one binary search over the habit's runs.
+
+        Parameters:
+            habit (str): The name of the habit.
+            period (int or list): The streak length(s) to check.
+            date (str or list): The date(s) the streak has to end on (YYYY-MM-DD). Defaults to today.
+
+        Returns:
+            bool or np.ndarray: One answer, or an array of answers for lists.
+        """
+        result = self.run_index(habit).has_streak(self.__today if date is None else date, period)
+        return bool(result) if np.ndim(result) == 0 else result
+
+    def streak_broken_on(self, habit, date=None):
+        """
+        Returns when the streak covering a date broke: the first day after it
+        without an entry (for weekly habits the Monday of the first week without one).
+
+        Parameters:
+            habit (str): The name of the habit.
+            date (str or list): The date(s) to look up (YYYY-MM-DD). Defaults to today.
+
+        Returns:
+            str or list: The date(s) the streak broke on (YYYY-MM-DD).
+        """
+        days = self.run_index(habit).broken_on(self.__today if date is None else date)
+        dates = np.asarray(days).astype('datetime64[D]').astype(str)
+        return str(dates) if np.ndim(dates) == 0 else dates.tolist()
+
+    # daily rollup
+    def rollup(self):
+        """
+        Returns the materialized daily rollup of the tracking log.
+
+        The rollup is persisted next to the tracking data (rollup_<user>.npz) and
+        only the rows tracked since it was saved are read and folded in.
+
+        Returns:
+            Rollup: The up to date rollup.
+        """
+        arrays = self.__storage.load_arrays(self.__username, 'rollup')
+        rollup = Rollup() if arrays is None else Rollup.from_arrays(arrays)
+        start = max(rollup.watermark - 1, 0)   # the last folded row is read again to detect a rewritten log
+        df_rows = self.__storage.tracking_since(self.__username, start)
+        if start and rollup.stale(df_rows, start):
+            rollup, start = Rollup(), 0
+            df_rows = self.__storage.tracking_since(self.__username, 0)
+        if rollup.refresh(df_rows, start):
+            self.__storage.save_arrays(self.__username, 'rollup', rollup.to_arrays())
+        return rollup
+
+    # rolling windows
+    def prefix_sums(self):
+        """
+        Returns the PrefixSums of every habit.
+
+        They are built from the tracking log once per session, kept next to the
+        cached tracking data by the storage engine and extended on every append.
+
+        Returns:
+            dict: A PrefixSums for every tracked (lowercase) habit.
+        """
+        sums = self.__storage.get_cached(self.__username, 'prefix_sums')
+        if sums is None:
+            df_tracking = self.load_tracking_data()
+            days = day_numbers(df_tracking['date'])
+            values = pd.to_numeric(df_tracking['value'], errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+            groups = df_tracking.groupby(df_tracking['habit'].astype(str), sort=False).indices
+            sums = {habit: PrefixSums.from_entries(days[positions], values[positions])
+                    for habit, positions in groups.items()}
+            self.__storage.set_cached(self.__username, 'prefix_sums', sums)
+        return sums
+
+    def _habit_prefix_sums(self, habit):
+        """Returns the PrefixSums of one habit, rebuilding it from its history if it was dropped."""
+        sums = self.prefix_sums()
+        habit = habit.lower()
+        if habit not in sums:
+            dates, values = self.get_habit_history(habit)
+            sums[habit] = PrefixSums.from_entries(day_numbers(dates), values)
+        return sums[habit]
+
+    def _advance_prefix_sums(self, rows):
+        """
+        Adds newly appended rows to the cached prefix sums of the habits that have
+        them; the others are built from their whole history when next needed.
+        """
+        sums = self.__storage.get_cached(self.__username, 'prefix_sums')
+        if sums is None:
+            return
+        for date, habit, value in rows:
+            if habit.lower() in sums:
+                sums[habit.lower()].add(day_number(date), float(value))
+
+    def window_stats(self, habit, days=7, end=None):
+        """
+        Returns the total and average of a habit over the last days days, in O(1) per window.
+
+        Parameters:
+            habit (str): The name of the habit.
+            days (int or list): The window length in days, or several, e.g. [7, 30, 90, 365].
+            end (str): The last day of the window (YYYY-MM-DD). Defaults to today.
+
+        Returns:
+            dict or pd.DataFrame: The total, the number of entries (count), the average
+                per entry and the average per day (daily_average). A list of
+                windows gives a DataFrame indexed by window length.
+        """
+        sums = self._habit_prefix_sums(habit)
+        end_day = day_number(end or self.__today)
+        lengths = np.atleast_1d(np.asarray(days, dtype=np.int64))
+        total, count = sums.window(end_day - lengths + 1, end_day)
+        frame = pd.DataFrame({'total': total,
+                              'count': count,
+                              'average': np.where(count > 0, total / np.maximum(count, 1), np.nan),
+                              'daily_average': total / lengths},
+                             index=pd.Index(lengths, name='days'))
+        return frame if np.ndim(days) else frame.iloc[0].to_dict()
+
+    def rolling_series(self, habit, window=7, start=None, end=None):
+        """
+        Returns the rolling total of a habit over window days, for every day from start to end.
+
+        Parameters:
+            habit (str): The name of the habit.
+            window (int): The window length in days. Defaults to 7.
+            start (str): The first day of the series (YYYY-MM-DD). Defaults to the first tracked day.
+            end (str): The last day of the series (YYYY-MM-DD). Defaults to today.
+
+        Returns:
+            pd.Series: The window totals indexed by date (YYYY-MM-DD).
+        """
+        sums = self._habit_prefix_sums(habit)
+        end_day = day_number(end or self.__today)
+        start_day = day_number(start) if start else min(sums.first_day, end_day)
+        ends = np.arange(start_day, end_day + 1)
+        total, count = sums.window(ends - window + 1, ends)
+        return pd.Series(total, index=ends.astype('datetime64[D]').astype(str), name=habit.lower())
 
     # calculate streak
-    def calculate_streak(self, habit, inside=False):
+    def calculate_streak(self, habit, inside=False, table=None):
         """
         Calculates the current streak for a habit.
 
@@ -324,51 +4364,22 @@ class Habit:
             habit (str): The name of the habit.
             inside (bool): Whether the function is being called internally (True) or externally (False). 
                            If True, no messages are printed to the user. Defaults to False.
+            table (pd.DataFrame): A streak table from streaks() to reuse. Defaults to computing one.
 
         Returns:
             int: The current streak for the habit.
             date(str): Date Streak was broken
         """
 
+        habit = habit.lower()
         habit_periodicity = self.get_periodicity(habit)
         if habit_periodicity not in ['daily', 'weekly']:
             print('Incorrect Habit Periodicity, Please change to daily or weekly') # error message if habit was created with incorrect periodcity
             return
-        habit_history, habit_past_values = self.get_habit_history(habit)
-        last_date_tracked = ''
-        if habit_periodicity == "daily": # daily habits
-            streak = 0
-            today = self.__today
-            # Iterate through completion dates in reverse (from most recent to oldest)
-            for completion_date_str in reversed(habit_history):          
-                if completion_date_str == today:
-                    streak += 1
-                    today = dt.strptime(today, "%Y-%m-%d") # convert string to datetime 
-                    today -= datetime.timedelta(days=1)  # Move to the previous day
-                    today = today.strftime("%Y-%m-%d") # convert datetime to string
-                    last_date_tracked = completion_date_str
-                else:
-                    break  # Break the loop if there's a gap in completion dates
-
-
-        elif habit_periodicity == "weekly": # weekly habits
-            streak = 0
-            today = dt.strptime(self.__today, "%Y-%m-%d")
-            
-            # create boundaries of week
-            start_of_week = today - datetime.timedelta(days=today.weekday())  # Monday of the current week
-            end_of_week = start_of_week + datetime.timedelta(days=6) # Sunday of the current week
-            
-            for completion_date_str in reversed(habit_history):# Iterate through completion dates in reverse
-                completion_date = dt.strptime(completion_date_str, "%Y-%m-%d") # convert string from database into datatime object
-
-                if start_of_week <= completion_date <= end_of_week: # Check if completion is within the current week or previous weeks
-                    streak += 1
-                    start_of_week -= datetime.timedelta(days=7)  # Move to the previous week's start back 7 days
-                    end_of_week -= datetime.timedelta(days=7)  # Move end of the week back 7 days
-                    last_date_tracked = completion_date_str
-                else:
-                    break
+        if table is None:
+            table = self.streaks()
+        streak = int(table.at[habit, 'streak'])
+        last_date_tracked = table.at[habit, 'streak_start']
 
         if inside: # if used as an inside function to quiet messages, or externally messages print
           # message to user
@@ -383,6 +4394,7 @@ class Habit:
         """Prints the longest current streak for any habit."""
         # get current habits
         current_habits = self.get_current_habits()
+        table = self.streaks()  # every streak in one pass
         
         # get current streak for each current have
         streaks_daily = []
@@ -392,7 +4404,7 @@ class Habit:
         dates_weekly = []
         weekly_habits = []
         for habit in current_habits:  # get streak length for each habit
-            streak_length, date_completed = self.calculate_streak(habit) 
+            streak_length, date_completed = self.calculate_streak(habit, table=table) 
                        
             if self.get_periodicity(habit) == 'daily':
                 streaks_daily.append(streak_length)
@@ -417,107 +4429,136 @@ class Habit:
             print(f'The habit your have been tracking for the longest time is {longest_streak_habit_daily} since {longest_streak_date_daily}')
         
         else:
-            # print('hi')
-            if dt.strptime(longest_streak_date_daily, "%Y-%m-%d") < dt.strptime(longest_streak_date_weekly, "%Y-%m-%d"):
+            # YYYY-MM-DD strings sort like dates; '' (no streak) sorts first
+            if longest_streak_date_daily < longest_streak_date_weekly:
                 print(f'The habit your have been tracking for the longest time is {longest_streak_habit_daily} since {longest_streak_date_daily}')
             else:
                 print(f'The habit your have been tracking for the longest time is {longest_streak_habit_weekly} since {longest_streak_date_weekly}')
 
 
-    def is_broken(self, habit,  period):
+    def is_broken(self, habit,  period, date=None):
         """
         Checks if a habit with a given streak is broken.
 
         Parameters:
             habit (str): The name of the habit.
             period (int): The period to check for a broken streak (in days or weeks, depending on habit periodicity).
+            date (str): The date the streak has to end on (YYYY-MM-DD). Defaults to today.
         """
-        # load periodicity and habit history
+        # load periodicity and the streak ending on the date from the run index
         habit_periodicity = self.get_periodicity(habit)
-        habit_history, habit_past_values = self.get_habit_history(habit)
-
+        if habit_periodicity not in ['daily', 'weekly']:
+            return
+        date = date or self.__today
+        streak = int(self.run_index(habit).streak_length(date))
+        streak = min(streak, period)  # only the last period days or weeks are checked
+        today = dt.strptime(date, "%Y-%m-%d")
 
         if habit_periodicity == "daily":  # for daily habits
-            streak = 0
-            today = dt.strptime(self.__today, "%Y-%m-%d")
-
-            # Iterate through completion dates in reverse (from most recent to oldest)
-            for completion_date_str in reversed(habit_history):
-                completion_date = dt.strptime(completion_date_str, "%Y-%m-%d")#.date()
-
-                # Check if the completion date is consecutive
-                if completion_date == today:
-                    streak += 1
-                    today -= datetime.timedelta(days=1)  # Move to the previous day
-                    if streak == period:
-                        print(f'You had a streak for {habit} for the last {period} days')
-                        return
-                else:
-                    break  # Break the loop if there's a gap in completion dates
-            print(f'You had a streak of {streak} but it was broken on {today.strftime("%Y-%m-%d")}')
-
+            if streak == period:
+                print(f'You had a streak for {habit} for the last {period} days')
+                return
+            broken_on = today - datetime.timedelta(days=streak)  # first day without an entry
+            print(f'You had a streak of {streak} but it was broken on {broken_on.strftime("%Y-%m-%d")}')
 
         elif habit_periodicity == "weekly":  # for weekly habits
-            streak = 0
-            today = dt.strptime(self.__today, "%Y-%m-%d")
-            
-            # create boundaries of week
             start_of_week = today - datetime.timedelta(days=today.weekday())  # Monday of the current week
-            end_of_week = start_of_week + datetime.timedelta(days=6)   # Sunday of current week
-            
-            # Iterate through completion dates in reverse
-            for completion_date_str in reversed(habit_history):
-                completion_date = dt.strptime(completion_date_str, "%Y-%m-%d")
-                if start_of_week <= completion_date <= end_of_week:
-                    streak += 1
-                    start_of_week -= datetime.timedelta(days=7)  # Move beg of week back 7 days
-                    end_of_week -= datetime.timedelta(days=7)  # Move end of week back 7 days
-                    if streak == period:
-                        print(f'You had a streak of {streak} but it was broken on the week of {start_of_week.strftime("%Y-%m-%d")}')
-                        return
-                else:
-                    break
+            start_of_week -= datetime.timedelta(days=7 * streak)  # Monday of the first week without an entry
             print(f'You had a streak of {streak} but it was broken on the week of {start_of_week.strftime("%Y-%m-%d")}')
 
 
-    def analyze_all_habits(self, task, current=False):
+    # all-time streaks
+    def streak_history(self, top_k=3):
+        """
+        Analyzes every streak ever made, for every habit, in one vectorized pass.
+
+        Parameters:
+            top_k (int): The number of longest streaks to list per habit. Defaults to 3.
+
+        Returns:
+            pd.DataFrame: The summary of streak_history(), indexed by habit.
+        """
+        runs = streak_runs(self.rollup().tracked_frame(), self.load_profile().period)  # one row per habit and day
+        return streak_history(runs, top_k)
+
+    def report_streak_history(self, top_k=3):
+        """
+        Prints the longest streak ever, the top streaks and the streak lengths of every habit.
+
+        Parameters:
+            top_k (int): The number of longest streaks to list per habit. Defaults to 3.
+        """
+        history = self.streak_history(top_k)
+        if history.empty:
+            print('You have no streaks yet. Keep tracking your habits.')
+            return
+        for habit, row in history.iterrows():
+            unit = 'weeks' if row['periodicity'] == 'weekly' else 'days'
+            print(f'For Habit: {habit}, your longest streak ever is {row["best"]} {unit} ({row["best_start"]} to {row["best_end"]})')
+            print('    Top streaks: ' + ', '.join(f'{length} {unit} ({start} to {end})' for length, start, end in row['top']))
+            print('    Streak lengths: ' + ', '.join(f'{length} {unit} x{count}' for length, count in row['distribution'].items()))
+
+
+    def habit_stats(self, current=False, chunksize=None):
+        """
+        Returns the summary statistics of all habits (or only current habits).
+
+        Parameters:
+            current (bool): Whether to include only current habits (True) or all habits (False). Defaults to False.
+            chunksize (int): Read the tracking log this many rows at a time with compact
+                column types and merge partial aggregates, so memory stays bounded by
+                the chunk size. Percentiles are then left out. Defaults to loading the whole log.
+
+        Returns:
+            pd.DataFrame: The count, mean, sum, min, max, std and percentiles of every habit.
+        """
+        habits = self.load_profile().current_set if current else None
+        if chunksize is not None:
+            return streaming_habit_stats(self.__storage.iter_tracking(self.__username, chunksize=chunksize, compact=True), habits)
+        return habit_stats(self.load_tracking_data(), habits)
+
+    def analyze_all_habits(self, task, current=False, stats=None):
         """
         Analyzes all habits (or only current habits) for a given task ('average', 'total', or 'count').
         
         Parameters:
             task (str): The type of analysis to perform ('average', 'total', or 'count').
             current (bool): Whether to analyze only current habits (True) or all habits (False). Defaults to False.
+            stats (pd.DataFrame): Statistics from habit_stats() to print from. Defaults to the totals of the daily rollup.
         """
-
-        # get tracking data, current habits, unit of measurement
-        df_tracking = self.load_tracking_data()
-        current_habits = self.get_current_habits()
-        units = self.get_unit_of_measurement()
-        
-        # ensure lowercase habit_name
-        df_tracking['habit'] = df_tracking['habit'].str.lower()
-        current_habits = [h.lower() for h in current_habits]
-        units = {k.lower(): v for k, v in units.items()}
-        
-        
-        if current: # reduce historical records to only current habits
-          df_tracking = df_tracking[df_tracking['habit'].isin(current_habits)]
+        if stats is None:   # count, sum and mean come from the daily rollup
+            stats = self.rollup().totals(self.load_profile().current_set if current else None)
+        units = self.load_profile().measured_in   # profile names are already lowercase
         
         # display different summarize statistics for all or current habits
         if task == 'average':  
-            df_tmp = df_tracking.groupby('habit').mean(numeric_only=True)
-            for h, avg in df_tmp.iterrows():
-                print(f'For Habit: {h}, you AVERAGED {round(avg.value,2)} {units[h]}')
+            for h, avg in stats['mean'].items():
+                print(f'For Habit: {h}, you AVERAGED {round(avg,2)} {units[h]}')
 
         elif task == 'total':
-          df_tmp = df_tracking.groupby('habit').sum(numeric_only=True)
-          for h, tot in df_tmp.iterrows():
-              print(f'For Habit: {h}, you TOTALLED {round(tot.value,2)} {units[h]}')
+          for h, tot in stats['sum'].items():
+              print(f'For Habit: {h}, you TOTALLED {round(tot,2)} {units[h]}')
 
         elif task == 'count':
-          df_tmp = df_tracking.groupby('habit').count()
-          for h, cnt in df_tmp.iterrows():
-              print(f'For Habit: {h}, you TRACKED {round(cnt.value,0)} times')
+          for h, cnt in stats['count'].items():
+              print(f'For Habit: {h}, you TRACKED {round(cnt,0)} times')
+
+    def analyze_habits_report(self, current=False, chunksize=None):
+        """
+        Prints the average, total and count of all habits (or only current habits)
+        from the daily rollup.
+
+        Parameters:
+            current (bool): Whether to analyze only current habits (True) or all habits (False). Defaults to False.
+            chunksize (int): Stream the tracking log in chunks of this many rows instead
+                (see habit_stats), for histories too large to load. Defaults to the rollup.
+        """
+        if chunksize is not None:
+            stats = self.habit_stats(current, chunksize)
+        else:
+            stats = self.rollup().totals(self.load_profile().current_set if current else None)
+        for task in ('average', 'total', 'count'):
+            self.analyze_all_habits(task, current, stats)
 
 
 class User:
@@ -532,7 +4573,10 @@ class User:
     Methods:
         load_user_data(): Loads user data from a CSV file.
         save_user_data(df_user): Saves user data to a CSV file.
+        load_profile(): Returns the parsed user profile.
+        cache_stats(): Returns the hit and miss counters of the shared data cache.
         get_current_habits(): Returns a list of current habits.
+        edit_profile(): Opens the profile for a batch of changes that are saved in one write.
         set_habit_meta(df_user, habit, value, meta): Sets the value of a habit's meta information (measured_in or period).
         create_user(user_name, DOB, city): Creates a new user.
         add_current_habit(habit_name, measured_in, period): Adds a new habit to the user's list of current habits.
@@ -540,29 +4584,40 @@ class User:
         get_suggestions(): Gets suggestions for new habits based on the user's current habits and other information.
     """
     
-    def __init__(self, username):
+    def __init__(self, username, storage=None):
         """
         Initializes a new User object.
 
         Parameters:
             username (str): The username of the user.
+            storage (Storage): The storage engine holding the user's data. Defaults to get_storage().
         """
         self.__username = username
+        self.__storage = storage or get_storage()
         
     ### data management ############################################
     def load_tracking_data(self):
-      """Loads tracking data from a CSV file."""
-      return pd.read_csv(f'data\/tracking_{self.__username}.csv')
+      """Loads the tracking data from the storage engine."""
+      return self.__storage.load_tracking(self.__username)
   
     # load user data
     def load_user_data(self):
-      """Loads user data from a CSV file."""
-      return pd.read_csv( f'data\/user_data_{self.__username}.csv')
+      """Loads the user data from the storage engine."""
+      return self.__storage.load_user(self.__username)
 
     # save user data
     def save_user_data(self, df_user):
-      """Saves user data to a CSV file."""
-      df_user.to_csv( f'data\/user_data_{self.__username}.csv', index=False)
+      """Saves the user data to the storage engine."""
+      self.__storage.save_user(self.__username, df_user)
+
+    # load parsed user profile
+    def load_profile(self):
+      """Returns the parsed user profile, shared with Habit objects of the same user."""
+      return self.__storage.load_profile(self.__username)
+
+    def cache_stats(self):
+      """Returns the hit and miss counters of the storage engine's cache."""
+      return self.__storage.cache_stats()
 
     ### Getters
     # list of current habits
@@ -570,14 +4625,32 @@ class User:
       """Returns a list of current habits.
         or empty list if no current habits for initialization"""
       try:
-        df_user = self.load_user_data()
-        habits_string = df_user.loc[0, 'current_habits']
-        habits_list = habits_string.split(",")
-        return habits_list
+        return list(self.load_profile().current_habits)
       except:
         return []
 
     ### Setters ################################################
+    # edit profile in one read and one write
+    @contextlib.contextmanager
+    def edit_profile(self):
+      """
+          Opens the user's profile for editing.
+
+          The profile is loaded once, every change made on the yielded
+          ProfileEditor is applied in memory, and the result is written with a
+          single atomic save when the with block ends. Nothing is written if the
+          block raises or makes no changes.
+
+          Example:
+              with user.edit_profile() as p:
+                  p.add_habit('reading', 'pages', 'daily')
+                  p.remove_habit('drawing')
+      """
+      editor = ProfileEditor(self.load_profile())
+      yield editor
+      if editor.changed:
+        self.save_user_data(editor.to_frame())
+
     # set_habit_meta
     def set_habit_meta(self, df_user, habit, value, meta='measured_in'):
       """
@@ -591,7 +4664,6 @@ class User:
       """
 
       if meta=='measured_in':
-        df_user = self.load_user_data()
         # set dictionary unit of measurement
         habits_data = df_user.loc[0, 'measured_in']
         habits_dict = json.loads(habits_data)   #load json from user data
@@ -631,9 +4703,7 @@ class User:
           'measured_in':'{}',
           'period':'{}'}
       df_user_tmp = pd.DataFrame(user_dict, index=[0])
-      df_tracking_tmp = pd.DataFrame(columns=['date', 'habit', 'value']) 
-      df_user_tmp.to_csv(os.path.join('data', f'user_data_{user_name}.csv'), index=False)
-      df_tracking_tmp.to_csv(os.path.join('data', f'tracking_{user_name}.csv'), index=False)
+      self.__storage.create_user(user_name, df_user_tmp)
 
 
     # add new current habit
@@ -646,43 +4716,8 @@ class User:
             measured_in (str): The unit of measurement for the habit.
             period (str): The periodicity of the habit ('daily' or 'weekly').
         """
-        # load user data add
-        df_user = self.load_user_data()
-        
-        # lower habit name for continuaity
-        habit_name = habit_name.lower()
-        
-        # check if current habit already exists
-        habits_list = self.get_current_habits()
-        if habit_name in habits_list:
-          print('Habit already exists, Please choose another name.')
-          return
-
-        # add measured_in to json
-        df_user = self.set_habit_meta(df_user, habit_name, measured_in, meta='measured_in')
-
-        # add habit period to json
-        df_user = self.set_habit_meta(df_user, habit_name, period, meta='period')
-
-
-        # Ensure habit_name is treated as a single item in a list
-        if isinstance(habit_name, str):    # Check if habit_name is a string
-            habit_name = [habit_name]    # Convert it to a list
-
-
-        try:
-          # extend habit to list
-          habits_list = self.get_current_habits()
-          habits_list.extend(habit_name)
-          habits_string = ",".join(habits_list)
-          df_user.loc[0, 'current_habits'] = habits_string    # save updated hait
-
-        except:
-          habits_string = ",".join(habit_name)
-          df_user.loc[0, 'current_habits'] = habits_string    # save first habit
-
-        # save user data
-        self.save_user_data(df_user)
+        with self.edit_profile() as profile:
+          profile.add_habit(habit_name, measured_in, period)
 
 
     # remove current habit
@@ -693,34 +4728,15 @@ class User:
         Parameters:
             habit_name (str): The name of the habit to remove.
         """
-        # load user data
-        df_user = self.load_user_data()
-        
-        # lowercase habit name for continuity 
-        habit_name = habit_name.lower()
-
-        try:
-          # remove habit from list
-          habits_list = self.get_current_habits()
-          habits_list.remove(habit_name)
-          habits_string = ",".join(habits_list)
-          df_user.loc[0, 'current_habits'] = habits_string
-
-        except:
-          print(f'There was no {habit_name} to remove.')
-          return
-          # habits_string = ",".join(habit_name)
-          # df_user.loc[0, 'current_habits'] = habits_string
-
-        # save user data
-        self.save_user_data(df_user)
+        with self.edit_profile() as profile:
+          profile.remove_habit(habit_name)
 
     # call gemini (LLM) for suggestions
     def get_suggestions(self):
         """
         Gets suggestions for new habits based on the user's current habits and other information.
         """
-        model = genai.GenerativeModel('gemini-1.5-flash')
+        model = gemini_model()
         
         prompt = '''
         You will recieve a persons name, date of birth, city and current habits.
@@ -758,7 +4774,7 @@ class User:
         """
         Gets suggestions for new habits based on the user's current habits and other information.
         """
-        model = genai.GenerativeModel('gemini-1.5-flash')
+        model = gemini_model()
         
         prompt = '''
         You will recieve a persons name, date of birth, city and current habits.
@@ -801,8 +4817,106 @@ def load_api_key(filepath="api_keys.json"):
     except FileNotFoundError:
         print(f"Error: API key file '{filepath}' not found.")
         return None       
-        
-        
+
+
+_gemini_configured = False
+
+
+def gemini_model(name='gemini-1.5-flash'):
+    """
+    Returns a Gemini model, importing and configuring the SDK on first use.
+
+    Parameters:
+        name (str): The name of the Gemini model.
+
+    Returns:
+        GenerativeModel: The model used for suggestions and greetings.
+    """
+    global _gemini_configured
+    if not _gemini_configured:
+        api_key = load_api_key()
+        if api_key:
+            genai.configure(api_key=api_key)
+        _gemini_configured = True
+    return genai.GenerativeModel(name)
+
+
+
+# command line tools
+def run_command(argv):
+    """
+    Runs a maintenance command instead of the interactive menu.
+
+    Usage:
+        python habit_tracker.py migrate --from csv --to sqlite [--user NAME ...]
+        python habit_tracker.py export [--format jsonl] [--compression gzip] [--output FILE] [--cursor FILE]
+        python habit_tracker.py rename --user NAME OLD NEW
+
+    Parameters:
+        argv (list): The command line arguments after the script name.
+
+    Returns:
+        int: The exit status.
+    """
+    parser = argparse.ArgumentParser(prog='habit_tracker.py', description='Habit tracker maintenance commands.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    migrate = commands.add_parser('migrate', help='copy users from one storage engine to another')
+    migrate.add_argument('--from', dest='source', required=True, choices=sorted(STORAGE_ENGINES))
+    migrate.add_argument('--to', dest='target', required=True, choices=sorted(STORAGE_ENGINES))
+    migrate.add_argument('--source-location', help='data directory or database file to read from')
+    migrate.add_argument('--target-location', help='data directory or database file to write to')
+    migrate.add_argument('--user', action='append', dest='users', help='user to copy (default: all users)')
+
+    export = commands.add_parser('export', help='stream tracking histories to a CSV, JSONL or Parquet file')
+    export.add_argument('--storage', default=os.environ.get('HABIT_STORAGE', 'csv'), choices=sorted(STORAGE_ENGINES))
+    export.add_argument('--location', help='data directory or database file to read from')
+    export.add_argument('--format', dest='fmt', default='csv', choices=EXPORT_FORMATS)
+    export.add_argument('--compression', choices=EXPORT_COMPRESSIONS)
+    export.add_argument('--output', default='-', help='file to write (default: standard output)')
+    export.add_argument('--user', action='append', dest='users', help='user to export (default: all users)')
+    export.add_argument('--cursor', help='JSON file of the rows already exported per user; only newer rows are '
+                                         'exported and the file is updated')
+    export.add_argument('--chunksize', type=int, default=INGEST_CHUNK_SIZE, help='rows read and written at a time')
+
+    rename = commands.add_parser('rename', help='rename a habit in a profile and its tracked history')
+    rename.add_argument('--storage', default=os.environ.get('HABIT_STORAGE', 'csv'), choices=sorted(STORAGE_ENGINES))
+    rename.add_argument('--location', help='data directory or database file')
+    rename.add_argument('--user', required=True)
+    rename.add_argument('habit', help='current name of the habit')
+    rename.add_argument('new_name', help='new name of the habit')
+
+    args = parser.parse_args(argv)
+    if args.command == 'migrate':
+        source = make_storage(args.source, args.source_location)
+        target = make_storage(args.target, args.target_location)
+        count = migrate_storage(source, target, args.users)
+        print(f'Migrated {count} users from {args.source} to {args.target}.')
+    elif args.command == 'export':
+        since = {}
+        if args.cursor and os.path.exists(args.cursor):
+            with open(args.cursor) as f:
+                since = json.load(f)
+        try:
+            cursor = export_tracking(make_storage(args.storage, args.location), args.output, args.users,
+                                     args.fmt, args.compression, since, args.chunksize)
+        except ValueError as e:
+            print(f'Error: {e}', file=sys.stderr)
+            return 1
+        if args.cursor:
+            atomic_write_json(cursor, args.cursor)
+        rows = sum(cursor.values()) - sum(since.get(user, 0) for user in cursor)
+        print(f'Exported {rows} rows of {len(cursor)} users.', file=sys.stderr)   # stdout may hold the export
+    elif args.command == 'rename':
+        storage = make_storage(args.storage, args.location)
+        if not storage.user_exists(args.user):
+            print(f'Error: unknown user {args.user}', file=sys.stderr)
+            return 1
+        if not Habit(args.user, storage=storage).rename_habit(args.habit, args.new_name):
+            return 1
+        print(f'Renamed {args.habit.lower()} to {args.new_name.strip().lower()}.')
+    return 0
+
 
 if __name__ == "__main__":
     """
@@ -812,9 +4926,9 @@ if __name__ == "__main__":
     based on user choices. It utilizes the Habit and User classes to manage habit tracking 
     and user data.
     """
-    api_key = load_api_key()
-    if api_key:
-        genai.configure(api_key=api_key) 
+    if len(sys.argv) > 1:   # maintenance commands run without the menu
+        sys.exit(run_command(sys.argv[1:]))
+
     while True:
         
         choice = display_menu() # Display the main menu and get user choice
@@ -844,8 +4958,7 @@ if __name__ == "__main__":
             if user_name == 'menu':
                 continue
             
-            user_data_filepath = os.path.join('data', f'user_data_{user_name}.csv')
-            if not os.path.exists(user_data_filepath):
+            if not get_storage().user_exists(user_name):
                 print(f"Error: User data file for '{user_name}' NOT found.")
                 retry = input("Try again? (y/n): ")
                 if retry.lower() != 'y':
@@ -947,25 +5060,31 @@ if __name__ == "__main__":
             if analysis_type == 'menu':
                 continue
             if analysis_type.lower() =='a':
-                habit_tracker.analyze_all_habits(task='average', current=False)  
-                habit_tracker.analyze_all_habits(task='total', current=False)   
-                habit_tracker.analyze_all_habits(task='count', current=False) 
+                habit_tracker.analyze_habits_report(current=False)
             elif analysis_type.lower() == 'c':
-                habit_tracker.analyze_all_habits(task='average', current=True)
-                habit_tracker.analyze_all_habits(task='total', current=True)  
-                habit_tracker.analyze_all_habits(task='count', current=True) 
+                habit_tracker.analyze_habits_report(current=True)
             elif analysis_type.lower() == 's':
                 habit = input('Which habit\'s history do you want to see to see the history of: ')
                 if habit == 'menu':
                     continue
                 habit = habit.lower()
+                start = input('From which date (YYYY-MM-DD, leave blank for the first entry)? ').strip() or None
+                end = input('Until which date (YYYY-MM-DD, leave blank for the last entry)? ').strip() or None
                 units = habit_tracker.get_unit_of_measurement()      # get units of measurment json
                 units = {k.lower(): v for k, v in units.items()}    # ensure all habit names are lower case
-                habit_history, habit_past_values = habit_tracker.get_habit_history(habit)   # get habit history
-                for hist, val in zip(habit_history, habit_past_values):
-                    print(f'{habit} was tracked on {hist} for {val} {units[habit]}')
-                    
-                print(f'{habit} tracked {len(habit_history)} times and averaged {sum(habit_past_values)/len(habit_history):.1f} {units[habit]}')
+                count, total = 0, 0
+                try:
+                    for hist, val in habit_tracker.iter_habit_history(habit, start, end):   # stream the habit history
+                        print(f'{habit} was tracked on {hist} for {val} {units[habit]}')
+                        count, total = count + 1, total + val
+                except ValueError:
+                    print("Invalid date. Please use the format YYYY-MM-DD.")
+                    continue
+
+                if count:
+                    print(f'{habit} tracked {count} times and averaged {total/count:.1f} {units[habit]}')
+                else:
+                    print(f'{habit} was not tracked in that period.')
                     
             else:
                 print("Invalid choice.")
@@ -994,7 +5113,12 @@ if __name__ == "__main__":
             user_manager.get_suggestions()
 
         elif choice == 14:                  # 14
+            # Handle the all-time streak analysis
+            habit_tracker.report_streak_history()
+
+        elif choice == 15:                  # 15
             print("Exiting the Habit Tracker. Goodbye!")
+            get_storage().close()   # let background compactions finish
             break
         
         # Add this condition to check for 'menu' input
@@ -7,10 +7,14 @@ Created on Wed Jan 22 13:49:07 2025
 import os
 import pytest
 import datetime
-from habit_tracker import Habit, User
+from habit_tracker import Habit, User, frame_cache, CsvStorage, SqliteStorage, NpzStorage, RecordStorage, migrate_storage, run_command, streak_table, Rollup, export_tracking
 import io
+import json
 from unittest.mock import patch
 import re
+import pandas as pd
+import subprocess
+import sys
 from contextlib import redirect_stdout
 
 
@@ -24,10 +28,10 @@ def test_create_user():
     assert os.path.exists(os.path.join('data', 'tracking_testuser.csv'))
     
 # Helper function to create a test user and track habits
-def setup_test_user(username, num_weeks=5):
-    user_manager = User(username)
+def setup_test_user(username, num_weeks=5, storage=None):
+    user_manager = User(username, storage=storage)
     user_manager.create_user(username, "2000-01-01", "Test City")
-    habit_tracker = Habit(username, today= datetime.date.today().strftime("%Y-%m-%d"))
+    habit_tracker = Habit(username, today= datetime.date.today().strftime("%Y-%m-%d"), storage=storage)
 
     # Add daily and weekly habits
     user_manager.add_current_habit("reading", "pages", "daily")
@@ -69,6 +73,35 @@ def test_remove_habit():
     user_manager.remove_current_habit("drawing")
     assert "drawing" not in user_manager.get_current_habits()
 
+# Test that a batch of profile edits is one read and one write
+def test_edit_profile_single_write():
+    user_manager = User("testuser")
+    user_manager.create_user("testuser", "2000-01-01", "Test City")
+    frame_cache.invalidate()
+    frame_cache.reset_stats()
+
+    with patch('habit_tracker.os.replace', wraps=os.replace) as mock_replace:
+        with user_manager.edit_profile() as profile:
+            for i in range(20):
+                profile.add_habit(f"Habit{i}", "minutes", "daily" if i % 2 else "weekly")
+            profile.remove_habit("habit3")
+            profile.set_meta("habit4", "hours")
+    assert mock_replace.call_count == 1
+    assert user_manager.cache_stats()['misses'] == 1
+
+    profile = user_manager.load_profile()
+    assert len(profile.current_habits) == 19
+    assert "habit3" not in profile.current_set
+    assert profile.measured_in['habit4'] == 'hours'
+    assert profile.period['habit0'] == 'weekly'
+
+    # nothing is written when the edits fail
+    with patch('habit_tracker.os.replace', wraps=os.replace) as mock_replace:
+        user_manager.add_current_habit("habit1", "minutes", "daily")  # already exists
+        user_manager.add_current_habit("napping", "minutes", "monthly")  # bad periodicity
+    assert mock_replace.call_count == 0
+    assert "napping" not in user_manager.get_current_habits()
+
 # Test cases for tracking a habit (menu option 5)
 def test_track_habit():
     habit_tracker, user_manager = setup_test_user("testuser")
@@ -86,13 +119,227 @@ def test_track_historical_habit():
     print( df_tracking[(df_tracking['date'] == '2025-01-15') & (df_tracking['habit'] == 'reading')])
     assert df_tracking[(df_tracking['date'] == '2025-01-15') & (df_tracking['habit'] == 'reading')].iloc[-1,2] == 20
 
+# Invalid dates are reported before anything is written
+def test_track_invalid_date(tmp_path):
+    storage = CsvStorage(str(tmp_path))
+    habit_tracker, user_manager = setup_test_user("testuser", num_weeks=2, storage=storage)
+    state = habit_tracker.streak_state()
+    with open(tmp_path / 'tracking_testuser.csv', 'rb') as f:
+        history_before = f.read()
+    for date in ("2025/01/05", "yesterday"):
+        with io.StringIO() as buf, redirect_stdout(buf):
+            habit_tracker.track_historical_habit("reading", 10, date)
+            assert 'Error: Entry not tracked (row 1: invalid date)' in buf.getvalue()
+    with open(tmp_path / 'tracking_testuser.csv', 'rb') as f:
+        assert f.read() == history_before
+    assert habit_tracker.streak_state() == state
+    assert len(habit_tracker.load_tracking_data()) == 14 + 2
+
+# Test that tracking appends to the log instead of rewriting it
+def test_track_habit_appends_only():
+    habit_tracker, user_manager = setup_test_user("testuser")
+    tracking_file = os.path.join('data', 'tracking_testuser.csv')
+    with open(tracking_file, 'rb') as f:
+        history_before = f.read()
+
+    habit_tracker.track_habit("drawing", 5)
+    habit_tracker.track_historical_habit("Drawing", 7, "2025-01-02")
+
+    with open(tracking_file, 'rb') as f:
+        history_after = f.read()
+    assert history_after.startswith(history_before)  # existing history untouched
+    assert history_after[len(history_before):] == f"{habit_tracker._Habit__today},drawing,5\n2025-01-02,drawing,7\n".encode()
+
+    df_tracking = habit_tracker.load_tracking_data()
+    assert len(df_tracking) == 35 + 5 + 2
+    assert df_tracking.iloc[-1].tolist() == [pd.Timestamp('2025-01-02'), 'drawing', 7]
+
+# Test that the login report parses each file only once
+def test_login_uses_cache():
+    habit_tracker, user_manager = setup_test_user("testuser")
+    frame_cache.invalidate()
+    frame_cache.reset_stats()
+
+    with io.StringIO() as buf, redirect_stdout(buf):
+        habit_tracker.today_report()
+        habit_tracker.longest_streak()
+    assert habit_tracker.cache_stats()['misses'] == 2  # tracking and user data
+    assert habit_tracker.cache_stats()['hits'] > 0
+
+    # writes go through the cache, no re-parse needed afterwards
+    habit_tracker.track_habit("drawing", 3)
+    df_tracking = habit_tracker.load_tracking_data()
+    assert df_tracking.iloc[-1]['habit'] == 'drawing'
+    assert user_manager.cache_stats()['misses'] == 2
+
+# Test that the parsed profile is shared and only rebuilt after a save
+def test_user_profile_shared():
+    habit_tracker, user_manager = setup_test_user("testuser")
+    profile = habit_tracker.load_profile()
+    assert profile is user_manager.load_profile()
+    assert profile.period['reading'] == 'daily'
+    assert profile.measured_in['exercise'] == 'minutes'
+    assert profile.current_set == {'reading', 'exercise', 'drawing'}
+    assert habit_tracker.get_periodicity("Exercise") == 'weekly'
+
+    user_manager.add_current_habit("Coding", "hours", "Daily")
+    new_profile = habit_tracker.load_profile()
+    assert new_profile is not profile
+    assert new_profile.period['coding'] == 'daily'
+    assert 'coding' in new_profile.current_set
+
+# Test cases for bulk imports
+def test_track_many(tmp_path):
+    habit_tracker, user_manager = setup_test_user("testuser")
+    entries = [("2024-06-01", "Swimming", 30), {"date": "2024-06-02", "habit": "swimming", "value": "45"},
+               ("06/03/2024", "swimming", 20), ("2024-06-04", "", 20), ("2024-06-05", "swimming", "lots")]
+    with io.StringIO() as buf, redirect_stdout(buf):
+        count = habit_tracker.track_many(entries)
+        output = buf.getvalue()
+    assert count == 2
+    assert "Skipped 3 invalid entries" in output
+    assert "row 3: invalid date" in output
+
+    import_file = tmp_path / 'import.jsonl'
+    import_file.write_text(''.join(f'{{"date": "2024-07-{d:02d}", "habit": "Yoga", "value": {d}}}\n' for d in range(1, 31)))
+    with patch('habit_tracker.os.fsync', wraps=os.fsync) as mock_fsync:
+        assert habit_tracker.track_many(str(import_file), chunksize=7) == 30
+    assert mock_fsync.call_count == 1  # one write for the whole import
+
+    dates, values = habit_tracker.get_habit_history("yoga")
+    assert len(dates) == 30 and values[-1] == 30
+    assert habit_tracker.get_habit_history("swimming") == (["2024-06-01", "2024-06-02"], [30, 45])
+
+# Test that history queries return only the requested date range
+def test_habit_history_range(tmp_path, monkeypatch):
+    storage = CsvStorage(str(tmp_path))
+    habit_tracker, user_manager = setup_test_user("testuser", num_weeks=2, storage=storage)
+    habit_tracker.track_historical_habit("drawing", 1, "2024-03-01")
+    habit_tracker.track_historical_habit("drawing", 2, "2024-03-05")
+    habit_tracker.track_historical_habit("drawing", 3, "2024-03-09")
+    assert habit_tracker.get_habit_history("Drawing", start="2024-03-02") == (["2024-03-05", "2024-03-09"], [2, 3])
+
+    # the built series answers later queries and follows appends without reading the log
+    monkeypatch.setattr(storage, 'load_tracking', lambda username: pytest.fail('tracking log loaded'))
+    habit_tracker.track_historical_habit("drawing", 4.5, "2024-03-05")
+    assert habit_tracker.get_habit_history("drawing", "2024-03-05", "2024-03-05") == (["2024-03-05"] * 2, [2, 4.5])
+    assert habit_tracker.get_habit_history("drawing", limit=2) == (["2024-03-01", "2024-03-05"], [1, 2])
+    assert habit_tracker.get_habit_history("drawing", start="2024-04-01") == ([], [])
+    assert list(habit_tracker.iter_habit_history("drawing", end="2024-03-05", chunksize=1)) == \
+        [("2024-03-01", 1), ("2024-03-05", 2), ("2024-03-05", 4.5)]
+
 # Test cases for correcting a tracked habit (menu option 7)
+def test_correct_then_backfill(tmp_path):
+    # a backfill after a correction recomputes the streak, the entry must be in the history once
+    for storage in (CsvStorage(str(tmp_path / 'csv')), SqliteStorage(str(tmp_path / 'habits.db'))):
+        User("testuser", storage=storage).create_user("testuser", "2000-01-01", "Test City")
+        User("testuser", storage=storage).add_current_habit("reading", "pages", "daily")
+        habit_tracker = Habit("testuser", today="2025-02-25", storage=storage)
+        habit_tracker.track_historical_habit("reading", 1, "2025-02-20")
+        habit_tracker.track_historical_habit("reading", 1, "2025-02-25")
+        habit_tracker.streak_state()
+        habit_tracker.window_stats("reading", 30)
+        with io.StringIO() as buf, redirect_stdout(buf):
+            habit_tracker.correct_tracked_habit("2025-02-25", "reading", 2)
+        habit_tracker.track_historical_habit("reading", 1, "2025-02-10")
+        assert habit_tracker.get_habit_history("reading") == (['2025-02-10', '2025-02-20', '2025-02-25'], [1, 1, 2])
+        assert habit_tracker.window_stats("reading", 30)['total'] == 4.0
+
 def test_correct_tracked_habit():
     habit_tracker, user_manager = setup_test_user("testuser")
     habit_tracker.correct_tracked_habit("2025-01-21", "reading", 25)
     df_tracking = habit_tracker.load_tracking_data()
     assert df_tracking[(df_tracking['date'] == '2025-01-21') & (df_tracking['habit'] == 'reading')].iloc[-1,2] == 25
 
+# Test that corrections are journaled and compacted into a new snapshot
+def test_correction_journal_and_compaction(tmp_path):
+    storage = CsvStorage(str(tmp_path))
+    habit_tracker, user_manager = setup_test_user("testuser", storage=storage)
+    tracking_file = os.path.join(str(tmp_path), 'tracking_testuser.csv')
+    with open(tracking_file, 'rb') as f:
+        snapshot = f.read()
+
+    day = (datetime.date.today() - datetime.timedelta(days=3)).strftime("%Y-%m-%d")
+    with io.StringIO() as buf, redirect_stdout(buf):
+        habit_tracker.correct_tracked_habit(day, "reading", 12.5)
+    with open(tracking_file, 'rb') as f:
+        assert f.read() == snapshot  # the CSV is not rewritten
+    assert os.path.exists(tracking_file + '.journal')
+
+    # a fresh session replays the journal
+    fresh = Habit("testuser", today=habit_tracker._Habit__today, storage=CsvStorage(str(tmp_path), cache=type(frame_cache)()))
+    assert fresh.get_habit_history("reading")[1][-4] == 12.5
+
+    habit_tracker.track_habit("drawing", 1)
+    storage.compact("testuser", wait=True)
+    assert not os.path.exists(tracking_file + '.journal')
+    df_tracking = CsvStorage(str(tmp_path), cache=type(frame_cache)()).load_tracking("testuser")
+    assert df_tracking[(df_tracking['date'] == day) & (df_tracking['habit'] == 'reading')].iloc[0, 2] == 12.5
+    assert df_tracking.iloc[-1]['habit'] == 'drawing'
+
+# Test that a crash between saving a snapshot and trimming the journal loses nothing
+def test_save_crash_recovery(tmp_path):
+    storage = CsvStorage(str(tmp_path))
+    habit_tracker, user_manager = setup_test_user("testuser", storage=storage)
+    day = datetime.date.today().strftime("%Y-%m-%d")
+    with io.StringIO() as buf, redirect_stdout(buf):
+        habit_tracker.correct_tracked_habit(day, "reading", 99)
+
+    df_new = habit_tracker.load_tracking_data().iloc[5:].reset_index(drop=True)
+    with patch.object(CsvStorage, '_trim_journal', side_effect=OSError('crash')):
+        with pytest.raises(OSError):
+            habit_tracker.save_tracking_data(df_new)
+
+    # the stale correction must not be replayed onto the new snapshot
+    recovered = CsvStorage(str(tmp_path), cache=type(frame_cache)()).load_tracking("testuser")
+    assert recovered.equals(df_new)
+
+    # a torn journal line from an interrupted write is ignored
+    with open(os.path.join(str(tmp_path), 'tracking_testuser.csv.journal'), 'a') as f:
+        f.write('{"op": "set", "row": 0, "col')
+    recovered = CsvStorage(str(tmp_path), cache=type(frame_cache)()).load_tracking("testuser")
+    assert recovered.equals(df_new)
+
+    # a correction written after the torn line is kept, and so are the ones before it
+    day = (datetime.date.today() - datetime.timedelta(days=7)).strftime("%Y-%m-%d")
+    with io.StringIO() as buf, redirect_stdout(buf):
+        habit_tracker.correct_tracked_habit(day, "exercise", 7)
+    with open(os.path.join(str(tmp_path), 'tracking_testuser.csv.journal'), 'a') as f:
+        f.write('{"op": "set", "ro')
+    with io.StringIO() as buf, redirect_stdout(buf):
+        habit_tracker.correct_tracked_habit(day, "reading", 42)
+    recovered = CsvStorage(str(tmp_path), cache=type(frame_cache)()).load_tracking("testuser")
+    today_rows = recovered[recovered['date'] == day].set_index('habit')['value']
+    assert today_rows['exercise'] == 7 and today_rows['reading'] == 42
+    with open(os.path.join(str(tmp_path), 'tracking_testuser.csv.journal')) as f:
+        seqs = [json.loads(line)['seq'] for line in f]
+    assert seqs == sorted(set(seqs))
+
+# Test that batch corrections are looked up by (date, habit, entry) and written once
+def test_correct_many(tmp_path, monkeypatch):
+    today = datetime.date.today()
+    days = [(today - datetime.timedelta(days=i)).strftime("%Y-%m-%d") for i in range(3)]
+    for storage in (CsvStorage(str(tmp_path / 'csv')), SqliteStorage(str(tmp_path / 'habits.db')),
+                    NpzStorage(str(tmp_path / 'npz')), RecordStorage(str(tmp_path / 'rec'))):
+        habit_tracker, _ = setup_test_user("testuser", num_weeks=2, storage=storage)
+        habit_tracker.rollup()
+        habit_tracker.track_habit("reading", 5)   # not folded into the rollup yet
+
+        corrections = [(days[1], "Reading", 12.5), (days[2], "reading", 3), (days[0], "reading", 8, 2), (days[0], "drawing", 1)]
+        with monkeypatch.context() as m, io.StringIO() as buf, redirect_stdout(buf):
+            if storage.name == 'csv':   # found through the entry index, not a full load
+                m.setattr(storage, 'load_tracking', lambda username: pytest.fail('tracking log loaded'))
+            assert habit_tracker.correct_many(corrections) == 3
+            assert buf.getvalue().count("not found and not corrected") == 1
+        if storage.name == 'csv':
+            with open(tmp_path / 'csv' / 'tracking_testuser.csv.journal') as f:
+                assert len(f.readlines()) == 1   # one commit for the whole batch
+
+        assert habit_tracker.get_habit_history("reading")[1][-4:] == [3, 12.5, 10, 8]
+        expected = Rollup()
+        expected.refresh(habit_tracker.load_tracking_data())
+        assert habit_tracker.rollup().totals().equals(expected.totals())
+
 # Test cases for analyzing the number of current habits (menu option 8)
 def test_analyze_number_of_current_habits():
     habit_tracker, user_manager = setup_test_user("testuser")
@@ -135,6 +382,52 @@ def test_analyze_habits():
     assert "For Habit: reading, you TRACKED 35 times" in output
     assert "For Habit: exercise, you TRACKED 5 times" in output
 
+def test_habit_stats():
+    habit_tracker, user_manager = setup_test_user("testuser")
+    habit_tracker.track_historical_habit("Reading", 40, "2020-01-01")
+
+    stats = habit_tracker.habit_stats(current=True)
+    assert list(stats.columns) == ['count', 'mean', 'sum', 'min', 'max', 'std', 'p25', 'median', 'p75']
+    assert stats.at['reading', 'count'] == 36
+    assert stats.at['reading', 'sum'] == 390
+    assert stats.at['reading', 'max'] == 40
+    assert stats.at['reading', 'median'] == 10
+
+    with io.StringIO() as buf, redirect_stdout(buf):
+        habit_tracker.analyze_habits_report(current=False)
+        output = buf.getvalue()
+    assert output.index("AVERAGED") < output.index("TOTALLED") < output.index("TRACKED")
+    assert "For Habit: reading, you TOTALLED 390 pages" in output
+    assert "For Habit: exercise, you TRACKED 5 times" in output
+
+# Test that chunked statistics merge to the same result as the in-memory ones
+def test_streaming_stats(tmp_path, monkeypatch):
+    storage = CsvStorage(str(tmp_path))
+    habit_tracker, user_manager = setup_test_user("testuser", storage=storage)
+    habit_tracker.track_habit("Drawing", 16.4)
+    habit_tracker.track_historical_habit("drawing", 3, "2020-01-01")
+
+    chunk = next(storage.iter_tracking("testuser", chunksize=4, compact=True))
+    assert (str(chunk['habit'].dtype), str(chunk['value'].dtype), chunk['date'].dtype.kind) == ('category', 'float32', 'M')
+
+    expected = habit_tracker.habit_stats()
+    streamed = habit_tracker.habit_stats(chunksize=4)
+    assert list(streamed.columns) == ['count', 'mean', 'sum', 'min', 'max', 'std']
+    pd.testing.assert_frame_equal(streamed, expected[streamed.columns], check_dtype=False)
+    assert streamed.at['drawing', 'sum'] == 19.4
+
+    reports = []
+    for chunksize in (None, 4):   # the streamed report prints like the one from the rollup
+        with io.StringIO() as buf, redirect_stdout(buf):
+            habit_tracker.analyze_habits_report(current=True, chunksize=chunksize)
+            reports.append(buf.getvalue())
+    assert reports[0] == reports[1]
+    assert "For Habit: drawing, you AVERAGED 9.7 minutes" in reports[1]
+
+    # large files give habit histories from compact chunks too
+    monkeypatch.setattr('habit_tracker.STREAM_TRACKING_BYTES', 0)
+    assert storage.habit_history("testuser", "drawing") == (['2020-01-01', habit_tracker._Habit__today], [3, 16.4])
+
 # Test cases for analyzing the longest streak (menu option 10)
 def test_analyze_longest_streak():
     habit_tracker, user_manager = setup_test_user("testuser")
@@ -207,6 +500,13 @@ def test_suggest_habit(mock_generate_content):
     assert "Habit 3." in output
     assert "Habit 4." in output
 
+def test_lazy_imports():
+    # the menu should come up without loading pandas or the Gemini SDK
+    code = ("import sys, habit_tracker; "
+            "print(sorted(m for m in ('numpy', 'pandas', 'google.generativeai') if m in sys.modules))")
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == '[]'
+
 # Test cases for the Habit class methods
 def test_calculate_streak_daily():
     habit_tracker, user_manager = setup_test_user("testuser")
@@ -236,4 +536,508 @@ def test_calculate_streak_weekly():
     habit_tracker.track_historical_habit("meditation", 30, (datetime.date.today() - datetime.timedelta(days=7)).strftime("%Y-%m-%d"))
     habit_tracker.track_habit("meditation", 45)
     streak, _ = habit_tracker.calculate_streak("meditation")  # Get streak and last_date_tracked
-    assert streak == 2
\ No newline at end of file
+    assert streak == 2
+
+# Test cases for the streak engine
+def test_streak_table():
+    df = pd.DataFrame({'date': ['2025-01-13', '2025-01-14', '2025-01-14', '2025-01-20', '2025-01-02', '2025-01-08', '2025-01-15'],
+                       'habit': ['reading', 'reading', 'reading', 'reading', 'exercise', 'exercise', 'exercise'],
+                       'value': [1, 2, 3, 4, 5, 6, 7]})
+    table = streak_table(df, {'reading': 'daily', 'exercise': 'weekly', 'drawing': 'daily'}, '2025-01-15').set_index('habit')
+    # two entries on one day count once and the future entry is ignored, but today has no entry
+    assert table.at['reading', 'streak'] == 0
+    assert table.at['exercise', 'streak'] == 3
+    assert table.at['exercise', 'streak_start'] == '2025-01-02'
+    assert table.at['drawing', 'streak'] == 0
+
+    table = streak_table(df, {'reading': 'daily', 'exercise': 'weekly'}, '2025-01-14').set_index('habit')
+    assert table.at['reading', 'streak'] == 2
+    assert table.at['reading', 'streak_start'] == '2025-01-13'
+
+def test_streak_state_incremental(tmp_path):
+    storage = CsvStorage(str(tmp_path))
+    habit_tracker, user_manager = setup_test_user("testuser", num_weeks=2, storage=storage)
+    before = habit_tracker.streak_state()   # built from the log and persisted
+    assert before['reading']['run'] == 14
+    assert os.path.exists(tmp_path / 'streaks_testuser.json')
+
+    today = datetime.date.today()
+    habit_tracker.track_historical_habit("drawing", 5, (today - datetime.timedelta(days=3)).strftime("%Y-%m-%d"))
+    habit_tracker.track_habit("drawing", 5)
+    habit_tracker.track_historical_habit("drawing", 5, (today - datetime.timedelta(days=20)).strftime("%Y-%m-%d"))  # backfill
+    habit_tracker.track_historical_habit("reading", 10, (today - datetime.timedelta(days=14)).strftime("%Y-%m-%d"))
+    incremental = habit_tracker.streak_state()
+
+    storage.save_state("testuser", "streaks", None)
+    assert habit_tracker.streak_state() == incremental   # same as a rebuild from the full log
+    assert incremental['reading']['run'] == 15
+    assert incremental['drawing']['run'] == 1
+    table = habit_tracker.streaks()
+    assert table.at['drawing', 'streak'] == 1
+    assert table.at['reading', 'streak'] == 15
+
+    # correcting the newest entry leaves the state as it is
+    habit_tracker.correct_many([((today - datetime.timedelta(days=14)).strftime("%Y-%m-%d"), "reading", 12)])
+    saved = storage.load_state("testuser", "streaks")
+    habit_tracker.streak_state()
+    assert storage.load_state("testuser", "streaks") == saved
+
+    # rows appended by a session that stopped before saving the state are caught up by the next one
+    storage.append_tracking("testuser", [((today - datetime.timedelta(days=1)).strftime("%Y-%m-%d"), "drawing", 5)])
+    storage = CsvStorage(str(tmp_path), cache=type(frame_cache)())
+    habit_tracker = Habit("testuser", today=today.strftime("%Y-%m-%d"), storage=storage)
+    assert habit_tracker.streak_state()['drawing']['run'] == 2
+    # and a log rewritten behind the state's back builds it again
+    df_tracking = habit_tracker.load_tracking_data()
+    storage.save_tracking("testuser", df_tracking[df_tracking['habit'] != 'drawing'])
+    assert 'drawing' not in habit_tracker.streak_state()
+
+def test_run_index(tmp_path):
+    storage = CsvStorage(str(tmp_path))
+    user_manager = User("testuser", storage=storage)
+    user_manager.create_user("testuser", "2000-01-01", "Test City")
+    user_manager.add_current_habit("reading", "pages", "daily")
+    habit_tracker = Habit("testuser", today="2025-01-20", storage=storage)
+    for day in ["2025-01-01", "2025-01-02", "2025-01-03", "2025-01-10", "2025-01-11", "2025-01-20"]:
+        habit_tracker.track_historical_habit("reading", 10, day)
+    assert habit_tracker.run_index("reading").starts.size == 3
+    assert habit_tracker.had_streak("reading", 3, "2025-01-03")
+    assert not habit_tracker.had_streak("reading", 3, "2025-01-11")
+    assert habit_tracker.streak_broken_on("reading", "2025-01-02") == "2025-01-04"
+
+    # filling gaps joins runs; the incremental index matches a rebuild
+    for day in ["2025-01-04", "2025-01-05", "2025-01-06", "2025-01-07", "2025-01-08", "2025-01-09"]:
+        habit_tracker.track_historical_habit("reading", 10, day)
+    incremental = habit_tracker.run_index("reading")
+    storage.save_state("testuser", "runs", None)
+    rebuilt = habit_tracker.run_index("reading")
+    assert incremental.to_state() == rebuilt.to_state() == {'period': 'daily', 'starts': [20089, 20108], 'ends': [20099, 20108]}
+
+    # rows the index missed (a session stopped before saving it) are added on the next read
+    storage.append_tracking("testuser", [("2025-01-19", "reading", 10)])
+    fresh = Habit("testuser", today="2025-01-20", storage=CsvStorage(str(tmp_path), cache=type(frame_cache)()))
+    assert fresh.streak_broken_on("reading", "2025-01-10") == "2025-01-12"
+    assert fresh.had_streak("reading", 2, "2025-01-20")
+
+    # bulk queries over many dates and periods
+    assert habit_tracker.had_streak("reading", [11, 12, 1], ["2025-01-11", "2025-01-11", "2025-01-20"]).tolist() == [True, False, True]
+    assert habit_tracker.streak_broken_on("reading", ["2025-01-05", "2025-01-15"]) == ["2025-01-12", "2025-01-15"]
+
+    with io.StringIO() as buf, redirect_stdout(buf):
+        habit_tracker.is_broken("reading", 5, "2025-01-11")
+        output = buf.getvalue()
+    assert "You had a streak for reading for the last 5 days" in output
+
+def test_streak_history(tmp_path):
+    storage = CsvStorage(str(tmp_path))
+    user_manager = User("testuser", storage=storage)
+    user_manager.create_user("testuser", "2000-01-01", "Test City")
+    user_manager.add_current_habit("reading", "pages", "daily")
+    user_manager.add_current_habit("exercise", "minutes", "weekly")
+    habit_tracker = Habit("testuser", today="2025-01-20", storage=storage)
+    habit_tracker.track_many([(day, "reading", 10) for day in
+                              ["2025-01-01", "2025-01-02", "2025-01-03", "2025-01-03", "2025-01-10", "2025-01-11", "2025-01-20"]]
+                             + [("2025-01-01", "exercise", 30), ("2025-01-08", "exercise", 30)])
+    history = habit_tracker.streak_history(top_k=2)
+    assert history.at['reading', 'best'] == 3
+    assert history.at['reading', 'top'] == [(3, '2025-01-01', '2025-01-03'), (2, '2025-01-10', '2025-01-11')]
+    assert history.at['reading', 'distribution'] == {1: 1, 2: 1, 3: 1}
+    assert history.at['exercise', 'best'] == 2
+
+    with io.StringIO() as buf, redirect_stdout(buf):
+        habit_tracker.report_streak_history()
+        output = buf.getvalue()
+    assert "For Habit: reading, your longest streak ever is 3 days (2025-01-01 to 2025-01-03)" in output
+    assert "For Habit: exercise, your longest streak ever is 2 weeks" in output
+
+# Test cases for windowed statistics and the daily rollup
+def test_window_stats(tmp_path):
+    storage = CsvStorage(str(tmp_path))
+    habit_tracker, user_manager = setup_test_user("testuser", num_weeks=2, storage=storage)
+    assert habit_tracker.window_stats("reading", 7) == {'total': 70.0, 'count': 7, 'average': 10.0, 'daily_average': 10.0}
+
+    # appends and corrections keep the cached sums up to date
+    habit_tracker.track_habit("reading", 20)
+    today = datetime.date.today().strftime("%Y-%m-%d")
+    habit_tracker.correct_tracked_habit(today, "reading", 5, entry=1)
+    windows = habit_tracker.window_stats("reading", [1, 7, 30])
+    assert windows['total'].tolist() == [25.0, 85.0, 155.0]
+    assert windows['count'].tolist() == [2, 8, 15]
+
+    rolling = habit_tracker.rolling_series("reading", window=3)
+    assert len(rolling) == 14
+    assert rolling.iloc[0] == 10.0
+    assert rolling.iloc[-1] == 45.0
+    assert rolling.index[-1] == today
+
+def test_window_stats_after_correction(tmp_path):
+    # a correction drops the habit's prefix sums, the next append must not start them from scratch
+    storage = CsvStorage(str(tmp_path))
+    User("testuser", storage=storage).create_user("testuser", "2000-01-01", "Test City")
+    habit_tracker = Habit("testuser", today="2025-01-20", storage=storage)
+    for day in range(10, 15):
+        habit_tracker.track_historical_habit("reading", 10, f"2025-01-{day}")
+    assert habit_tracker.window_stats("reading", 30)['total'] == 50.0
+    with io.StringIO() as buf, redirect_stdout(buf):
+        habit_tracker.correct_tracked_habit("2025-01-12", "reading", 11)
+    habit_tracker.track_habit("reading", 10)
+    assert habit_tracker.window_stats("reading", 30)['total'] == 61.0
+    assert habit_tracker.window_stats("reading", 30)['count'] == 6
+    habit_tracker.track_habit("exercise", 5)   # a habit tracked for the first time
+    assert habit_tracker.window_stats("exercise", 30)['total'] == 5.0
+
+def test_daily_rollup(tmp_path):
+    storage = CsvStorage(str(tmp_path))
+    habit_tracker, user_manager = setup_test_user("testuser", num_weeks=2, storage=storage)
+    rollup = habit_tracker.rollup()
+    assert os.path.exists(tmp_path / 'rollup_testuser.npz')
+    assert rollup.watermark == 16
+    assert rollup.counts.shape == (14, 2)
+
+    # new rows are folded in from the watermark, corrections recompute one cell
+    today = datetime.date.today().strftime("%Y-%m-%d")
+    habit_tracker.track_habit("reading", 5)
+    habit_tracker.correct_tracked_habit(today, "reading", 7, entry=1)
+    rollup = habit_tracker.rollup()
+    assert rollup.watermark == 17
+    assert rollup.habits_on(today) == ['reading', 'exercise']
+    assert rollup.totals().loc['reading'].tolist() == [15, 142, 142 / 15]
+
+    # a rewritten log is detected and the rollup rebuilt
+    df_tracking = habit_tracker.load_tracking_data()
+    habit_tracker.save_tracking_data(df_tracking[df_tracking['habit'] == 'exercise'])
+    assert habit_tracker.rollup().habits == ['exercise']
+
+def test_rollup_corrections(tmp_path):
+    # corrections of folded and not yet folded entries match a rebuilt rollup
+    for storage in (CsvStorage(str(tmp_path / 'csv')), SqliteStorage(str(tmp_path / 'habits.db'))):
+        habit_tracker, _ = setup_test_user("testuser", num_weeks=1, storage=storage)
+        today = habit_tracker._Habit__today
+        habit_tracker.track_habit("reading", 5)   # the last folded row
+        habit_tracker.rollup()
+        habit_tracker.track_habit("reading", 6)   # not folded in yet
+        statements = []
+        if isinstance(storage, SqliteStorage):   # entries are not located by counting rows
+            storage.conn.set_trace_callback(statements.append)
+        assert habit_tracker.correct_many([(today, "reading", 1.5, 2), (today, "reading", 2.5, 3)]) == 2
+        assert not any('COUNT' in statement for statement in statements)
+        rollup = habit_tracker.rollup()
+        assert rollup.last_row == (today, 'reading', 2.5)
+        assert rollup.totals().loc['reading', 'sum'] == 74
+        storage.save_arrays("testuser", "rollup", None)
+        assert habit_tracker.rollup().totals().equals(rollup.totals())
+
+def test_rollup_reads_new_rows_only(tmp_path, monkeypatch):
+    # a refresh reads the rows from the watermark on, never the whole log
+    for storage in (CsvStorage(str(tmp_path / 'csv')), SqliteStorage(str(tmp_path / 'habits.db')),
+                    NpzStorage(str(tmp_path / 'npz')), RecordStorage(str(tmp_path / 'rec'))):
+        habit_tracker, _ = setup_test_user("testuser", num_weeks=2, storage=storage)
+        habit_tracker.rollup()
+        habit_tracker.track_habit("drawing", 4)
+        starts = []
+        tracking_since = storage.tracking_since
+        monkeypatch.setattr(storage, 'load_tracking', lambda username: pytest.fail('whole log loaded'))
+        monkeypatch.setattr(storage, 'tracking_since', lambda username, start: starts.append(start) or
+                            tracking_since(username, start))
+        rollup = habit_tracker.rollup()
+        assert starts == [15] and rollup.watermark == 17
+        assert rollup.totals().loc['drawing', 'sum'] == 4
+        monkeypatch.undo()
+
+def test_todays_report_indexes(tmp_path, monkeypatch):
+    storage = CsvStorage(str(tmp_path))
+    habit_tracker, user_manager = setup_test_user("testuser", num_weeks=2, storage=storage)
+    user_manager.add_current_habit("swimming", "laps", "weekly")
+    habit_tracker.track_historical_habit("swimming", 4, "2020-01-06")
+    habit_tracker.last_seen()
+
+    # once the last tracked dates exist the report does not read the tracking log
+    def no_full_load(username):
+        raise AssertionError('tracking log loaded')
+    monkeypatch.setattr(storage, 'load_tracking', no_full_load)
+    habit_tracker.track_habit("drawing", 3)
+    with io.StringIO() as buf, redirect_stdout(buf):
+        habit_tracker.today_report()
+        output = buf.getvalue()
+    assert "Congratulations!! You've finished all of your daily habits" in output
+    assert "Habits that have not been compelete today" in output
+    assert "Habits Tracked today:  exercise" in output   # the weekly check runs again
+    assert output.rstrip().endswith("swimming")
+
+    # a row the map missed (a session stopped before saving it) is folded in by the next session
+    monkeypatch.undo()
+    today = habit_tracker._Habit__today
+    storage.append_tracking("testuser", [(today, "swimming", 2)])
+    fresh = Habit("testuser", today=today, storage=CsvStorage(str(tmp_path), cache=type(frame_cache)()))
+    assert fresh.last_seen()['swimming'] == today
+
+def test_native_dates(tmp_path):
+    # every engine hands the analysis code a parsed datetime64 date column
+    for storage in (CsvStorage(str(tmp_path / 'csv')), SqliteStorage(str(tmp_path / 'habits.db')),
+                    NpzStorage(str(tmp_path / 'npz')), RecordStorage(str(tmp_path / 'rec'))):
+        habit_tracker, _ = setup_test_user("testuser", num_weeks=2, storage=storage)
+        habit_tracker.track_habit("drawing", 3)
+        df_tracking = habit_tracker.load_tracking_data()
+        assert df_tracking['date'].dtype.kind == 'M'
+        today = habit_tracker._Habit__today
+        assert df_tracking['date'].iloc[-1] == pd.Timestamp(today)
+        dates, _ = habit_tracker.get_habit_history("drawing")
+        assert dates == [today]
+        assert habit_tracker.calculate_streak("reading")[0] == 14
+
+# Test cases for the SQLite storage engine
+def test_sqlite_storage(tmp_path):
+    storage = SqliteStorage(str(tmp_path / 'habits.db'))
+    habit_tracker, user_manager = setup_test_user("testuser", storage=storage)
+
+    assert storage.users() == ['testuser']
+    assert habit_tracker.get_periodicity("exercise") == 'weekly'
+    dates, values = habit_tracker.get_habit_history("Reading")
+    assert len(dates) == 35 and dates == sorted(dates)
+    assert habit_tracker.get_tracked_completed_today() == ['reading', 'exercise']
+
+    habit_tracker.track_historical_habit("reading", 20, "2025-01-15")
+    with io.StringIO() as buf, redirect_stdout(buf):
+        habit_tracker.correct_tracked_habit("2025-01-15", "Reading", 25)
+    df_tracking = habit_tracker.load_tracking_data()
+    assert df_tracking[df_tracking['date'] == '2025-01-15'].iloc[-1, 2] == 25
+
+    streak, _ = habit_tracker.calculate_streak("reading")
+    assert streak == 35
+
+def test_migrate_storage(tmp_path):
+    source = CsvStorage(str(tmp_path / 'csv'))
+    setup_test_user("testuser", storage=source)
+    target = SqliteStorage(str(tmp_path / 'habits.db'))
+    assert migrate_storage(source, target) == 1
+    assert target.load_tracking("testuser").equals(source.load_tracking("testuser"))
+    assert target.load_profile("testuser").period == source.load_profile("testuser").period
+
+    # and back again through the command line
+    with io.StringIO() as buf, redirect_stdout(buf):
+        run_command(['migrate', '--from', 'sqlite', '--to', 'csv',
+                     '--source-location', str(tmp_path / 'habits.db'), '--target-location', str(tmp_path / 'copy')])
+    assert os.path.exists(tmp_path / 'copy' / 'tracking_testuser.csv')
+    assert CsvStorage(str(tmp_path / 'copy')).load_tracking("testuser").equals(source.load_tracking("testuser"))
+
+# Test that exports stream the logs in chunks and resume from a cursor
+def test_export_tracking(tmp_path):
+    storage = CsvStorage(str(tmp_path / 'csv'))
+    habit_tracker, user_manager = setup_test_user("testuser", num_weeks=2, storage=storage)
+    day = datetime.date.today().strftime("%Y-%m-%d")
+    with io.StringIO() as buf, redirect_stdout(buf):
+        habit_tracker.correct_tracked_habit(day, "reading", 12.5)   # journaled, replayed on its chunk
+
+    for engine in (storage, SqliteStorage(str(tmp_path / 'habits.db')), NpzStorage(str(tmp_path / 'npz')),
+                   RecordStorage(str(tmp_path / 'rec'))):
+        if engine is not storage:
+            migrate_storage(storage, engine)
+        chunks = list(engine.iter_tracking("testuser", start=3, chunksize=4))
+        assert [len(chunk) for chunk in chunks] == [4, 4, 4, 1]
+        streamed = pd.concat(chunks, ignore_index=True).astype({'habit': str})
+        loaded = engine.load_tracking("testuser").iloc[3:].reset_index(drop=True).astype({'habit': str})
+        assert streamed.values.tolist() == loaded.values.tolist()
+
+    out = tmp_path / 'export.csv.gz'
+    argv = ['export', '--location', str(tmp_path / 'csv'), '--output', str(out), '--compression', 'gzip',
+            '--cursor', str(tmp_path / 'cursor.json'), '--chunksize', '5']
+    assert run_command(argv) == 0
+    exported = pd.read_csv(out)
+    assert len(exported) == 16 and set(exported['username']) == {'testuser'}
+    assert exported.loc[(exported['date'] == day) & (exported['habit'] == 'reading'), 'value'].tolist() == [12.5]
+
+    # the next run only ships the rows added since
+    habit_tracker.track_habit("drawing", 3)
+    assert run_command(argv) == 0
+    assert pd.read_csv(out).values.tolist() == [['testuser', day, 'drawing', 3]]
+    with open(tmp_path / 'cursor.json') as f:
+        assert json.load(f) == {'testuser': 17}
+
+    assert export_tracking(storage, str(tmp_path / 'export.jsonl'), fmt='jsonl', since={'testuser': 15}) == {'testuser': 17}
+    with open(tmp_path / 'export.jsonl') as f:
+        assert [json.loads(line)['habit'] for line in f] == ['reading', 'drawing']
+
+# Test cases for the columnar (npz) storage engine
+def test_npz_storage(tmp_path):
+    source = CsvStorage(str(tmp_path / 'csv'))
+    setup_test_user("testuser", storage=source)
+    storage = NpzStorage(str(tmp_path / 'npz'))
+    migrate_storage(source, storage)
+
+    df_csv = source.load_tracking("testuser")
+    df_npz = storage.load_tracking("testuser")
+    assert str(df_npz['habit'].dtype) == 'category'
+    assert df_npz['date'].tolist() == df_csv['date'].tolist()
+    assert df_npz['habit'].astype(str).tolist() == df_csv['habit'].tolist()
+    assert df_npz['value'].tolist() == df_csv['value'].tolist()
+
+    habit_tracker = Habit("testuser", today=datetime.date.today().strftime("%Y-%m-%d"), storage=storage)
+    habit_tracker.track_habit("drawing", 4.5)
+    assert habit_tracker.get_habit_history("drawing") == ([habit_tracker._Habit__today], [4.5])
+    streak, _ = habit_tracker.calculate_streak("reading")
+    assert streak == 35
+
+# Test cases for the memory-mapped record storage engine
+def test_record_storage(tmp_path):
+    storage = RecordStorage(str(tmp_path))
+    habit_tracker, user_manager = setup_test_user("testuser", storage=storage)
+    today = datetime.date.today()
+    record_file = storage.tracking_file("testuser")
+    assert os.path.getsize(record_file) == 40 * 10  # fixed-width records, appended in place
+
+    dates, values = habit_tracker.get_habit_history("reading")
+    assert len(dates) == 35 and dates == sorted(dates)
+    week_ago = (today - datetime.timedelta(days=6)).strftime("%Y-%m-%d")
+    dates, values = storage.habit_history("testuser", "reading", start=week_ago)
+    assert len(dates) == 7 and dates[0] == week_ago
+    assert sorted(habit_tracker.get_tracked_completed_today()) == ['exercise', 'reading']
+
+    # corrections patch the record in place
+    with io.StringIO() as buf, redirect_stdout(buf):
+        habit_tracker.correct_tracked_habit(week_ago, "reading", 12.3)
+    assert os.path.getsize(record_file) == 40 * 10
+    assert storage.habit_history("testuser", "reading", start=week_ago, end=week_ago) == ([week_ago], [12.3])
+
+    # a torn record from an interrupted append is dropped
+    with open(record_file, 'ab') as f:
+        f.write(b'\x01\x02\x03')
+    habit_tracker.track_habit("drawing", 2)
+    assert os.path.getsize(record_file) == 41 * 10
+    assert habit_tracker.load_tracking_data().iloc[-1]['habit'] == 'drawing'
+
+    # out-of-order entries are found through the tail index, also after later appends
+    storage.append_tracking("testuser", [(week_ago, "drawing", 1), ("2001-01-01", "drawing", 3)])
+    assert os.path.exists(record_file + '.idx')
+    storage.append_tracking("testuser", [(week_ago, "drawing", 5)])
+    assert storage.habit_history("testuser", "drawing", end=week_ago) == (["2001-01-01", week_ago, week_ago], [3, 1, 5])
+    df_tracking = storage.load_tracking("testuser")
+    for day in (week_ago, "2001-01-01", today.strftime("%Y-%m-%d")):
+        expected = df_tracking[df_tracking['date'] == day]['habit'].astype(str).tolist()
+        assert storage.habits_on("testuser", day) == expected
+
+def test_tracking_schema(tmp_path):
+    # habits load as a lowercase category and rows that break the schema are moved aside
+    storage = CsvStorage(str(tmp_path))
+    habit_tracker, _ = setup_test_user("testuser", num_weeks=1, storage=storage)
+    path = tmp_path / 'tracking_testuser.csv'
+    with open(path, 'a') as f:
+        f.write('2025-01-32,reading,5\n2025-01-20,Reading,abc\n2025-01-20,Drawing,4\n')
+    storage.cache.invalidate()
+    with io.StringIO() as buf, redirect_stdout(buf):
+        df_tracking = habit_tracker.load_tracking_data()
+        output = buf.getvalue()
+    assert 'Rejected 2 rows' in output and 'invalid date' in output and 'invalid value' in output
+    assert df_tracking['habit'].dtype == 'category'
+    assert set(df_tracking['habit'].cat.categories) == {'reading', 'exercise', 'drawing'}
+    assert df_tracking['date'].dtype.kind == 'M' and df_tracking['value'].dtype.kind in 'iuf'
+    assert pd.read_csv(str(path) + '.rejected')['date'].tolist() == ['2025-01-32', '2025-01-20']
+
+    # the snapshot no longer holds the bad rows, so loading again reports nothing
+    storage.cache.invalidate()
+    with io.StringIO() as buf, redirect_stdout(buf):
+        assert len(habit_tracker.load_tracking_data()) == len(df_tracking)
+        assert buf.getvalue() == ''
+    with io.StringIO() as buf, redirect_stdout(buf):
+        habit_tracker.correct_tracked_habit('2025-01-20', 'drawing', 6)
+        assert 'Habit Corrected!!' in buf.getvalue()
+    assert habit_tracker.get_habit_history('drawing', end='2025-01-20')[1] == [6]
+    habit_tracker.track_habit('drawing', 2)
+    assert habit_tracker.load_tracking_data()['habit'].dtype == 'category'
+
+def test_sqlite_rejects_bad_rows(tmp_path):
+    # rows written around the app that break the schema no longer make the user unloadable
+    storage = SqliteStorage(str(tmp_path / 'habits.db'))
+    habit_tracker, _ = setup_test_user("testuser", num_weeks=1, storage=storage)
+    with storage.conn:
+        storage.conn.executemany('INSERT INTO tracking (username, date, habit, value) VALUES (?, ?, ?, ?)',
+                                 [('testuser', '2025/01/05', 'reading', 5), ('testuser', '2025-01-06', 'reading', 'abc')])
+    with io.StringIO() as buf, redirect_stdout(buf):
+        df_tracking = habit_tracker.load_tracking_data()
+        output = buf.getvalue()
+    assert 'Rejected 2 tracking rows' in output and 'invalid date' in output and 'invalid value' in output
+    assert len(df_tracking) == 7 + 1 and df_tracking['date'].dtype.kind == 'M'
+    assert storage.conn.execute('SELECT COUNT(*) FROM rejected_tracking').fetchone()[0] == 2
+    with io.StringIO() as buf, redirect_stdout(buf):
+        assert len(habit_tracker.load_tracking_data()) == 8
+        assert buf.getvalue() == ''
+
+    # a habit history read first rejects the bad rows too
+    storage = SqliteStorage(str(tmp_path / 'history.db'))
+    habit_tracker, _ = setup_test_user("testuser", num_weeks=1, storage=storage)
+    with storage.conn:
+        storage.conn.execute("INSERT INTO tracking (username, date, habit, value) VALUES ('testuser', '2025/01/06', 'reading', 5)")
+    with io.StringIO() as buf, redirect_stdout(buf):
+        dates, values = habit_tracker.get_habit_history("reading")
+        assert 'Rejected 1 tracking rows' in buf.getvalue()
+    assert len(dates) == 7 and '2025/01/06' not in dates
+    assert habit_tracker.calculate_streak("reading")[0] == 7
+
+    # a bad row appended behind the cache of the CSV engine is read back and rejected
+    storage = CsvStorage(str(tmp_path / 'csv'))
+    habit_tracker, _ = setup_test_user("testuser", num_weeks=1, storage=storage)
+    habit_tracker.load_tracking_data()
+    storage.append_tracking("testuser", [("yesterday", "reading", 5)])
+    with io.StringIO() as buf, redirect_stdout(buf):
+        assert len(habit_tracker.load_tracking_data()) == 8
+        assert 'Rejected 1 rows' in buf.getvalue()
+
+def test_rename_habit(tmp_path):
+    # a rename covers the history tracked so far, on every engine, without rewriting it
+    for storage in (CsvStorage(str(tmp_path / 'csv')), SqliteStorage(str(tmp_path / 'habits.db')),
+                    NpzStorage(str(tmp_path / 'npz')), RecordStorage(str(tmp_path / 'rec'))):
+        habit_tracker, user_manager = setup_test_user("testuser", num_weeks=1, storage=storage)
+        dates, values = habit_tracker.get_habit_history("reading")
+        streak = habit_tracker.calculate_streak("reading")[0]
+        assert habit_tracker.rename_habit("Reading", "Books")
+        assert user_manager.get_current_habits()[0] == 'books'
+        assert habit_tracker.get_unit_of_measurement()['books'] == 'pages'
+        assert habit_tracker.get_habit_history("books") == (dates, values)
+        assert habit_tracker.get_habit_history("reading") == ([], [])
+        assert habit_tracker.calculate_streak("books")[0] == streak
+
+        # the old name is free again and stays apart from the renamed history
+        habit_tracker.track_habit("reading", 1)
+        if hasattr(storage, 'cache'):
+            storage.cache.invalidate()
+        assert habit_tracker.get_habit_history("reading")[1] == [1]
+        assert habit_tracker.get_habit_history("books") == (dates, values)
+
+        with io.StringIO() as buf, redirect_stdout(buf):
+            assert not habit_tracker.rename_habit("books", "exercise")
+            assert 'already exists' in buf.getvalue()
+
+        # a name only found in the history or in the units would merge two habits
+        habit_tracker.track_historical_habit("walking", 3, "2025-01-05")
+        with io.StringIO() as buf, redirect_stdout(buf):
+            assert not habit_tracker.rename_habit("books", "walking")
+            assert 'walking already has tracked entries' in buf.getvalue()
+        with user_manager.edit_profile() as profile:
+            profile.set_meta("swimming", "laps")
+        with io.StringIO() as buf, redirect_stdout(buf):
+            assert not habit_tracker.rename_habit("books", "Swimming")
+            assert 'already exists' in buf.getvalue()
+        assert user_manager.get_current_habits()[0] == 'books'
+        assert habit_tracker.get_habit_history("walking")[1] == [3]
+        if isinstance(storage, RecordStorage):
+            habits = storage._load_meta("testuser")['habits']
+            assert len(habits) == len(set(habits))
+
+    # the derived data is renamed instead of rebuilt, and a failed rename leaves the profile as it was
+    storage = CsvStorage(str(tmp_path / 'derived'))
+    habit_tracker, user_manager = setup_test_user("testuser", num_weeks=1, storage=storage)
+    streaks = habit_tracker.streak_state()
+    with patch.object(storage, 'rename_habit', side_effect=OSError('disk full')):
+        with pytest.raises(OSError):
+            habit_tracker.rename_habit("reading", "books")
+    assert user_manager.get_current_habits()[0] == 'reading'
+    habit_tracker.streak_state()
+    assert habit_tracker.rename_habit("reading", "books")
+    assert 'books' in storage.load_arrays("testuser", "rollup")['habits'].tolist()
+    assert storage.load_state("testuser", "streaks")['habits']['books'] == streaks['reading']
+    assert habit_tracker.rollup().totals().loc['books', 'sum'] == 70
+
+    # the CSV file only gets a journal entry, compaction writes the new name
+    path = tmp_path / 'csv' / 'tracking_testuser.csv'
+    assert 'books' not in path.read_text() and 'rename' in (tmp_path / 'csv' / 'tracking_testuser.csv.journal').read_text()
+    CsvStorage(str(tmp_path / 'csv')).compact('testuser', wait=True)
+    assert 'books' in path.read_text()